@@ -9,7 +9,7 @@ a = Analysis(
     pathex=[],
     binaries=[('poppler/', 'binary')],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['pyarrow.parquet', 'pyarrow.compute'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
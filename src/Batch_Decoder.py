@@ -0,0 +1,238 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Batch_Decoder.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Scantron import Scantron
+from Bubble_Index import Bubble_Index
+from Sheet_Schema import Sheet_Schema, get_shared_schema
+import Trace_Recorder
+
+# ======================================================================================================================
+# Batch_Decoder Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Batch_Decoder():
+    """
+    Decoding every game sheet at once instead of making a Scantron for each one. \n
+    All of the marks are matched against all of the bubbles in one step, giving a sheets x bubbles matrix.
+    The team, match, alliance, results, and play style are then all pulled out of that matrix with arrays and put straight into the DataFrame's columns. \n
+    It gives the same results as Scantron. Where Scantron kept the first mark it found (team, match, alliance) or the last one (play style),
+    the matrix keeps when each bubble was first and last marked so the same one wins. \n
+    Setting up the matrix costs more than it saves for a single sheet, so decode_sheet() uses a Scantron with a Bubble_Index made once here instead.
+    """
+    def __init__(self,
+                 bubble_location: dict,
+                 pixel_differential: int,
+                 schema: Sheet_Schema = None,
+                 chunk_size: int = 20000) -> None:
+        """
+        Args:
+            bubble_location (dict): The location of every bubble from the key(s).
+            pixel_differential (int): The plus or minus that it will look for a corresponding mark in the bubble_location dictionary.
+            schema (Sheet_Schema, optional): Layout of the game sheet. The shared one is used if it isn't given.
+                Defaults to None.
+            chunk_size (int, optional): Most marks matched against the bubbles at one time, to keep the memory down for very large batches.
+                Defaults to 20000.
+        """
+
+        # Class init values.
+        self.pixel_differential: int = pixel_differential
+        self.schema: Sheet_Schema = schema if schema is not None else get_shared_schema()
+        self.chunk_size: int = max(1, chunk_size)
+
+        # Created within and used by the class.
+        self._bubble_xy: np.ndarray = np.array([value[0] for value in bubble_location.values()], dtype = np.int64).reshape(-1, 2)
+        self._bubble_x: np.ndarray = self._bubble_xy[:, 0].astype(np.int32)
+        self._bubble_y: np.ndarray = self._bubble_xy[:, 1].astype(np.int32)
+        self._total_bubbles: int = len(self._bubble_xy)
+        self._no_mark: int = np.iinfo(np.int64).max
+        self._position: dict = {key: i for i, key in enumerate(bubble_location)}
+        self._bubble_index: Bubble_Index = Bubble_Index(bubble_location = bubble_location,
+                                                        pixel_differential = pixel_differential)
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _positions(self,
+                   keys: np.ndarray) -> np.ndarray:
+        """ Turning bubble keys into their column in the matrix. """
+        return np.vectorize(self._position.__getitem__, otypes = [np.int64])(keys)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _match(self,
+               game_sheets: list[tuple]) -> tuple:
+        """
+        Matching every mark from every sheet to the bubbles at the same time. \n
+        Marks are numbered in the order they are on their sheet, and each match is given mark number * bubbles + bubble, which is the order Scantron would have found it in.
+
+        Args:
+            game_sheets (list[tuple]): The marks from each game sheet.
+
+        Returns:
+            tuple: First and last match number for every sheet and bubble, as two sheets x bubbles arrays.
+                   Bubbles that weren't marked have the largest int64 for first and -1 for last.
+        """
+        total_sheets = len(game_sheets)
+        first = np.full(shape = (total_sheets, self._total_bubbles), fill_value = self._no_mark, dtype = np.int64)
+        last = np.full(shape = (total_sheets, self._total_bubbles), fill_value = -1, dtype = np.int64)
+
+        counts = np.array([len(sheet) for sheet in game_sheets], dtype = np.int64)
+        if counts.sum() == 0:
+            return first, last
+        marks = np.concatenate([np.asarray(sheet, dtype = np.int64).reshape(-1, 2) for sheet in game_sheets])
+        sheet_number = np.repeat(np.arange(total_sheets), counts)
+        mark_number = np.arange(len(marks)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        # Shifted by pixel_differential and compared as unsigned, so each axis is one subtract and one compare instead of abs and two compares.
+        shifted = (marks + self.pixel_differential).astype(np.int32)
+        width = np.uint32(2 * self.pixel_differential)
+        for start in range(0, len(marks), self.chunk_size):
+            chunk = shifted[start: start + self.chunk_size]
+            in_range = (((chunk[:, None, 0] - self._bubble_x).view(np.uint32) <= width)
+                        & ((chunk[:, None, 1] - self._bubble_y).view(np.uint32) <= width))
+            rows, bubbles = np.nonzero(in_range)
+            rows += start
+            order = mark_number[rows] * self._total_bubbles + bubbles
+            np.minimum.at(first, (sheet_number[rows], bubbles), order)
+            np.maximum.at(last, (sheet_number[rows], bubbles), order)
+        return first, last
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _digits(self,
+                first: np.ndarray,
+                bubbles: np.ndarray) -> np.ndarray:
+        """
+        The number filled in for the team or match, from the first marked bubble of each place. Places with nothing marked are 0.
+
+        Returns:
+            np.ndarray: Zero padded string of the number for each sheet.
+        """
+        places = []
+        for place in bubbles:  # Each place of the number.
+            order = first[:, self._positions(place)]
+            places.append(np.where(order.min(axis = 1) != self._no_mark, order.argmin(axis = 1), 0).astype(str))
+        number = places[0]
+        for place in places[1:]:
+            number = np.char.add(number, place)
+        return number.astype(object)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _decode_columns(self,
+                        game_sheets: list[tuple]) -> dict:
+        """
+        Decoding all of the game sheets into an array for each column of the results.
+
+        Args:
+            game_sheets (list[tuple]): The marks from each game sheet.
+
+        Returns:
+            dict: Column name and its value for every sheet, in the order of schema.columns.
+        """
+        first, last = self._match(game_sheets = game_sheets)
+        marked = first != self._no_mark
+        data: dict = {column: np.zeros(shape = len(game_sheets), dtype = np.int64) for column in self.schema.columns}
+
+        data['Team'] = self._digits(first = first,
+                                    bubbles = self.schema.team_bubbles)
+        data['Match'] = self._digits(first = first,
+                                     bubbles = self.schema.match_bubbles)
+
+        # Whichever alliance bubble was found first, and blue if neither.
+        blue, red = self._positions(self.schema.alliance_bubbles)
+        alliance = (first[:, red] < first[:, blue]).astype(np.int64)
+        data['Alliance'] = alliance
+
+        # The bubbles are flipped between the alliances.
+        results = np.where(alliance[:, None] == 0,
+                           marked[:, self._positions(self.schema.result_blue_bubbles)],
+                           marked[:, self._positions(self.schema.result_red_bubbles)]).astype(np.int64)
+        for i, column in enumerate(self.schema.result_columns):
+            data[column] = results[:, i]
+
+        # The last marked bubble for each column is what it ends up as.
+        for column, bubbles in zip(self.schema.play_style_columns, self.schema.play_style_bubbles):
+            keys, values = zip(*bubbles)
+            order = last[:, self._positions(np.array(keys))]
+            data[column] = np.where(order.max(axis = 1) >= 0, np.array(values)[order.argmax(axis = 1)], 0).astype(np.int64)
+        return data
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def get_marked_matrix(self,
+                          game_sheets: list[tuple]) -> np.ndarray:
+        """
+        Which bubbles are marked on each sheet.
+
+        Args:
+            game_sheets (list[tuple]): The marks from each game sheet.
+
+        Returns:
+            np.ndarray: Boolean sheets x bubbles array, with the bubbles in the order of bubble_location.
+        """
+        first, _ = self._match(game_sheets = game_sheets)
+        return first != self._no_mark
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def decode(self,
+               game_sheets: list[tuple]) -> pd.DataFrame:
+        """
+        Decoding all of the game sheets into their results.
+
+        Args:
+            game_sheets (list[tuple]): The marks from each game sheet.
+
+        Returns:
+            pd.DataFrame: One row for each game sheet with the same columns and values as Scantron._get_raw_data().
+        """
+        return pd.DataFrame(self._decode_columns(game_sheets = game_sheets), columns = list(self.schema.columns))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def decode_rows(self,
+                    game_sheets: list[tuple]) -> list[tuple]:
+        """
+        Decoding the game sheets into plain rows instead of a DataFrame. \n
+        This is used for the sheets that are decoded together, like the ones that waited on the keys. Use decode_sheet() for just one.
+
+        Args:
+            game_sheets (list[tuple]): The marks from each game sheet.
+
+        Returns:
+            list[tuple]: One row for each game sheet with its values in the order of schema.columns.
+        """
+        with Trace_Recorder.span('decode_rows', category = 'collate', sheets = len(game_sheets)):
+            data = self._decode_columns(game_sheets = game_sheets)
+            return list(zip(*(data[column].tolist() for column in self.schema.columns)))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def decode_sheet(self,
+                     marks: tuple) -> tuple:
+        """
+        Decoding one game sheet into its row, the same as decode_rows() would. \n
+        This is what the workers use for each sheet as it is read. The marks are looked up in the shared Bubble_Index by a Scantron, 
+        which is about 5 times quicker than building the matrix for one sheet.
+
+        Args:
+            marks (tuple): The marks from the game sheet.
+
+        Returns:
+            tuple: The row with its values in the order of schema.columns.
+        """
+        scantron = Scantron(scantron_data = marks,
+                            bubble_location = None,
+                            pixel_differential = self.pixel_differential,
+                            bubble_index = self._bubble_index,
+                            schema = self.schema)
+        return tuple(scantron._get_raw_data().values())
+
+# End of file.
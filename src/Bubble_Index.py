@@ -0,0 +1,73 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Bubble_Index.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Bubble_Index Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Bubble_Index():
+    """
+    The bubble locations from the key(s) put into a grid so a mark can be matched to its bubble without checking all 155 of them. \n
+    Each cell is pixel_differential wide, so anything within range of a mark is in one of the cells touching it. \n
+    It is made once and shared by every Scantron since nothing in it changes after it is built. Batch_Decoder keeps one for decode_sheet(), which the workers decode each sheet with.
+    """
+    def __init__(self,
+                 bubble_location: dict,
+                 pixel_differential: int) -> None:
+        """
+        Args:
+            bubble_location (dict): The location of every bubble from the key(s).
+            pixel_differential (int): The plus or minus that it will look for a corresponding mark in the bubble_location dictionary.
+        """
+
+        # Class init values.
+        self.pixel_differential: int = pixel_differential
+
+        # Created within and used by the class.
+        self._cell_size: int = max(1, pixel_differential)
+        self._grid: dict = {}
+
+        # Initializing methods.
+        self._build_grid(bubble_location = bubble_location)
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _build_grid(self,
+                    bubble_location: dict) -> None:
+        """
+        Putting each bubble in the cell its X and Y fall in. \n
+        The order from bubble_location is kept with each one so the matches come back in the same order the old loops found them.
+        """
+        grid: dict = {}
+        for order, (key, value) in enumerate(bubble_location.items()):
+            cell = (value[0][0] // self._cell_size, value[0][1] // self._cell_size)
+            grid.setdefault(cell, []).append((order, key, value[0][0], value[0][1]))
+        self._grid = {cell: tuple(bubbles) for cell, bubbles in grid.items()}
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def lookup(self,
+               mark: tuple) -> list:
+        """
+        Finding the bubble(s) within pixel_differential of a mark.
+
+        Args:
+            mark (tuple): X and Y of the mark.
+
+        Returns:
+            list: The bubble_location key of each bubble in range, in the same order as bubble_location.
+        """
+        x, y = mark[0], mark[1]
+        matches = []
+        for cell_x in range((x - self.pixel_differential) // self._cell_size, (x + self.pixel_differential) // self._cell_size + 1):
+            for cell_y in range((y - self.pixel_differential) // self._cell_size, (y + self.pixel_differential) // self._cell_size + 1):
+                for order, key, key_x, key_y in self._grid.get((cell_x, cell_y), ()):
+                    if abs(key_x - x) <= self.pixel_differential and abs(key_y - y) <= self.pixel_differential:
+                        matches.append((order, key))
+        return [key for _, key in sorted(matches)]
+
+# End of file.
@@ -8,9 +8,9 @@
 # Standard Imports
 # ----------------------------------------------------------------------------------------------------------------------
 import os
-import pandas as pd
 import re
 import sys
+import time
 import multiprocessing
 from datetime import datetime
 
@@ -18,7 +18,11 @@ from datetime import datetime
 # Custom Class Imports
 # ----------------------------------------------------------------------------------------------------------------------
 from OMR import OMR
-from Scantron import Scantron
+from Sheet_Schema import get_shared_schema
+from Results_Writer import Results_Writer
+from Parquet_Writer import Parquet_Writer, is_available as is_parquet_available
+from Progress_Reporter import Progress_Reporter
+import Trace_Recorder
 
 # ======================================================================================================================
 # Bubble_Sheet Class
@@ -26,32 +30,49 @@ from Scantron import Scantron
 class Bubble_Sheet():
     """
     Highest level class for running and acquiring the game data. 
-    TODO Maybe get the arguments for OMR and Scantron as inputs for the init.
-    TODO Potentially use the averaged keys from Constants._bubble_location in case no keys were found? In the OMR init check. 
+    TODO Maybe get the arguments for Scantron as inputs for the init.
     """
     def __init__(self,
-                 pixel_differential: int = 50) -> None:
+                 pixel_differential: int = 50,
+                 omr_settings: dict = None,
+                 trace: bool = False,
+                 progress: bool = False,
+                 parquet: bool = True) -> None:
         """_summary_
 
         Args:
             pixel_differential (int, optional): The plus or minus that it will look for a corresponding mark in the bubble_location dictionary.
                                                 Defaults to 50.
+            omr_settings (dict, optional): Arguments for OMR that replace the ones in _create_OMR(), like {'cpu_threads': 2, 'use_mark_cache': False}.
+                                           Defaults to None.
+            trace (bool, optional): Time each step for each file, in the workers too, and save it to results/ as a Chrome trace for chrome://tracing or ui.perfetto.dev.
+                                    Defaults to False.
+            progress (bool, optional): Print the sheets done, pages a second, step times, memory, and time left every few seconds, 
+                                       and write them to results/status.json for other programs to read. 
+                                       The workers time their steps to send back with each sheet while it is on, so it is left off unless it is asked for.
+                                       Defaults to False.
+            parquet (bool, optional): Also save the rows to a .parquet file next to the csv, with Team and Match as numbers, if pyarrow is installed. 
+                                      Parquet_Writer.read_season() loads every run at once.
+                                      Defaults to True.
 
         Raises:
             FileNotFoundError: Raised if the needed folders do NOT exist when running the program. 
         """
 
         self.pixel_differential = pixel_differential
+        self.omr_settings: dict = dict(omr_settings) if omr_settings else {}
+        self.trace: bool = trace
+        self.progress: bool = progress
+        self.parquet: bool = parquet
 
         self._cpu_threads: int
         self._directories: list[str] = []
         self._directory_check: bool = False
         self._OMR_data: OMR
         self._bubble_location: dict = {}
-        self._game_sheets: list = []
-        self._processed_game_sheets: list[Scantron] = []
-        self._game_sheet_data: list[dict] = []
-        self._df: pd.DataFrame
+        self._results_writer: Results_Writer
+        self._parquet_writer: Parquet_Writer = None
+        self._progress_reporter: Progress_Reporter = None
 
         # Initializing methods.
         self._get_CPU_threads()
@@ -66,42 +87,173 @@ class Bubble_Sheet():
 # ----------------------------------------------------------------------------------------------------------------------
     def main(self):
         """
-        For running all the data processing. It invokes all of the classes and methods to then save the data as a csv.
+        For running all the data processing. It invokes all of the classes and methods to then save the data as a csv. \n
+        Each game sheet is decoded by the worker that read it and added to the csv as soon as it and the ones before it are done, so the first rows show up after a few sheets instead of the whole batch, 
+        the rows are in the order of the files every time, and only the sheets being worked on are held in memory no matter how many there are. If the keys changed, the game sheets are read while the keys are.
         """
+        self._start_trace()
         try:
-            self._OMR_data = OMR(cpu_threads = self._cpu_threads,
-                                 directories = self._directories,
-                                 image_format = 'jpg',
-                                 save_image_overlay = False,
-                                 mark_color = 'blue')
+            with Trace_Recorder.span('create_OMR', category = 'main'):
+                self._OMR_data = self._create_OMR(game_sheet_mode = 'stream')
         except Exception as ex:
             print('An error occured:')
             print(ex)
+            self._save_trace()
             return None
         
+        self._create_writers()
+        self._start_progress()
+        state: str = 'done'
         try:
+            with Trace_Recorder.span('game_sheets', category = 'main'):
+                for row in self._OMR_data.stream_game_sheets():
+                    self._write_rows(rows = [row])
+                    self._update_progress(total = self._OMR_data.get_game_sheet_total())
             self._bubble_location = self._OMR_data.get_key_values()
-            self._game_sheets = self._OMR_data.get_game_sheet_values()
         except Exception as ex:
+            state = 'failed'
             print('An error occured:')
             print(ex)
+        finally:
+            self._close_writers()
+            self._OMR_data.close()
+            self._finish_progress(state = state)
+        print('{} game sheet(s) were saved to {}.'.format(self._results_writer.rows, self._get_saved_paths()))
+        self._save_trace()
+        # self._save_key_dict()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def watch(self,
+              poll_interval: float = 2.0) -> None:
+        """
+        Keeps running during an event and processes new game sheets as they are saved into scantron_images/ and scantron_pdf/. \n
+        A file is only read once its size and modified time are the same for two checks in a row, so the scanner is done writing it. The files are not renamed. \n
+        The keys are read once at the start, or taken from the key calibration, and the process pool stays open, so each new file only costs its own detection. \n
+        The row for each game sheet is added to one csv in results/ as soon as its worker decodes it. Everything already in the folders is processed first. Stop it with Ctrl+C.
+
+        Args:
+            poll_interval (float, optional): Seconds between checking the folders for new files.
+                Defaults to 2.0.
+        """
+        self._start_trace()
+        try:
+            with Trace_Recorder.span('create_OMR', category = 'main'):
+                self._OMR_data = self._create_OMR(game_sheet_mode = 'watch')
+            self._bubble_location = self._OMR_data.get_key_values()
+        except Exception as ex:
+            print('An error occured:')
+            print(ex)
+            self._save_trace()
             return None
         
-        for sheet in self._game_sheets:
-            self._processed_game_sheets.append(Scantron(scantron_data = sheet,
-                                                        bubble_location = self._bubble_location, 
-                                                        pixel_differential = self.pixel_differential))
-        for sheet in self._processed_game_sheets:
-            self._game_sheet_data.append(sheet._get_raw_data())
-        
-        self._df = pd.DataFrame.from_dict(self._game_sheet_data)
-        # print(self._df.sort_values('Match'))
-        self._save_game_data()
-        # self._save_key_dict()
+        self._create_writers()
+        pending_files: dict = {}
+        processed_files: set = set()
+        self._start_progress()
+        state: str = 'failed'
+        print('Watching {} and {} for new game sheets. Press Ctrl+C to stop.'.format(self._directories[3], self._directories[2]))
+        try:
+            while True:
+                image_names, pdf_names = self._get_ready_files(pending_files = pending_files,
+                                                               processed_files = processed_files)
+                if not image_names and not pdf_names:
+                    time.sleep(poll_interval)
+                    continue
+                
+                rows = self._results_writer.rows
+                with Trace_Recorder.span('game_sheets', category = 'main', files = len(image_names) + len(pdf_names)):
+                    for row in self._OMR_data.stream_game_sheet_files(image_names = image_names,
+                                                                      pdf_names = pdf_names):
+                        self._write_rows(rows = [row])
+                        self._update_progress()
+                processed_files.update([self._directories[3] + name for name in image_names] + [self._directories[2] + name for name in pdf_names])
+                print('Added {} game sheet(s) from {} file(s) to {}.'.format(self._results_writer.rows - rows, len(image_names) + len(pdf_names), self._results_writer.path))
+        except KeyboardInterrupt:
+            state = 'stopped'
+            print('Stopped watching. {} game sheet(s) were saved to {}.'.format(self._results_writer.rows, self._get_saved_paths()))
+        finally:
+            self._close_writers()
+            self._OMR_data.close()
+            self._finish_progress(state = state)
+            self._save_trace()
 
 # ======================================================================================================================
 # Low Level Private Functions
 # ----------------------------------------------------------------------------------------------------------------------
+    def _create_OMR(self,
+                    game_sheet_mode: str) -> OMR:
+        """ The OMR settings used by both main() and watch(), with any from omr_settings put in place of these. The workers decode the game sheets with pixel_differential. """
+        settings: dict = {'cpu_threads': self._cpu_threads,
+                          'directories': self._directories,
+                          'image_format': 'jpg',
+                          'save_image_overlay': False,
+                          'mark_color': 'blue',
+                          'save_pdf_images': False,
+                          'pdf_page_window': 1,
+                          'extract_pdf_jpegs': True,
+                          'detector_backend': 'contour',
+                          'reduced_decode': False,
+                          'use_mark_cache': True,
+                          'mark_cache_size_mb': 256,
+                          'use_key_calibration': True,
+                          'pool_recycle_tasks': 1000}
+        settings.update(self.omr_settings)
+        return OMR(game_sheet_mode = game_sheet_mode,
+                   pixel_differential = self.pixel_differential,
+                   **settings)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_ready_files(self,
+                         pending_files: dict,
+                         processed_files: set) -> tuple:
+        """
+        Checking the game sheet folders for files that are done being written. \n
+        Each new file's size and modified time are kept in pending_files, and it is ready once they haven't changed since the last check and _is_complete() passes.
+
+        Args:
+            pending_files (dict): Path and (size, modified time) of the files seen that aren't ready yet. Updated in place.
+            processed_files (set): Paths of the files that were already processed.
+
+        Returns:
+            tuple: Names of the ready images and names of the ready pdfs, sorted.
+        """
+        ready_files: dict = {3: [], 2: []}
+        for directory, file_type in ((3, '.' + self._OMR_data.image_format), (2, '.pdf')):
+            for entry in os.scandir(self._directories[directory]):
+                if not entry.is_file() or not entry.name.endswith(file_type) or entry.path in processed_files:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                file_state = (stat.st_size, stat.st_mtime_ns)
+                if pending_files.get(entry.path) == file_state and stat.st_size > 0 and self._is_complete(path = entry.path):
+                    del pending_files[entry.path]
+                    ready_files[directory].append(entry.name)
+                else:
+                    pending_files[entry.path] = file_state
+        return sorted(ready_files[3]), sorted(ready_files[2])
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _is_complete(self,
+                     path: str) -> bool:
+        """
+        If the file can be opened, since the scanner software can still have it locked on Windows, and it isn't cut off. \n
+        A jpeg has to end with its end of image marker and a pdf has to have %%EOF at the end, so a file that stopped being written to for a moment isn't read half done.
+        """
+        try:
+            with open(path, 'rb') as f:
+                f.seek(max(0, os.path.getsize(path) - 1024))
+                tail = f.read()
+        except OSError:
+            return False
+        if path.lower().endswith(('.jpg', '.jpeg')):
+            return b'\xff\xd9' in tail
+        if path.lower().endswith('.pdf'):
+            return b'%%EOF' in tail
+        return True
+
+#-----------------------------------------------------------------------------------------------------------------------
     def _create_directories_list(self):
         """
         List of the folder locations used for reading and writing the data.
@@ -133,13 +285,87 @@ class Bubble_Sheet():
             self._cpu_threads = 1
 
 #-----------------------------------------------------------------------------------------------------------------------
-    def _save_game_data(self):
-        """ Saving the data as a csv with a the current time as it's name so nothing saves over previous datasets. """
+    def _get_results_path(self,
+                          extension: str) -> str:
+        """ Location in results/ with the current time as it's name so nothing saves over previous datasets. """
         time_now: datetime = datetime.now()
-        file_name: str = re.sub('-|:|\.|\s', '_', str(time_now)) + '.csv'
-        path: str = 'results/' + file_name
-        self._df.to_csv(path_or_buf = path,
-                        index = False)
+        file_name: str = re.sub('-|:|\.|\s', '_', str(time_now)) + extension
+        return 'results/' + file_name
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _create_writers(self) -> None:
+        """ The csv, and the .parquet file with the same name if parquet is on and pyarrow is installed. """
+        path: str = self._get_results_path(extension = '')
+        self._results_writer = Results_Writer(path = path + '.csv',
+                                              columns = get_shared_schema().columns)
+        self._parquet_writer = None
+        if self.parquet and is_parquet_available():
+            self._parquet_writer = Parquet_Writer(path = path + '.parquet',
+                                                  columns = get_shared_schema().columns)
+        elif self.parquet:
+            print('pyarrow is not installed, so the results are only saved as a csv.')
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _write_rows(self,
+                    rows: list[tuple]) -> None:
+        """ Adding rows to the csv and the .parquet file. """
+        self._results_writer.write(rows = rows)
+        if self._parquet_writer is not None:
+            self._parquet_writer.write(rows = rows)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _close_writers(self) -> None:
+        """ Closing the csv and finishing the .parquet file. The csv is kept even if the .parquet file couldn't be finished. """
+        self._results_writer.close()
+        if self._parquet_writer is not None:
+            try:
+                self._parquet_writer.close()
+            except Exception as ex:
+                print('A problem occured with, ' + self._parquet_writer.path)
+                print(ex)
+                self._parquet_writer = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_saved_paths(self) -> str:
+        """ Where the rows were saved, for the messages. """
+        if self._parquet_writer is not None and self._parquet_writer.rows:
+            return '{} and {}'.format(self._results_writer.path, self._parquet_writer.path)
+        return self._results_writer.path
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _start_trace(self) -> None:
+        """ Starting the Trace_Recorder if trace is on. The workers write their spans to a folder in results/ until _save_trace() puts them together. """
+        if self.trace:
+            Trace_Recorder.enable(directory = 'results/trace_parts_{}/'.format(os.getpid()))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _save_trace(self) -> None:
+        """ Saving the trace to results/ with the current time as it's name, if trace is on. """
+        if self.trace:
+            path = self._get_results_path(extension = '_trace.json')
+            print('The trace of {} step(s) was saved to {}.'.format(Trace_Recorder.save(path = path), path))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _start_progress(self) -> None:
+        """ Starting the Progress_Reporter if progress is on. It writes results/status.json so it is always in the same place for other programs to find. """
+        if self.progress:
+            self._progress_reporter = Progress_Reporter(status_path = self._directories[4] + 'status.json')
+            self._progress_reporter.start()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _update_progress(self,
+                         total: int = None) -> None:
+        """ Counting one more game sheet as done, if progress is on. """
+        if self._progress_reporter is not None:
+            self._progress_reporter.update(total = total)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _finish_progress(self,
+                         state: str) -> None:
+        """ Writing the last status with how the run ended and stopping the Progress_Reporter, if progress is on. """
+        if self._progress_reporter is not None:
+            self._progress_reporter.finish(state = state)
+            self._progress_reporter = None
 
 #-----------------------------------------------------------------------------------------------------------------------
     def _save_key_dict(self):
@@ -165,6 +391,12 @@ if __name__ == "__main__":
     if sys.platform.startswith('win'):
         # On Windows calling this function is necessary.
         multiprocessing.freeze_support()
-    Bubble_Sheet().main()
+    bubble_sheet = Bubble_Sheet(trace = '--trace' in sys.argv[1:],
+                                progress = '--progress' in sys.argv[1:],
+                                parquet = '--no-parquet' not in sys.argv[1:])
+    if '--watch' in sys.argv[1:]:
+        bubble_sheet.watch()
+    else:
+        bubble_sheet.main()
 
 # End of file.
\ No newline at end of file
@@ -0,0 +1,463 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Detector.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import cv2
+import numpy as np
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import Trace_Recorder
+
+# ======================================================================================================================
+# Detector Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Detector():
+    """
+    Finding the marks on a single page that is already in memory. \n
+    Split out of OMR so the same steps can be ran on an image read from a file or on a pdf page that was never saved to the drive. \n
+    The object is small on purpose since it gets sent to the worker processes.
+    """
+    def __init__(self,
+                 mark_color: str = 'blue',
+                 backend: str = 'contour',
+                 coarse_factor: int = 4,
+                 reduced_decode: bool = False,
+                 min_mark_pixels: int = 12,
+                 roi_radius: int = 50,
+                 fill_threshold: float = 0.5,
+                 min_area_ratio: float = 0.25,
+                 min_aspect_ratio: float = 0.4,
+                 min_fill_ratio: float = 0.5) -> None:
+        """
+        Args:
+            mark_color (str, optional): You can use different colored pens or pencils for making the paper. Called with lower() so it matches the method call.
+                Defaults to 'blue'.
+            backend (str, optional): How the marks are found. \n
+                'contour' runs everything on the full page. \n
+                'multiscale' finds them on a shrunk page first and only uses the full page around the ones that aren't clear. \n
+                'roi' only looks at a small window around each bubble from the keys. Until set_bubble_centres() is called it uses 'contour', which is how the keys themselves are read. \n
+                'components' skips the morphology and uses connectedComponentsWithStats on the threshold itself, so every blob is measured in one call and the specks and strokes are dropped by their size and shape instead.
+                Defaults to 'contour'.
+            coarse_factor (int, optional): How much a 700 dpi page is shrunk by for the 'multiscale' backend.
+                Defaults to 4.
+            reduced_decode (bool, optional): Have read_image() let libjpeg decode the image at 1/2, 1/4, or 1/8 the size instead of decoding all of it.
+                Defaults to False.
+            min_mark_pixels (int, optional): Smallest a filled bubble can be across, in pixels, for the reduced decode. The reduction is picked from this and the 50 pixel bubbles on the 700 dpi sheet.
+                Defaults to 12.
+            roi_radius (int, optional): Half the width of the window around each bubble for the 'roi' backend, in 700 dpi pixels. It is the same as pixel_differential so a sheet can shift as much as Scantron allows.
+                Defaults to 50.
+            fill_threshold (float, optional): How much of a bubble has to be filled in for the 'roi' backend to count it as marked.
+                Defaults to 0.5.
+            min_area_ratio (float, optional): Smallest blob kept by the 'components' backend, compared to the area of a filled bubble.
+                Defaults to 0.25.
+            min_aspect_ratio (float, optional): Narrowest blob kept by the 'components' backend, as the short side over the long side of its bounding box.
+                Defaults to 0.4.
+            min_fill_ratio (float, optional): Least of its bounding box a blob has to fill for the 'components' backend to keep it, so a diagonal stroke isn't taken as a mark. A filled circle is about 0.79.
+                Defaults to 0.5.
+
+        Raises:
+            ValueError: If the backend isn't one of the ones listed.
+        """
+
+        # Class init values.
+        self.mark_color: str = mark_color.lower()
+        self.backend: str = backend.lower()
+        self.coarse_factor: int = coarse_factor
+        self.reduced_decode: bool = reduced_decode
+        self.min_mark_pixels: int = min_mark_pixels
+        self.roi_radius: int = roi_radius
+        self.fill_threshold: float = fill_threshold
+        self.min_area_ratio: float = min_area_ratio
+        self.min_aspect_ratio: float = min_aspect_ratio
+        self.min_fill_ratio: float = min_fill_ratio
+        if self.backend not in ('contour', 'multiscale', 'roi', 'components'):
+            raise ValueError('Unknown detector backend: ' + backend)
+
+        # Created within and used by the class.
+        self._mark_diameter: int = 50  # Filled bubble at 700 dpi.
+        self._mark_area: float = np.pi * (self._mark_diameter / 2) ** 2
+        self._erode_size: int = 5  # Kernel sizes for _clean_mask() at 700 dpi.
+        self._open_size: int = 25
+        self._close_size: int = 7
+        self._decode_reduction: int = 1
+        self._bubble_centres: np.ndarray = None
+        self._reduced_flags: dict = {
+                                     1: cv2.IMREAD_COLOR,
+                                     2: cv2.IMREAD_REDUCED_COLOR_2,
+                                     4: cv2.IMREAD_REDUCED_COLOR_4,
+                                     8: cv2.IMREAD_REDUCED_COLOR_8
+                                     }
+        self._lower_range: np.ndarray
+        self._upper_range: np.ndarray
+
+        # Initializing methods.
+        self._get_color_range()
+        self._get_decode_reduction()
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _get_color_range(self) -> None:
+        """ HSV range that the opencv tries to match for the given mark color. """
+        # Threshold for blue.
+        if self.mark_color == 'blue':
+            self._lower_range = np.array([110,50,50])
+            self._upper_range = np.array([130,255,255])
+        else:
+            self._lower_range = np.array([110,50,50])
+            self._upper_range = np.array([130,255,255])
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_decode_reduction(self) -> None:
+        """
+        Picking the most the images can be shrunk by while decoding, where a filled bubble is still at least min_mark_pixels across. \n
+        Images are taken to be at 700 dpi like the pdf pages, so a 50 pixel bubble allows a reduction of 4 with the default of 12.
+        """
+        self._decode_reduction = 1
+        if self.reduced_decode:
+            for reduction in (8, 4, 2):
+                if self._mark_diameter / reduction >= self.min_mark_pixels:
+                    self._decode_reduction = reduction
+                    break
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _kernel_size(self,
+                     size: int,
+                     scale: float) -> tuple:
+        """ Kernel size for a 700 dpi page brought down to the resolution of the page being read. """
+        size = max(1, int(round(size * scale)))
+        return (size, size)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _threshold(self,
+                   img: np.ndarray,
+                   color_order: str) -> np.ndarray:
+        """ Converting to HSV and keeping only the pixels in the mark color's range. """
+        with Trace_Recorder.span('hsv_threshold', category = 'detector'):
+            if color_order == 'RGB':
+                hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
+            else:
+                hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+            return cv2.inRange(hsv, self._lower_range, self._upper_range)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _clean_mask(self,
+                    mask: np.ndarray,
+                    scale: float) -> np.ndarray:
+        """ Erode, open, and close to get rid of stray pen strokes and fill in the bubbles. """
+        with Trace_Recorder.span('morphology', category = 'detector'):
+            # Apply erosion.
+            kernel = np.ones(shape = self._kernel_size(self._erode_size, scale),
+                             dtype = np.uint8)
+            erode = cv2.erode(src = mask,
+                              kernel = kernel,
+                              iterations = 1)
+
+            # Apply morphology open.
+            kernel = cv2.getStructuringElement(shape = cv2.MORPH_ELLIPSE,
+                                               ksize = self._kernel_size(self._open_size, scale))
+            first_morph = cv2.morphologyEx(src = erode,
+                                           kernel = kernel,
+                                           op = cv2.MORPH_OPEN)
+
+            # Apply morphology close.
+            kernel = cv2.getStructuringElement(shape = cv2.MORPH_ELLIPSE,
+                                               ksize = self._kernel_size(self._close_size, scale))
+            return cv2.morphologyEx(src = first_morph,
+                                    kernel = kernel,
+                                    op = cv2.MORPH_CLOSE)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_blobs(self,
+                   mask: np.ndarray) -> list[tuple]:
+        """
+        Finding the outside contour of each blob in the mask.
+
+        Returns:
+            list[tuple]: Centroid X and Y, area, and bounding box (x, y, w, h) of each blob in the mask's pixels.
+        """
+        blobs = []
+        with Trace_Recorder.span('contours', category = 'detector'):
+            contours = cv2.findContours(image = mask,
+                                        mode = cv2.RETR_EXTERNAL,
+                                        method= cv2.CHAIN_APPROX_NONE)
+            contours = contours[0] if len(contours) == 2 else contours[1]
+
+            # Gathering the points that were detected in the image.
+            for contour in contours:
+                M = cv2.moments(contour)
+                if M["m00"] != 0:  # For divide by zero erros the popped up a few times.
+                    blobs.append((M["m10"] / M["m00"], M["m01"] / M["m00"], M["m00"], cv2.boundingRect(contour)))
+        return blobs
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _find_marks_contour(self,
+                            img: np.ndarray,
+                            color_order: str,
+                            scale: float) -> tuple:
+        """ The original way of finding the marks, with the threshold, morphology, and contours all ran on the full page. """
+        marks = []
+        mask = self._clean_mask(mask = self._threshold(img = img,
+                                                       color_order = color_order),
+                                scale = scale)
+        for cx, cy, _, _ in self._get_blobs(mask = mask):
+            marks.append((int(cx / scale), int(cy / scale)))
+        return tuple(sorted(marks))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_components(self,
+                        mask: np.ndarray) -> tuple:
+        """
+        Every blob in the mask from one connectedComponentsWithStats call, with the background taken out.
+
+        Returns:
+            tuple: Centroids (n, 2), areas (n,), and bounding boxes (n, 4) as x, y, w, h, all as arrays in the mask's pixels.
+        """
+        with Trace_Recorder.span('components', category = 'detector'):
+            _, _, stats, centroids = cv2.connectedComponentsWithStats(image = mask,
+                                                                      connectivity = 8)
+        return centroids[1:], stats[1:, cv2.CC_STAT_AREA], stats[1:, :cv2.CC_STAT_AREA]
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _find_marks_components(self,
+                               img: np.ndarray,
+                               color_order: str,
+                               scale: float) -> tuple:
+        """
+        Same threshold as 'contour', but without the morphology, which is most of the time 'contour' takes. 
+        The blobs are measured all at once and filtered with arrays instead of cleaning up the mask first and looping over every contour. \n
+        Specks smaller than min_area_ratio of a bubble, long thin strokes under min_aspect_ratio, and diagonal strokes that fill less than min_fill_ratio of their box are dropped.
+        """
+        mask = self._threshold(img = img,
+                               color_order = color_order)
+        centroids, areas, boxes = self._get_components(mask = mask)
+        sides = boxes[:, 2:4]
+        aspect = sides.min(axis = 1) / np.maximum(sides.max(axis = 1), 1)
+        fill = areas / np.maximum(sides[:, 0] * sides[:, 1], 1)
+        keep = (areas >= self.min_area_ratio * self._mark_area * scale * scale) & (aspect >= self.min_aspect_ratio) & (fill >= self.min_fill_ratio)
+        marks = (centroids[keep] / scale).astype(np.int32)
+        return tuple(sorted(map(tuple, marks.tolist())))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _find_marks_multiscale(self,
+                               img: np.ndarray,
+                               color_order: str,
+                               scale: float) -> tuple:
+        """
+        Finding the marks on a copy of the page shrunk to 1 / coarse_factor of 700 dpi, then only going back to the full page where it isn't clear. \n
+        If the page is already at or below that resolution, like from a reduced decode, it is just ran with find_marks' contour steps. \n
+        A blob that is about the size of a filled bubble is taken as is. Anything smaller or larger, like a half filled bubble or two touching, is ran again at full resolution in a window around it. \n
+        The marks still come back in 700 dpi pixels so they match the keys the same as find_marks().
+        """
+        height, width = img.shape[:2]
+        shrink = max(1.0, self.coarse_factor * scale)  # How much this page still needs to be shrunk by.
+        small_width, small_height = int(width / shrink), int(height / shrink)
+        if shrink == 1.0 or small_width < 1 or small_height < 1:
+            return self._find_marks_contour(img = img,
+                                            color_order = color_order,
+                                            scale = scale)
+
+        small = cv2.resize(src = img,
+                           dsize = (small_width, small_height),
+                           interpolation = cv2.INTER_AREA)
+        ratio = small_width / width  # Small page pixels for each full page pixel.
+        small_scale = scale * ratio
+        expected_area = self._mark_area * (small_scale ** 2)
+        margin = self._kernel_size(self._open_size, scale)[0]
+
+        marks = []
+        mask = self._clean_mask(mask = self._threshold(img = small,
+                                                       color_order = color_order),
+                                scale = small_scale)
+        for cx, cy, area, (x, y, w, h) in self._get_blobs(mask = mask):
+            if 0.5 * expected_area <= area <= 2 * expected_area:
+                marks.append((int(cx / small_scale), int(cy / small_scale)))
+                continue
+
+            # Ambiguous so the window around it is checked on the full page.
+            left, top = int(x / ratio), int(y / ratio)
+            right, bottom = int((x + w) / ratio) + 1, int((y + h) / ratio) + 1
+            x0, y0 = max(0, left - margin), max(0, top - margin)
+            x1, y1 = min(width, right + margin), min(height, bottom + margin)
+            window = self._clean_mask(mask = self._threshold(img = img[y0:y1, x0:x1],
+                                                             color_order = color_order),
+                                      scale = scale)
+            for wx, wy, _, _ in self._get_blobs(mask = window):
+                # Only keeping the ones from this blob so overlapping windows don't count a mark twice.
+                if left <= wx + x0 <= right and top <= wy + y0 <= bottom:
+                    marks.append((int((wx + x0) / scale), int((wy + y0) / scale)))
+        return tuple(sorted(marks))
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def find_marks(self,
+                   img: np.ndarray,
+                   color_order: str = 'BGR',
+                   scale: float = 1.0) -> tuple:
+        """
+        Gathering all of the spots where the paper is marked. \n
+        cv2.imread gives BGR while pages coming from pdf2image are RGB, so the conversion to HSV is picked from color_order instead of making another copy of the page. \n
+        The kernel sizes were picked for a 700 dpi page. If the page is at a different resolution, scale shrinks them to match and the marks are put back into 700 dpi pixels.
+
+        Args:
+            img (np.ndarray): The page to look for marks on.
+            color_order (str, optional): Channel order of img, 'BGR' or 'RGB'.
+                Defaults to 'BGR'.
+            scale (float, optional): Pixels in img for each pixel of a 700 dpi page, like 300 / 700 for a 300 dpi scan.
+                Defaults to 1.0.
+
+        Returns:
+            tuple: Tuple of tuples that contain the X and Y coordinates of every mark that was detected on the sheet, sorted.
+        """
+        if self.backend == 'multiscale':
+            return self._find_marks_multiscale(img = img,
+                                               color_order = color_order,
+                                               scale = scale)
+        if self.backend == 'components':
+            return self._find_marks_components(img = img,
+                                               color_order = color_order,
+                                               scale = scale)
+        if self.backend == 'roi' and self._bubble_centres is not None:
+            fill = self.measure_fill(img = img,
+                                     color_order = color_order,
+                                     scale = scale)
+            return tuple(sorted(tuple(int(v) for v in centre) for centre in self._bubble_centres[fill >= self.fill_threshold]))
+        return self._find_marks_contour(img = img,
+                                        color_order = color_order,
+                                        scale = scale)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def set_bubble_centres(self,
+                           bubble_centres: list[tuple]) -> None:
+        """
+        Giving the detector the bubble locations from the keys so the 'roi' backend knows where to look.
+
+        Args:
+            bubble_centres (list[tuple]): X and Y of every bubble in 700 dpi pixels, in the order of OMR._bubble_location.
+        """
+        self._bubble_centres = np.asarray(bubble_centres, dtype = np.int32).reshape(-1, 2)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def measure_fill(self,
+                     img: np.ndarray,
+                     color_order: str = 'BGR',
+                     scale: float = 1.0) -> np.ndarray:
+        """
+        How filled in each bubble is, without doing anything to the rest of the page. \n
+        The window around every bubble is pulled out at once into one small stack, which is converted to HSV and thresholded together. 
+        There are no contours, so there is nothing to divide by zero.
+
+        Args:
+            img (np.ndarray): The page to look for marks on.
+            color_order (str, optional): Channel order of img, 'BGR' or 'RGB'.
+                Defaults to 'BGR'.
+            scale (float, optional): Pixels in img for each pixel of a 700 dpi page.
+                Defaults to 1.0.
+
+        Returns:
+            np.ndarray: Fill from 0 to 1 for each bubble, in the order given to set_bubble_centres().
+        """
+        if self._bubble_centres is None:
+            raise ValueError('set_bubble_centres() has to be called before measure_fill().')
+        height, width = img.shape[:2]
+        radius = max(1, int(round(self.roi_radius * scale)))
+        offsets = np.arange(-radius, radius)
+        centres = np.rint(self._bubble_centres * scale).astype(np.int32)
+        xs = np.clip(centres[:, 0, None] + offsets, 0, width - 1)
+        ys = np.clip(centres[:, 1, None] + offsets, 0, height - 1)
+
+        # (bubbles, window, window, 3) stacked into one tall image for opencv.
+        windows = img[ys[:, :, None], xs[:, None, :]]
+        mask = self._threshold(img = windows.reshape(-1, 2 * radius, 3),
+                               color_order = color_order)
+        counts = np.count_nonzero(mask.reshape(len(centres), -1), axis = 1)
+        return np.minimum(1.0, counts / (self._mark_area * scale * scale))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def read_image(self,
+                   path: str) -> tuple:
+        """
+        Reading in an image to look for marks on. \n
+        With reduced_decode, jpegs are decoded straight to a smaller size by libjpeg's DCT scaling, so the full size image is never made. 
+        The scale that comes back goes to find_marks() so the marks are still in 700 dpi pixels.
+
+        Args:
+            path (str): Location of the image.
+
+        Returns:
+            tuple: The image as BGR, and its scale compared to a 700 dpi page.
+        """
+        with Trace_Recorder.span('imread', category = 'image', file = path):
+            img = cv2.imread(path, self._reduced_flags[self._decode_reduction])
+        if img is None:
+            raise FileNotFoundError('Could not read the image ' + path)
+        return img, 1 / self._decode_reduction
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def draw_overlay(self,
+                     img: np.ndarray,
+                     marks: tuple,
+                     color_order: str = 'BGR',
+                     scale: float = 1.0) -> np.ndarray:
+        """
+        Putting a 'dot' on each of the spots a mark was found so it can be saved and checked by eye.
+
+        Args:
+            img (np.ndarray): The page the marks were found on. It is copied and not changed.
+            marks (tuple): The X and Y coordinates returned from find_marks().
+            color_order (str, optional): Channel order of img, 'BGR' or 'RGB'. The overlay is always returned as BGR for cv2.imwrite.
+                Defaults to 'BGR'.
+            scale (float, optional): Same scale that was given to find_marks() for img.
+                Defaults to 1.0.
+
+        Returns:
+            np.ndarray: Copy of the page with the marks drawn on it.
+        """
+        if color_order == 'RGB':
+            result = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+        else:
+            result = img.copy()
+        for cx, cy in marks:
+            cv2.circle(result, (int(cx * scale), int(cy * scale)), max(1, int(25 * scale)), (0, 255, 0), -1)
+        return result
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def get_parameters(self) -> dict:
+        """
+        Every setting that changes which marks are found, used to tell if saved marks can be used again. \n
+        The bubble locations are only included for the 'roi' backend once they are set, since nothing else looks at them.
+
+        Returns:
+            dict: The settings, with the arrays as lists.
+        """
+        parameters: dict = {
+                            'mark_color': self.mark_color,
+                            'backend': self.backend,
+                            'lower_range': self._lower_range.tolist(),
+                            'upper_range': self._upper_range.tolist(),
+                            'kernel_sizes': [self._erode_size, self._open_size, self._close_size],
+                            'mark_diameter': self._mark_diameter,
+                            'decode_reduction': self._decode_reduction
+                            }
+        if self.backend == 'multiscale':
+            parameters['coarse_factor'] = self.coarse_factor
+        elif self.backend == 'components':
+            parameters['min_area_ratio'] = self.min_area_ratio
+            parameters['min_aspect_ratio'] = self.min_aspect_ratio
+            parameters['min_fill_ratio'] = self.min_fill_ratio
+            parameters['morphology'] = False
+        elif self.backend == 'roi' and self._bubble_centres is not None:
+            parameters['roi_radius'] = self.roi_radius
+            parameters['fill_threshold'] = self.fill_threshold
+            parameters['bubble_centres'] = self._bubble_centres.tolist()
+        return parameters
+
+# End of file.
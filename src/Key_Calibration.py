@@ -0,0 +1,167 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Key_Calibration.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import json
+import hashlib
+import numpy as np
+from datetime import datetime
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Mark_Cache import hash_file
+
+# ======================================================================================================================
+# Key_Calibration Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Key_Calibration():
+    """
+    Saving the averaged bubble locations from the keys so the keys don't have to be read every time it is ran. \n
+    The file has a fingerprint of the key files and detector settings that made it, and it is only used again while those are the same. \n
+    How far each bubble moved between the keys is saved with it, which shows if a key was scanned crooked or a pixel_differential is too tight.
+    """
+    def __init__(self,
+                 path: str = 'results/key_calibration.json') -> None:
+        """
+        Args:
+            path (str, optional): Location of the calibration file.
+                Defaults to 'results/key_calibration.json'.
+        """
+
+        # Class init values.
+        self.path: str = path
+
+        # Created within and used by the class.
+        self._data: dict = {}
+
+        # Initializing methods.
+        self._read()
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _read(self) -> None:
+        """ Reading in the calibration file if there is one. A broken file is treated the same as not having one. """
+        try:
+            with open(self.path, 'r') as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def make_fingerprint(self,
+                         paths: list[str],
+                         parameters: dict) -> str:
+        """
+        Hashing the key files along with the settings used to read them. \n
+        The file hashes are sorted first, so renaming or reordering the keys gives the same fingerprint.
+
+        Args:
+            paths (list[str]): Location of every key image and pdf.
+            parameters (dict): Anything that changes which marks are found, like Detector.get_parameters().
+
+        Returns:
+            str: The fingerprint.
+        """
+        fingerprint = hashlib.blake2b(digest_size = 32)
+        for file_hash in sorted(hash_file(path = path) for path in paths):
+            fingerprint.update(file_hash)
+        fingerprint.update(json.dumps(parameters, sort_keys = True, default = str).encode('utf8'))
+        return fingerprint.hexdigest()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def get_bubble_location(self,
+                            fingerprint: str = None) -> dict:
+        """
+        The saved bubble locations.
+
+        Args:
+            fingerprint (str, optional): Fingerprint of the current keys. The saved locations are only returned if it matches. None returns them no matter what keys made them.
+                Defaults to None.
+
+        Returns:
+            dict: The same layout as OMR._bubble_location, or None if there is no usable calibration.
+        """
+        if 'bubble_location' not in self._data:
+            return None
+        if fingerprint is not None and self._data.get('fingerprint') != fingerprint:
+            return None
+        return {int(key): [tuple(value[0]), value[1]] for key, value in self._data['bubble_location'].items()}
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def save(self,
+             fingerprint: str,
+             bubble_location: dict,
+             key_spread: dict,
+             key_count: int) -> None:
+        """
+        Writing the calibration file. It goes to a temporary file first so a crash can't leave half of one behind.
+
+        Args:
+            fingerprint (str): Fingerprint of the keys from make_fingerprint().
+            bubble_location (dict): The averaged bubble locations.
+            key_spread (dict): How far each bubble moved between the keys, from get_key_spread().
+            key_count (int): Number of keys that were averaged.
+        """
+        self._data = {
+                      'fingerprint': fingerprint,
+                      'created': datetime.now().isoformat(timespec = 'seconds'),
+                      'key_count': key_count,
+                      'bubble_location': {str(key): [[int(value[0][0]), int(value[0][1])], value[1]] for key, value in bubble_location.items()},
+                      'key_spread': {str(key): value for key, value in key_spread.items()}
+                      }
+        temp_path = self.path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok = True)
+            with open(temp_path, 'w') as f:
+                json.dump(self._data, f, indent = 1)
+            os.replace(temp_path, self.path)
+        except OSError as ex:
+            print('Could not save the key calibration.')
+            print(ex)
+
+# ======================================================================================================================
+# Key Averaging
+# ----------------------------------------------------------------------------------------------------------------------
+def get_key_average(sorted_key_values: list) -> tuple:
+    """
+    Averaging every bubble across all of the keys at once. \n
+    The averages are cut down to whole pixels the same way int() did in the loops this replaced.
+
+    Args:
+        sorted_key_values (list): Each key's marks from OMR._sort_key_values(), all the same length.
+
+    Returns:
+        tuple: Tuple of the averaged (X, Y) of each bubble.
+    """
+    keys = np.asarray(sorted_key_values, dtype = np.int64).reshape(len(sorted_key_values), -1, 2)
+    average = (keys.sum(axis = 0) / len(keys)).astype(np.int64)
+    return tuple((int(x), int(y)) for x, y in average)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def get_key_spread(sorted_key_values: list) -> dict:
+    """
+    How far each bubble moved between the keys.
+
+    Args:
+        sorted_key_values (list): Each key's marks from OMR._sort_key_values(), all the same length.
+
+    Returns:
+        dict: Bubble number and its X and Y standard deviation and range (max - min), in pixels.
+    """
+    keys = np.asarray(sorted_key_values, dtype = np.int64).reshape(len(sorted_key_values), -1, 2)
+    std = keys.std(axis = 0)
+    spread = keys.max(axis = 0) - keys.min(axis = 0)
+    return {i: {'std': [round(float(std[i][0]), 2), round(float(std[i][1]), 2)],
+                'range': [int(spread[i][0]), int(spread[i][1])]} for i in range(keys.shape[1])}
+
+# End of file.
@@ -0,0 +1,202 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Mark_Cache.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+# ======================================================================================================================
+# Mark_Cache Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Mark_Cache():
+    """
+    Saving the marks found on each image so they don't have to be found again the next time it is ran. \n
+    Each entry is named from a hash of the image's contents and the detector settings, so renaming a file still finds it and changing a setting doesn't use old marks. \n
+    The oldest used entries are deleted once the folder is over max_size_mb so it doesn't keep growing over the season. \n
+    The folder is only looked through when the cache is made, after that the size and the order the entries were used in are kept here. 
+    Once it is over max_size_mb it is brought down to low_water of it, so it isn't deleting entries for every one that is saved. \n
+    The workers each have one with evict off that only reads and saves entries, and the main process finds what they saved with refresh().
+    """
+    def __init__(self,
+                 directory: str = 'results/mark_cache/',
+                 max_size_mb: float = 256,
+                 low_water: float = 0.9,
+                 evict: bool = True) -> None:
+        """
+        Args:
+            directory (str, optional): Folder the entries are saved in. It is made if it doesn't exist.
+                Defaults to 'results/mark_cache/'.
+            max_size_mb (float, optional): Most the folder can hold before the oldest used entries are deleted.
+                Defaults to 256.
+            low_water (float, optional): Fraction of max_size_mb the folder is brought down to once it is over.
+                Defaults to 0.9.
+            evict (bool, optional): Keep track of the size and delete the oldest used entries. Off, the folder isn't looked through at all.
+                Defaults to True.
+        """
+
+        # Class init values.
+        self.directory: str = directory
+        self.max_size_mb: float = max_size_mb
+        self.low_water: float = low_water
+        self.evict: bool = evict
+
+        # Created within and used by the class.
+        self._max_size: int = int(max_size_mb * 1024 * 1024)
+        self._low_water_size: int = int(self._max_size * min(1, max(0, low_water)))
+        self._size: int = 0
+        self._entries: OrderedDict = OrderedDict()  # Key: size, least recently used first.
+
+        # Initializing methods.
+        os.makedirs(self.directory, exist_ok = True)
+        if self.evict:
+            self._load_entries()
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _load_entries(self) -> None:
+        """
+        Finding everything already in the folder and the order it was used in. \n
+        get() touches each entry it reads, so the modified time is when it was last used, even by an earlier run.
+        """
+        entries: list[tuple] = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, entry.name[:-len('.json')], stat.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._size = sum(self._entries.values())
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _use(self,
+             key: str,
+             size: int) -> None:
+        """ Keeping the size of an entry and moving it to the most recently used. """
+        if not self.evict:
+            return
+        self._size += size - self._entries.pop(key, 0)
+        self._entries[key] = size
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _evict(self) -> None:
+        """ Deleting the least recently used entries once the folder is over max_size_mb, until it is down to low_water of it. """
+        if self._size <= self._max_size:
+            return
+        while self._entries and self._size > self._low_water_size:
+            key, size = self._entries.popitem(last = False)
+            self._size -= size
+            try:
+                os.remove(self._get_path(key = key))
+            except OSError:
+                continue
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_path(self,
+                  key: str) -> str:
+        """ Location of the entry for key. """
+        return os.path.join(self.directory, key + '.json')
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def make_key(self,
+                 path: str,
+                 parameters: dict,
+                 file_hash: bytes = None) -> str:
+        """
+        Hashing the contents of a file along with the settings used to find its marks.
+
+        Args:
+            path (str): Location of the image.
+            parameters (dict): Anything that changes which marks are found, like Detector.get_parameters().
+            file_hash (bytes, optional): hash_file() of the image if it was already hashed, so it isn't read again.
+                Defaults to None.
+
+        Returns:
+            str: Name of the entry for the file and settings.
+        """
+        key_hash = hashlib.blake2b(digest_size = 32)
+        key_hash.update(file_hash if file_hash is not None else hash_file(path = path))
+        key_hash.update(json.dumps(parameters, sort_keys = True, default = str).encode('utf8'))
+        return key_hash.hexdigest()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def get(self,
+            key: str) -> tuple:
+        """
+        The marks saved for key.
+
+        Args:
+            key (str): Name of the entry from make_key().
+
+        Returns:
+            tuple: Tuple of tuples of the X and Y of every mark, or None if there isn't an entry for it.
+        """
+        path = self._get_path(key = key)
+        try:
+            with open(path, 'r') as f:
+                marks = json.load(f)
+                size = f.tell()
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        self._use(key = key,
+                  size = size)
+        return tuple(tuple(mark) for mark in marks)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def put(self,
+            key: str,
+            marks: tuple) -> None:
+        """
+        Saving the marks for key. It is written to a temporary file first so a crash can't leave half of an entry behind.
+
+        Args:
+            key (str): Name of the entry from make_key().
+            marks (tuple): The X and Y coordinates returned from Detector.find_marks().
+        """
+        path = self._get_path(key = key)
+        temp_path = path + '.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump([[int(x), int(y)] for x, y in marks], f, separators = (',', ':'))
+                size = f.tell()
+            os.replace(temp_path, path)
+            self._use(key = key,
+                      size = size)
+        except OSError as ex:
+            print('Could not save the marks to the cache.')
+            print(ex)
+            return
+        self._evict()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def refresh(self) -> None:
+        """ Looking through the folder again for entries saved by the workers, then deleting the oldest used ones if it is over max_size_mb. """
+        if not self.evict:
+            return
+        self._load_entries()
+        self._evict()
+
+# ======================================================================================================================
+# Hashing
+# ----------------------------------------------------------------------------------------------------------------------
+def hash_file(path: str) -> bytes:
+    """ blake2b hash of everything in a file, read a megabyte at a time. """
+    file_hash = hashlib.blake2b(digest_size = 32)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            file_hash.update(chunk)
+    return file_hash.digest()
+
+# End of file.
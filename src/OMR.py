@@ -9,11 +9,21 @@
 # ----------------------------------------------------------------------------------------------------------------------
 import os
 import cv2
+import signal
 import re
 import numpy as np
-from pdf2image import convert_from_path
-from concurrent.futures import ProcessPoolExecutor as ppe
-from itertools import repeat
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Detector import Detector
+from Rasterizer import Rasterizer, get_page_ranges
+from Mark_Cache import Mark_Cache, hash_file
+from Key_Calibration import Key_Calibration, get_key_average, get_key_spread
+from Pool_Scheduler import Pool_Scheduler, is_memory_error
+from Batch_Decoder import Batch_Decoder
+from Task_Graph import Task_Graph
+import Trace_Recorder
 
 # ======================================================================================================================
 # OMR Class
@@ -30,7 +40,19 @@ class OMR():
                  directories: list[str],
                  image_format: str = 'jpg',
                  save_image_overlay: bool = False,
-                 mark_color: str = 'blue') -> None:
+                 mark_color: str = 'blue',
+                 save_pdf_images: bool = False,
+                 pdf_page_window: int = 1,
+                 max_pdf_pages_in_flight: int = None,
+                 extract_pdf_jpegs: bool = True,
+                 detector_backend: str = 'contour',
+                 reduced_decode: bool = False,
+                 use_mark_cache: bool = True,
+                 mark_cache_size_mb: float = 256,
+                 use_key_calibration: bool = True,
+                 game_sheet_mode: str = 'batch',
+                 pool_recycle_tasks: int = 1000,
+                 pixel_differential: int = None) -> None:
         """
         Everything as far as data collection and saving is ran in this guy. 
 
@@ -43,8 +65,42 @@ class OMR():
                 Defaults to False.
             mark_color (str, optional): You can use different colored pens or pencils for making the paper. Called with lower() so it matches the method call.
                 Defaults to 'blue'.
+            save_pdf_images (bool, optional): The pdf pages are sent straight to the detector. This also saves each page as an image in 'results/pdf_images/' to keep a copy of them.
+                Defaults to False.
+            pdf_page_window (int, optional): Most pdf pages that are rendered and held in memory at one time by each process.
+                Defaults to 1.
+            max_pdf_pages_in_flight (int, optional): Most pdf pages being rendered across all of the processes at one time.
+                Defaults to None, which is cpu_threads * pdf_page_window.
+            extract_pdf_jpegs (bool, optional): Pdf pages that are only a scanned jpeg have it pulled out and used as is instead of being rendered at 700 dpi.
+                Defaults to True.
+            detector_backend (str, optional): How the marks are found, see Detector. 'multiscale' works on a shrunk copy of the page and is much faster. 
+                'roi' only looks around the bubble locations from the keys, so the keys are averaged before any game sheets are read.
+                'components' skips the morphology and measures every blob in one call with connectedComponentsWithStats, filtering them by size and shape. About 3 times faster than 'contour'.
+                Defaults to 'contour'.
+            reduced_decode (bool, optional): Jpegs are decoded at a fraction of their size, picked so the bubbles are still big enough to be found. 
+                Defaults to False.
+            use_mark_cache (bool, optional): Marks found on each image and pdf page are saved in 'results/mark_cache/' and used again the next time the same file is ran with the same settings. 
+                It isn't used for reading when save_image_overlay is on since the overlays need the image, or for pdfs when save_pdf_images is on.
+                Defaults to True.
+            mark_cache_size_mb (float, optional): Most the mark cache can hold before the oldest used entries are deleted.
+                Defaults to 256.
+            use_key_calibration (bool, optional): The averaged bubble locations are saved in 'results/key_calibration.json' and used instead of reading the keys again while the keys are unchanged. 
+                If there are no keys at all, the last calibration is used.
+                Defaults to True.
+            game_sheet_mode (str, optional): When the game sheets are read. 'batch' reads them all before the init is done and get_game_sheet_values() has every one of them. 
+                'stream' renames and finds them, but leaves reading them to stream_game_sheets() so each one can be used as soon as it is done. 
+                If the keys need to be read, that is done alongside the game sheets too instead of before them.
+                'watch' only reads the keys, and the game sheets are left alone so stream_game_sheet_files() can be called as they show up. That is how the watch mode in Bubble_Sheet uses it. The game sheet files are not renamed.
+                Defaults to 'batch'.
+            pool_recycle_tasks (int, optional): One process pool is started and used for the key and game sheet pdfs and images. 
+                It is only started over after this many tasks, to let go of anything opencv or poppler leaked. None keeps it until close().
+                Defaults to 1000.
+            pixel_differential (int, optional): Has the workers decode each game sheet into its row, the same as set_decoding(). 
+                Giving it here lets the pool start with the decoder instead of sending it to every worker again once they are running.
+                Defaults to None, which hands back the marks.
 
         Raises:
+            ValueError: If game_sheet_mode isn't 'batch', 'stream', or 'watch'.
             FileExistsError: If no keys were found in the folders. 
             FileExistsError: If no game sheets were found in the folders. 
         """
@@ -55,10 +111,47 @@ class OMR():
         self.save_image_overlay: bool = save_image_overlay
         self.mark_color: str = mark_color
         self.directories: list[str] = directories
+        self.save_pdf_images: bool = save_pdf_images
+        self.pdf_page_window: int = max(1, pdf_page_window)
+        self.max_pdf_pages_in_flight: int = max_pdf_pages_in_flight if max_pdf_pages_in_flight else cpu_threads * self.pdf_page_window
+        self.extract_pdf_jpegs: bool = extract_pdf_jpegs
+        self.detector_backend: str = detector_backend
+        self.reduced_decode: bool = reduced_decode
+        self.use_mark_cache: bool = use_mark_cache
+        self.mark_cache_size_mb: float = mark_cache_size_mb
+        self.use_key_calibration: bool = use_key_calibration
+        self.game_sheet_mode: str = game_sheet_mode.lower()
+        self.pool_recycle_tasks: int = pool_recycle_tasks
 
         # Created within and used by the class. 
-        self._keys_pdf_names: list[str]
-        self._scantron_pdf_names: list[str]
+        self._detector: Detector = Detector(mark_color = self.mark_color,
+                                            backend = self.detector_backend,
+                                            reduced_decode = self.reduced_decode)
+        self._rasterizer: Rasterizer = Rasterizer(dpi = 700,
+                                                  poppler_path = 'poppler/Library/bin',
+                                                  page_window = self.pdf_page_window,
+                                                  thread_count = self.cpu_threads,
+                                                  extract_embedded = self.extract_pdf_jpegs)
+        # The workers each get one poppler thread since the pages are already split up between them.
+        self._worker_rasterizer: Rasterizer = Rasterizer(dpi = self._rasterizer.dpi,
+                                                         poppler_path = self._rasterizer.poppler_path,
+                                                         page_window = self.pdf_page_window,
+                                                         thread_count = 1,
+                                                         extract_embedded = self.extract_pdf_jpegs)
+        self._pdf_image_directory: str = self.directories[4] + 'pdf_images/'
+        self._mark_cache: Mark_Cache = None
+        self._file_hashes: dict = {}  # Path: hash of the image or pdf, cleared for each batch of files.
+        self._key_calibration: Key_Calibration = None
+        self._key_fingerprint: str = None
+        self._key_spread: dict = {}
+        self._scheduler: Pool_Scheduler = Pool_Scheduler(max_workers = self.cpu_threads,
+                                                         recycle_after = self.pool_recycle_tasks)
+        self._decoder: Batch_Decoder = None
+        self._pixel_differential: int = pixel_differential
+        self._keys_ready: bool = False
+        self._game_sheet_total: int = 0
+        self._keys_pdf_names: list[str] = []
+        self._scantron_pdf_names: list[str] = []
         self._scantron_names: list[str]
         self._key_names: list[str]
         self._scanned_values: list[tuple] = []
@@ -67,182 +160,38 @@ class OMR():
         self._scanned_keys_average: tuple
         self._key_column_index: tuple(int) = (0, 8, 18, 26, 31, 39, 60, 74, 80, 94, 110, 124, 130, 136, 142)
         self._total_key_values: int = 155
-        self._bubble_location: dict = {
-                                       # Column 1
-                                       0: [(905, 2335), 'Auton HP TL'],
-                                       1: [(903, 2497), 'Auton HP ML'],
-                                       2: [(903, 2658), 'Auton HP LLCone'],
-                                       3: [(903, 2818), 'Auton HP LLCube'],
-                                       4: [(897, 3949), 'Tele HP TL'],
-                                       5: [(896, 4110), 'Tele HP ML'],
-                                       6: [(896, 4271), 'Tele HP LLCone'],
-                                       7: [(896, 4433), 'Tele HP LLCube'],
-                                       # Column 2
-                                       8: [(1158, 1368), 'Blue Alliance'],
-                                       9: [(1157, 1529), 'Red Alliance'],
-                                       10: [(1154, 2336), 'Auton HP TM'],
-                                       11: [(1154, 2497), 'Auton HP MM'],
-                                       12: [(1153, 2658), 'Auton HP MLCone'],
-                                       13: [(1153, 2819), 'Auton HP MLCube'],
-                                       14: [(1147, 3949), 'Tele HP TM'],
-                                       15: [(1146, 4111), 'Tele HP MM'],
-                                       16: [(1146, 4272), 'Tele HP MLCone'],
-                                       17: [(1145, 4433), 'Tele HP MLCube'],
-                                       # Column 3
-                                       18: [(1408, 2337), 'Auton HP TR'],
-                                       19: [(1407, 2498), 'Auton HP MR'],
-                                       20: [(1406, 2658), 'Auton HP LRCone'],
-                                       21: [(1404, 2818), 'Auton HP LRCube'],
-                                       22: [(1400, 3950), 'Tele HP TR'],
-                                       23: [(1401, 4111), 'Tele HP MR'],
-                                       24: [(1399, 4271), 'Tele HP LRCone'],
-                                       25: [(1399, 4433), 'Tele HP LRCube'],
-                                       # Column 4
-                                       26: [(1651, 4918), 'Floor Yes'],
-                                       27: [(1651, 5076), 'Single Sub Yes'],
-                                       28: [(1650, 5234), 'Double Sub Slider Yes'],
-                                       29: [(1650, 5393), 'Double Sub Chute Yes'],
-                                       30: [(1648, 6353), 'Parked Yes'],
-                                       # Column 5
-                                       31: [(1913, 2338), 'Auton M TL'],
-                                       32: [(1912, 2498), 'Auton M ML'],
-                                       33: [(1912, 2660), 'Auton M LLCone'],
-                                       34: [(1911, 2819), 'Auton M LLCube'],
-                                       35: [(1906, 3950), 'Tele M TL'],
-                                       36: [(1905, 4111), 'Tele M ML'],
-                                       37: [(1905, 4272), 'Tele M LLCone'],
-                                       38: [(1905, 4434), 'Tele M LLCube'],
-                                       # Column 6
-                                       39: [(2175, 405), 'Match Deca Zero'],
-                                       40: [(2174, 569), 'Match Zero'],
-                                       41: [(2172, 1053), 'Team Kilo Zero'],
-                                       42: [(2170, 1211), 'Team Hecto Zero'],
-                                       43: [(2169, 1370), 'Team Deca Zero'],
-                                       44: [(2169, 1532), 'Team Zero'],
-                                       45: [(2166, 2338), 'Auton M TM'],
-                                       46: [(2165, 2499), 'Auton M MM'],
-                                       47: [(2165, 2660), 'Auton M MLCone'],
-                                       48: [(2164, 2820), 'Auton M MLCube'],
-                                       49: [(2163, 3142), 'Auton Charge Station On'],
-                                       50: [(2159, 3951), 'Tele M TM'],
-                                       51: [(2158, 4112), 'Tele M MM'],
-                                       52: [(2158, 4273), 'Tele M MLCone'],
-                                       53: [(2158, 4435), 'Tele M MLCube'],
-                                       54: [(2157, 4918), 'Floor No'],
-                                       55: [(2156, 5076), 'Single Sub No'],
-                                       56: [(2156, 5235), 'Double Sub Slider No'],
-                                       57: [(2155, 5393), 'Parked No'],
-                                       58: [(2154, 6031), 'End Game Charge Station On'],
-                                       59: [(2152, 6353), 'Parked No'],
-                                       # Column 7
-                                       60: [(2425, 406), 'Match Deca One'],
-                                       61: [(2425, 569), 'Match One'],
-                                       62: [(2422, 1053), 'Team Kilo One'],
-                                       63: [(2420, 1211), 'Team Hecto One'],
-                                       64: [(2419, 1371), 'Team Deca One'],
-                                       65: [(2419, 1532), 'Team One'],
-                                       66: [(2416, 2339), 'Auton M TR'],
-                                       67: [(2416, 2500), 'Auton M MR'],
-                                       68: [(2415, 2661), 'Auton M LRCone'],
-                                       69: [(2414, 2821), 'Auton M LRCube'],
-                                       70: [(2409, 3951), 'Tele M TR'],
-                                       71: [(2409, 4113), 'Tele M MR'],
-                                       72: [(2409, 4274), 'Tele M LRCone'],
-                                       73: [(2408, 4435), 'Tele M LRCube'],
-                                       # Column 8
-                                       74: [(2677, 406), 'Match Deca Two'],
-                                       75: [(2675, 570), 'Match Two'],
-                                       76: [(2673, 1054), 'Team Kilo Two'],
-                                       77: [(2671, 1213), 'Team Hecto Two'],
-                                       78: [(2671, 1372), 'Team Deca Two'],
-                                       79: [(2671, 1533), 'Team Two'],
-                                       # Column 9
-                                       80: [(2927, 409), 'Match Deca Three'],
-                                       81: [(2927, 573), 'Match Three'],
-                                       82: [(2923, 1056), 'Team Kilo Three'],
-                                       83: [(2922, 1214), 'Team Hecto Three'],
-                                       84: [(2921, 1374), 'Team Deca Three'],
-                                       85: [(2921, 1535), 'Team Three'],
-                                       86: [(2918, 2341), 'Auton ST TL'],
-                                       87: [(2916, 2503), 'Auton ST ML'],
-                                       88: [(2916, 2664), 'Auton ST LLCone'],
-                                       89: [(2915, 2824), 'Auton ST LLCube'],
-                                       90: [(2910, 3954), 'Tele ST TL'],
-                                       91: [(2910, 4114), 'Tele ST ML'],
-                                       92: [(2909, 4275), 'Tele ST LLCone'],
-                                       93: [(2909, 4437), 'Tele ST LLCube'],
-                                       # Column 10
-                                       94: [(3178, 410), 'Match Deca Four'],
-                                       95: [(3178, 573), 'Match Four'],
-                                       96: [(3175, 1057), 'Team Kilo Four'],
-                                       97: [(3174, 1216), 'Team Hecto Four'],
-                                       98: [(3173, 1375), 'Team Deca Four'],
-                                       99: [(3173, 1536), 'Team Four'],
-                                       100: [(3169, 2342), 'Auton ST TM'],
-                                       101: [(3169, 2504), 'Auton ST MM'],
-                                       102: [(3168, 2665), 'Auton ST MLCone'],
-                                       103: [(3168, 2823), 'Auton ST MLCube'],
-                                       104: [(3166, 3145), 'Auton Charge Station Balanced'],
-                                       105: [(3163, 3955), 'Tele ST TM'],
-                                       106: [(3162, 4115), 'Tele ST MM'],
-                                       107: [(3161, 4276), 'Tele ST MLCone'],
-                                       108: [(3161, 4439), 'Tele ST MLCube'],
-                                       109: [(3156, 6034), 'End Game Charge Station Balanced'],
-                                       # Column 11
-                                       110: [(3431, 410), 'Match Deca Five'],
-                                       111: [(3430, 574), 'Match Five'],
-                                       112: [(3427, 1058), 'Team Kilo Five'],
-                                       113: [(3426, 1217), 'Team Hecto Five'],
-                                       114: [(3426, 1376), 'Team Deca Five'],
-                                       115: [(3426, 1538), 'Team Five'],
-                                       116: [(3422, 2343), 'Auton ST TR'],
-                                       117: [(3422, 2505), 'Auton ST MR'],
-                                       118: [(3421, 2665), 'Auton ST LRCone'],
-                                       119: [(3420, 2825), 'Auton ST LRCube'],
-                                       120: [(3415, 3955), 'Tele ST TR'],
-                                       121: [(3415, 4116), 'Tele ST MR'],
-                                       122: [(3415, 4277), 'Tele ST LRCone'],
-                                       123: [(3415, 4438), 'Tele ST LRCube'],
-                                       # Column 12
-                                       124: [(3684, 412), 'Match Deca Six'],
-                                       125: [(3683, 576), 'Match Six'],
-                                       126: [(3680, 1060), 'Team Kilo Six'],
-                                       127: [(3679, 1217), 'Team Hecto Six'],
-                                       128: [(3679, 1377), 'Team Deca Six'],
-                                       129: [(3678, 1538), 'Team Six'],
-                                       # Column 13
-                                       130: [(3937, 412), 'Match Deca Seven'],
-                                       131: [(3936, 577), 'Match Seven'],
-                                       132: [(3933, 1061), 'Team Kilo Seven'],
-                                       133: [(3932, 1219), 'Team Hecto Seven'],
-                                       134: [(3931, 1379), 'Team Deca Seven'],
-                                       135: [(3931, 1539), 'Team Seven'],
-                                       # Column 14
-                                       136: [(4187, 414), 'Match Deca Eight'],
-                                       137: [(4187, 577), 'Match Eight'],
-                                       138: [(4184, 1061), 'Team Kilo Eight'],
-                                       139: [(4182, 1220), 'Team Hecto Eight'],
-                                       140: [(4182, 1379), 'Team Deca Eight'],
-                                       141: [(4182, 1540), 'Team Eight'],
-                                       # Column 15
-                                       142: [(4438, 415), 'Match Deca Nine'],
-                                       143: [(4437, 578), 'Match Nine'],
-                                       144: [(4434, 1063), 'Team Kilo Nine'],
-                                       145: [(4433, 1221), 'Team Hecto Nine'],
-                                       146: [(4433, 1381), 'Team Deca Nine'],
-                                       147: [(4433, 1541), 'Team Nine'],
-                                       148: [(4429, 2346), 'Left Community Yes'],
-                                       149: [(4428, 2508), 'Left Community No'],
-                                       150: [(4425, 3150), 'Auton Charge Station Not Attempted'],
-                                       151: [(4419, 4925), 'Travel Between HP and CS'],
-                                       152: [(4418, 5082), 'Travel Over Charge'],
-                                       153: [(4417, 5241), 'Travel Between ST and CS'],
-                                       154: [(4414, 6037), 'End Game Charge Station Not Attempted']
-                                       }
+        self._bubble_location: dict = get_default_bubble_location()
 
         # Initializing functions.
-        # Checking for and converting pdf files if those are used instead of pictures.
-        # Converting key pdfs. 
+        if self.game_sheet_mode not in ('batch', 'stream', 'watch'):
+            raise ValueError('Unknown game sheet mode: ' + game_sheet_mode)
+        if self.use_mark_cache:
+            try:
+                self._mark_cache = Mark_Cache(directory = self.directories[4] + 'mark_cache/',
+                                              max_size_mb = self.mark_cache_size_mb)
+            except OSError as ex:
+                print('The mark cache could not be used. Every image will be processed.')
+                print(ex)
+
+        # Changing the name(s) of the key image(s)
+        self._change_names(directory = self.directories[1],
+                           data = 'Key',
+                           file_type = '.' + self.image_format)
+        
+        # Changing the name(s) of the scantron image(s)
+        if self.game_sheet_mode != 'watch':
+            self._change_names(directory = self.directories[3],
+                               data = 'Scantron',
+                               file_type = '.' + self.image_format)
+        
+        # Getting the names of the images to run the data. 
+        # Done before the pdfs so any archived pages are not read in a second time.
+        self._get_key_image_names()
+        if self.game_sheet_mode != 'watch':
+            self._get_scantron_image_names()
+
+        # Checking for pdf files if those are used instead of pictures.
+        # Key pdfs. 
         if not os.listdir(self.directories[0]):
             print('No keys were found to convert from a pdf. Looking for {} image format.'.format(self.image_format))
         else:
@@ -250,105 +199,42 @@ class OMR():
                                data = 'Key',
                                file_type='.pdf')
             self._get_key_pdf_names()
-            self._convert_pdf_to_image(pdf_directory = 0, 
-                                       image_directory = 1,
-                                       data = 'Key',
-                                       pdf_names = self._keys_pdf_names)
         
-        # Converting game sheet pdfs.
-        if not os.listdir(self.directories[2]):
+        # Game sheet pdfs.
+        if self.game_sheet_mode != 'watch' and not os.listdir(self.directories[2]):
             print('No game sheets were found to convert from a pdf. Looking for {} image format.'.format(self.image_format))
-        else:
+        elif self.game_sheet_mode != 'watch':
             self._change_names(directory = self.directories[2],
                                data = 'Scantron',
                                file_type='.pdf')
             self._get_scantron_pdf_names()
-            self._convert_pdf_to_image(pdf_directory = 2,
-                                       image_directory = 3,
-                                       data = 'Scantron',
-                                       pdf_names = self._scantron_pdf_names)
-        
-        # Changing the name(s) of the key image(s)
-        self._change_names(directory = self.directories[1],
-                           data = 'Key',
-                           file_type = '.' + self.image_format)
-        
-        # Changing the name(s) of the scantron image(s)
-        self._change_names(directory = self.directories[3],
-                           data = 'Scantron',
-                           file_type = '.' + self.image_format)
-        
-        # Getting the names of the images to run the data. 
-        self._get_key_image_names()
-        self._get_scantron_image_names()
-        if not self._key_names:
+
+        key_calibrated: bool = self._load_key_calibration()
+        if not self._key_names and not self._keys_pdf_names and not key_calibrated:
             del self
-            raise FileNotFoundError('No image(s) for key(s) to process were found.')
-        if not self._scantron_names:
+            raise FileNotFoundError('No image(s) or pdf(s) for key(s) to process were found.')
+        if self.game_sheet_mode != 'watch' and not self._scantron_names and not self._scantron_pdf_names:
             del self
-            raise FileNotFoundError('No image(s) for game sheets(s) to process were found.')
-        
-        # Getting the marks for the scantron key(s) that are entered and the actual game sheets.
-        try:
-            with ppe(max_workers = cpu_threads) as executor:
-                executor_keys = executor.map(self._process_images_executor,
-                                            repeat(1),
-                                            self._key_names,
-                                            repeat('key'),
-                                            repeat(self.mark_color),
-                                            repeat(self.save_image_overlay))
-
-            self._scanned_keys = tuple(executor_keys)
-        # Catching if the computer doesn't have enough ram to allocate the multithreading. 
-        except:
-            try: # Clear up the memory allocated for the processpool 
-                del executor_keys
-            except:
-                pass
-            print('An error occured trying to multithread the key processing. Attempting to run them one at a time.')
-            try:
-                self._process_images(image_directory = 1, 
-                                     image_names = self._key_names, 
-                                     data = 'key',
-                                     color = self.mark_color)
-            
-            except:
-                del self
-                raise RuntimeError('Could not process the keys(s).')
+            raise FileNotFoundError('No image(s) or pdf(s) for game sheets(s) to process were found.')
         
-        # Getting the values from the game sheets.
-        try:
-            with ppe(max_workers = cpu_threads) as executor:
-                executor_scantron = executor.map(self._process_images_executor,
-                                                repeat(3),
-                                                self._scantron_names,
-                                                repeat('scantron'),
-                                                repeat(self.mark_color),
-                                                repeat(self.save_image_overlay))
-
-            self._scanned_values = tuple(executor_scantron)
-        # Catching if the computer doesn't have enough ram to allocate the multithreading. 
-        except:
-            try: # Clear up the memory allocated for the processpool 
-                del executor_scantron
-            except:
+        # The keys are only read if they changed since the saved calibration was made.
+        # When they did, they are read alongside the game sheets in stream_game_sheets(), except for the watch mode which needs them before any game sheets show up.
+        if key_calibrated:
+            self._use_bubble_location()
+        else:
+            self._set_worker_state()
+        # Started once the workers have everything they need, so their first task doesn't have to send it again.
+        self._scheduler.warm()
+        if not key_calibrated and self.game_sheet_mode == 'watch':
+            graph = Task_Graph(scheduler = self._scheduler)
+            self._add_key_tasks(graph = graph)
+            for _ in graph.run(description = 'key processing'):
                 pass
-            print('An error occured trying to multithread the game sheet processing. Attempting to run them one at a time.')
-            try:
-                self._process_images(image_directory = 3,
-                                     image_names = self._scantron_names,
-                                     data = 'scantron',
-                                     color = self.mark_color)
-            except:
-                del self
-                raise RuntimeError('Could not process the game sheet(s).')
-
-        self._sort_key_values()
-        if not self._sorted_key_values:
-            del self
-            raise IndexError('No keys of appropriate length were found.')
-        self._get_key_average()
-        self._update_scantron_bubbles()
+
+        # Only the batch mode reads the game sheets here. The others read them one at a time as they are asked for.
+        if self.game_sheet_mode != 'batch':
+            return
+        self._scanned_values = list(self.stream_game_sheets())
 
 # ======================================================================================================================
 # Low Level Private Functions
@@ -364,13 +250,13 @@ class OMR():
 
 #-----------------------------------------------------------------------------------------------------------------------
     def _get_scantron_pdf_names(self) -> None:
-        """ Creating list of strings from the pdf files of game sheets. """
-        self._scantron_pdf_names = [i for i in os.listdir(self.directories[2]) if i.endswith('.pdf')]
+        """ Creating list of strings from the pdf files of game sheets, sorted so the rows are saved in the same order every time. """
+        self._scantron_pdf_names = sorted(i for i in os.listdir(self.directories[2]) if i.endswith('.pdf'))
 
 #-----------------------------------------------------------------------------------------------------------------------
     def _get_scantron_image_names(self) -> None:
-        """ Creating list of strings from the image files of game sheets. """
-        self._scantron_names = [i for i in os.listdir(self.directories[3]) if (i.endswith('.' + self.image_format))]
+        """ Creating list of strings from the image files of game sheets, sorted so the rows are saved in the same order every time. """
+        self._scantron_names = sorted(i for i in os.listdir(self.directories[3]) if (i.endswith('.' + self.image_format)))
 
 #-----------------------------------------------------------------------------------------------------------------------    
     def _change_names(self,
@@ -389,19 +275,20 @@ class OMR():
             data (str): Mostly for renaming and differentiating between keys and game sheets. 
             file_type (str): The file type that each  will be renamed. 
         """
-        enum_list: list = [i for i in enumerate(os.scandir(directory), 1) if i[1].name.endswith(file_type)]
-        for name in enum_list:
-            offset: int = 1
-            source = directory + name[1].name
-            destination = directory + data + '_' + str(name[0]) + file_type
-            while True:
-                try:
-                    os.rename(source, destination)
-                except:
-                    destination = directory + data + '_' + str(name[0] + offset) + file_type
-                    offset += 1
-                    continue
-                break
+        with Trace_Recorder.span('change_names', category = 'files', directory = directory):
+            enum_list: list = [i for i in enumerate(os.scandir(directory), 1) if i[1].name.endswith(file_type)]
+            for name in enum_list:
+                offset: int = 1
+                source = directory + name[1].name
+                destination = directory + data + '_' + str(name[0]) + file_type
+                while True:
+                    try:
+                        os.rename(source, destination)
+                    except:
+                        destination = directory + data + '_' + str(name[0] + offset) + file_type
+                        offset += 1
+                        continue
+                    break
 #-----------------------------------------------------------------------------------------------------------------------    
     def _sub_name(self,
                   name: str) -> str:
@@ -418,37 +305,88 @@ class OMR():
         return re.sub('[^0-9A-Za-z_-]', '', name)
 
 #-----------------------------------------------------------------------------------------------------------------------
-    def _convert_pdf_to_image(self,
-                              pdf_directory: int,
-                              image_directory: int,
-                              data: str, 
-                              pdf_names: list[str]) -> None:
+    def _get_worker_args(self,
+                         rasterizer: Rasterizer) -> tuple:
+        """ Arguments for _init_worker(), being everything the worker functions need that is the same for every task. """
+        return (self._detector,
+                rasterizer,
+                self._pdf_image_directory if self.save_pdf_images else None,
+                self.image_format,
+                self.directories[4] if self.save_image_overlay else None,
+                self._decoder,
+                self._mark_cache.directory if self._mark_cache is not None else None,
+                Trace_Recorder.get_directory())
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _set_worker_state(self) -> None:
+        """
+        Sending the detector and rasterizer settings, and the decoder if there is one, to each worker once when it starts. \n
+        Each task then only has to send its path or pages instead of pickling all of the settings again for every image. 
+        This is called again whenever one of them changes, like the bubble centres after the keys. The pool keeps running and each worker picks up the change with its next task.
+        """
+        self._scheduler.set_initializer(initializer = _init_worker,
+                                        initargs = self._get_worker_args(rasterizer = self._worker_rasterizer),
+                                        local_initializer = _load_worker_state)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_pdf_tasks(self,
+                       pdf_directory: int,
+                       data: str,
+                       pdf_names: list[str]) -> tuple:
         """
-        Taking the various pdf files and converting them to an image of the specified file type from the class init. \n
-        Outter loop is used for each pdf file that is found in the location. \n
-        Inner loop is for each page within the pdf. \n
+        Splitting the pdf files up by page range into tasks for _detect_pdf_pages() on the Pool_Scheduler. \n
+        Pages already in the mark cache are taken from it, and only the rest are rendered. Each task is a run of at most pdf_page_window of them, 
+        with the memory it needs going by the page size and dpi. 
+        A task is only the pdf, its pages, and the pdf's hash for the mark cache, the workers already have the rasterizer and detector from _set_worker_state().
 
         Args:
             pdf_directory (int): Index for the list of folder names.
-            image_directory (int): Index for the list of folder names.
             data (str): Whethere it is a key or scantron. 
             pdf_names (list[str]): Names of the files to be converted from pdf. 
+
+        Returns:
+            tuple: The tasks, as keyword arguments for _detect_pdf_pages() and the memory it needs, the pdf number of each task, 
+                the pdf and page number with the marks of each page that was in the mark cache, and the pdf and page number of every page in order.
         """
+        rasterizer = self._worker_rasterizer
+        read_cache = self._mark_cache is not None and not self.save_image_overlay and not self.save_pdf_images
+        tasks: list[tuple] = []
+        task_pdfs: list[int] = []
+        cached_pages: list[tuple] = []
+        pages: list[tuple] = []
         for i in range(len(pdf_names)):  # Each pdf
-                images = convert_from_path(pdf_path = self.directories[pdf_directory] + pdf_names[i],
-                                           poppler_path = 'poppler/Library/bin',
-                                           dpi = 700,
-                                           thread_count = self.cpu_threads)
-
-                for j in range(len(images)):  # Each page of the pdf
-                    try:
-                        location = self.directories[image_directory] + data + '_' + str(i+1) + '-' + str(j+1) + '.' + self.image_format
-                        images[j].save(fp = location,
-                                       bitmap_format = self.image_format)
-                    except:
-                        location = self.directories[image_directory] + data + '_' + str(i+1) + '-' + str(j+1) + '.jpg'
-                        images[j].save(fp = location,
-                                       bitmap_format = 'jpg')
+            pdf_path = self.directories[pdf_directory] + pdf_names[i]
+            try:
+                page_count = rasterizer.get_page_count(pdf_path = pdf_path)
+                page_size = rasterizer.get_page_size(pdf_path = pdf_path)
+                file_hash = self._get_file_hash(path = pdf_path) if self._mark_cache is not None else None
+            except Exception as ex:
+                print('A problem occured with, ' + pdf_names[i])
+                print(ex)
+                continue
+            uncached_pages: list[int] = []
+            for page_number in range(1, page_count + 1):
+                pages.append((i + 1, page_number))
+                marks = self._get_cached_page(pdf_path = pdf_path,
+                                              page_number = page_number) if read_cache else None
+                if marks is None:
+                    uncached_pages.append(page_number)
+                else:
+                    cached_pages.append(((i + 1, page_number), marks))
+            for first_page, last_page in get_page_ranges(pages = uncached_pages,
+                                                         page_window = self.pdf_page_window):  # Each page range
+                tasks.append(({'pdf_path': pdf_path,
+                               'first_page': first_page,
+                               'last_page': last_page,
+                               'page_prefix': data + '_' + str(i + 1),
+                               'file_hash': file_hash},
+                              self._scheduler.estimate_page_memory(page_size = page_size,
+                                                                   dpi = rasterizer.dpi,
+                                                                   pages = last_page - first_page + 1)))
+                task_pdfs.append(i + 1)
+        if cached_pages:
+            print('{} of {} pdf page(s) were already processed and taken from the mark cache.'.format(len(cached_pages), len(pages)))
+        return tasks, task_pdfs, cached_pages, pages
 
 #-----------------------------------------------------------------------------------------------------------------------
     def _sort_key_values(self) -> None:
@@ -478,18 +416,11 @@ class OMR():
     def _get_key_average(self) -> None:
         """
         Taking all of the keys that were found and averaging their values together. \n
-        Since they are going to be printed off and scanned, it will give a more realistic value versus creating it from filling in the blanks on a saved image. 
+        Since they are going to be printed off and scanned, it will give a more realistic value versus creating it from filling in the blanks on a saved image. \n
+        All of the keys are averaged at once as one array, and how far each bubble moved between them is kept for the calibration file.
         """
-        temp_key_average: list = []
-        for i in range(self._total_key_values):  # Each of the possible mark locations 
-            temp_x_sum, temp_y_sum, temp_x_average, temp_y_average = 0, 0, 0, 0
-            for j in range(len(self._sorted_key_values)):  # Each of the keys and their identical spots. 
-                temp_x_sum += self._sorted_key_values[j][i][0]
-                temp_y_sum += self._sorted_key_values[j][i][1]
-            temp_x_average = int(temp_x_sum / len(self._sorted_key_values))
-            temp_y_average = int(temp_y_sum / len(self._sorted_key_values))
-            temp_key_average.append(tuple((temp_x_average, temp_y_average)))
-        self._scanned_keys_average = tuple(temp_key_average)
+        self._scanned_keys_average = get_key_average(sorted_key_values = self._sorted_key_values)
+        self._key_spread = get_key_spread(sorted_key_values = self._sorted_key_values)
 
 #-----------------------------------------------------------------------------------------------------------------------
     def _update_scantron_bubbles(self):
@@ -500,187 +431,325 @@ class OMR():
         for key in self._bubble_location:
             self._bubble_location[key][0] = self._scanned_keys_average[key]
 #-----------------------------------------------------------------------------------------------------------------------
-    def _process_images(self,
-                        image_directory: int,
-                        image_names: list[str],
-                        data: str,
-                        color: str) -> None:
-        """_summary_
+    def _get_file_hash(self,
+                       path: str) -> bytes:
+        """ Hash of an image's contents, kept so it is only read once in each call to stream_game_sheet_files(). """
+        if path not in self._file_hashes:
+            self._file_hashes[path] = hash_file(path = path)
+        return self._file_hashes[path]
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_mark_cache_key(self,
+                            path: str,
+                            page_number: int = None) -> str:
+        """
+        Name of the mark cache entry for an image, or a page of a pdf, with the detector settings as they are right now. \n
+        Only the file's hash is kept, the settings are added in each time since the 'roi' backend's change once the keys are averaged.
+        """
+        return self._mark_cache.make_key(path = path,
+                                         parameters = _get_mark_cache_parameters(detector = self._detector,
+                                                                                 dpi = self._worker_rasterizer.dpi,
+                                                                                 page_number = page_number,
+                                                                                 extract_embedded = self._worker_rasterizer.extract_embedded),
+                                         file_hash = self._get_file_hash(path = path))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_cached_page(self,
+                         pdf_path: str,
+                         page_number: int) -> tuple:
+        """ The marks saved in the mark cache for one page of a pdf, or None if it isn't there. """
+        try:
+            return self._mark_cache.get(key = self._get_mark_cache_key(path = pdf_path,
+                                                                       page_number = page_number))
+        except OSError:
+            return None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_cached_marks(self,
+                          image_directory: int,
+                          image_names: list[str]) -> tuple:
+        """
+        Splitting the images into the ones already in the mark cache and the ones that still need to be processed. \n
+        Nothing is read from the cache when save_image_overlay is on, since the overlays have to be made from the image.
+
         Args:
             image_directory (int): Index for the list of folder names.
-            image_names (list[str]): Names of the files to be read in and marked locations saved. 
-            data (str): Where the image is a key or game sheet.
-            color (str): The color range that the opencv tries to match.
+            image_names (list[str]): Names of the images.
+
+        Returns:
+            tuple: The marks for each image that was in the cache, and the names of the ones that weren't.
         """
-        for i in range(len(image_names)):
+        if self._mark_cache is None or self.save_image_overlay:
+            return (), image_names
+        cached_marks: list[tuple] = []
+        uncached_names: list[str] = []
+        for name in image_names:
+            marks = None
             try:
-                marks = []
-                img = cv2.imread(self.directories[image_directory] + image_names[i])
-                hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-
-                # Threshold for blue.
-                if color == 'blue':
-                    lower_range = np.array([110,50,50])
-                    upper_range = np.array([130,255,255])
-                else:
-                    lower_range = np.array([110,50,50])
-                    upper_range = np.array([130,255,255])
-
-                thresh = cv2.inRange(hsv, lower_range, upper_range)
-
-                # Apply erosion.
-                kernel = np.ones(shape = (5,5),
-                                    dtype = np.uint8)
-                erode = cv2.erode(src = thresh,
-                                    kernel = kernel,
-                                    iterations = 1)
-
-                # Apply morphology open.
-                kernel = cv2.getStructuringElement(shape = cv2.MORPH_ELLIPSE, 
-                                                   ksize = (25,25))
-                first_morph = cv2.morphologyEx(src = erode, 
-                                               kernel = kernel, 
-                                               op = cv2.MORPH_OPEN)
-
-                # Apply morphology close.
-                kernel = cv2.getStructuringElement(shape = cv2.MORPH_ELLIPSE,
-                                                   ksize = (7,7))
-                second_morph = cv2.morphologyEx(src = first_morph,
-                                                kernel = kernel, 
-                                                op = cv2.MORPH_CLOSE)
-
-                # Get contours
-                contours = cv2.findContours(image = second_morph,
-                                            mode = cv2.RETR_EXTERNAL,
-                                            method= cv2.CHAIN_APPROX_NONE)
-                contours = contours[0] if len(contours) == 2 else contours[1]
-
-                # If the image overlay needs to be saved. 
-                if self.save_image_overlay:
-                    result = img.copy() 
-                
-                # Gathering the points that were detected in the image. 
-                for contour in contours:
-                    M = cv2.moments(contour)
-                    if M["m00"] != 0:  # For divide by zero erros the popped up a few times. 
-                        cx = int(M["m10"] / M["m00"])
-                        cy = int(M["m01"] / M["m00"])
-                    else:
-                        continue
-                    pt = (cx,cy)
-                    marks.append(pt)
-                    if self.save_image_overlay:
-                        cv2.circle(result, (cx, cy), 25, (0, 255, 0), -1)
-                
-                # Saving the data according to if it was a key or game sheet. 
-                if data == 'key' and self.save_image_overlay:
-                    self._scanned_keys.append(tuple(sorted(marks)))
-                    cv2.imwrite(('results/' + 'key_overlay_' + str(i) + '.jpeg'), result)
-                elif data == 'key':
-                    self._scanned_keys.append(tuple(sorted(marks)))
-                elif data == 'scantron' and self.save_image_overlay:
-                    self._scanned_values.append(tuple(sorted(marks)))
-                    cv2.imwrite(('results/' + 'scantron_overlay_' + str(i) + '.jpeg'), result)
-                elif data == 'scantron':
-                    self._scanned_values.append(tuple(sorted(marks)))
-            except Exception as ex:
-                print('Error with {}. Continuing with the other files.'.format(image_names[i]))
+                marks = self._mark_cache.get(key = self._get_mark_cache_key(path = self.directories[image_directory] + name))
+            except OSError:
+                pass
+            if marks is None:
+                uncached_names.append(name)
+            else:
+                cached_marks.append(marks)
+        if cached_marks:
+            print('{} of {} image(s) were already processed and taken from the mark cache.'.format(len(cached_marks), len(image_names)))
+        return tuple(cached_marks), uncached_names
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _cache_marks(self,
+                     image_directory: int,
+                     image_names: list[str],
+                     image_marks: list[tuple]) -> None:
+        """
+        Saving the marks found on each image to the mark cache. \n
+        Images with no marks are skipped since that is also what comes back when an image couldn't be read.
+
+        Args:
+            image_directory (int): Index for the list of folder names.
+            image_names (list[str]): Names of the images.
+            image_marks (list[tuple]): The marks found on each of them, in the same order.
+        """
+        if self._mark_cache is None:
+            return
+        for name, marks in zip(image_names, image_marks):
+            if not marks:
+                continue
+            try:
+                self._mark_cache.put(key = self._get_mark_cache_key(path = self.directories[image_directory] + name),
+                                     marks = marks)
+            except OSError:
+                continue
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _load_key_calibration(self) -> bool:
+        """
+        Using the saved bubble locations instead of reading the keys, if the key files and detector settings are the same as when they were saved. \n
+        With no keys in the folders, the saved locations are used no matter what made them.
+
+        Returns:
+            bool: True if the bubble locations were loaded and the keys don't need to be read.
+        """
+        if not self.use_key_calibration:
+            return False
+        self._key_calibration = Key_Calibration(path = self.directories[4] + 'key_calibration.json')
+        key_paths = ([self.directories[1] + name for name in self._key_names] +
+                     [self.directories[0] + name for name in self._keys_pdf_names])
+        if key_paths:
+            parameters = self._detector.get_parameters()
+            parameters['dpi'] = self._rasterizer.dpi
+            parameters['extract_pdf_jpegs'] = self.extract_pdf_jpegs
+            try:
+                self._key_fingerprint = self._key_calibration.make_fingerprint(paths = key_paths,
+                                                                               parameters = parameters)
+            except OSError as ex:
+                print('The key(s) could not be fingerprinted, so they will be read.')
                 print(ex)
+                return False
+            bubble_location = self._key_calibration.get_bubble_location(fingerprint = self._key_fingerprint)
+        else:
+            bubble_location = self._key_calibration.get_bubble_location()
+            if bubble_location is not None:
+                print('No keys were found. Using the bubble locations from the last key calibration.')
+        
+        if bubble_location is None or any(key not in bubble_location for key in self._bubble_location):
+            return False
+        self._scanned_keys_average = tuple(bubble_location[key][0] for key in range(self._total_key_values))
+        self._update_scantron_bubbles()
+        if key_paths:
+            print('The key(s) are unchanged, so the saved key calibration was used.')
+        return True
 
 #-----------------------------------------------------------------------------------------------------------------------
-    def _process_images_executor(self,
-                                 image_directory: int,
-                                 image_name: str,
-                                 data: str,
-                                 color: str,
-                                 save_image_overlay: bool) -> tuple:
+    def _save_key_calibration(self) -> None:
+        """ Saving the averaged bubble locations along with the fingerprint of the keys that made them. """
+        if self._key_calibration is None or self._key_fingerprint is None:
+            return
+        self._key_calibration.save(fingerprint = self._key_fingerprint,
+                                   bubble_location = self._bubble_location,
+                                   key_spread = self._key_spread,
+                                   key_count = len(self._sorted_key_values))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_image_tasks(self,
+                         image_directory: int,
+                         image_names: list[str],
+                         data: str,
+                         decode: bool = False) -> list[tuple]:
         """
-        Method for gathering all of the spots where the paper is marked. \n
-        Changed over to work with multithreading to help speed up the processing time. 
+        Making a task for _detect_image() on the Pool_Scheduler for each image, with its memory estimated from the size in its header. 
+        A task is only the image's path and where its results go, the workers already have the detector from _set_worker_state().
 
         Args:
             image_directory (int): Index for the list of folder names.
             image_names (list[str]): Names of the files to be read in and marked locations saved. 
             data (str): Where the image is a key or game sheet.
-            color (str): The color range that the opencv tries to match.
+            decode (bool, optional): The worker decodes the sheet and saves its marks to the mark cache itself, so only the row comes back. 
+                It names the entry with its own detector settings, since the 'roi' backend's are only known once the keys are averaged.
+                Defaults to False.
 
         Returns:
-            tuple: Tuple of tuples that contain the X and Y coordinates of every mark that was detected on the sheet.
+            list[tuple]: Keyword arguments for _detect_image() and the memory it needs, for each image.
         """
-        try:
-            omr_marks = []
-            img = cv2.imread(self.directories[image_directory] + image_name)
-            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-
-            # Threshold for blue.
-            if color == 'blue':
-                lower_range = np.array([110,50,50])
-                upper_range = np.array([130,255,255])
-            else:
-                lower_range = np.array([110,50,50])
-                upper_range = np.array([130,255,255])
-
-            thresh = cv2.inRange(hsv, lower_range, upper_range)
-
-            # Apply erosion.
-            kernel = np.ones(shape = (5,5),
-                             dtype = np.uint8)
-            erode = cv2.erode(src = thresh,
-                              kernel = kernel,
-                              iterations = 1)
-
-            # Apply morphology open.
-            kernel = cv2.getStructuringElement(shape = cv2.MORPH_ELLIPSE, 
-                                               ksize = (25,25))
-            first_morph = cv2.morphologyEx(src = erode, 
-                                           kernel = kernel, 
-                                           op = cv2.MORPH_OPEN)
-
-            # Apply morphology close.
-            kernel = cv2.getStructuringElement(shape = cv2.MORPH_ELLIPSE,
-                                               ksize = (7,7))
-            second_morph = cv2.morphologyEx(src = first_morph,
-                                            kernel = kernel, 
-                                            op = cv2.MORPH_CLOSE)
-
-            # Get contours
-            contours = cv2.findContours(image = second_morph,
-                                        mode = cv2.RETR_EXTERNAL,
-                                        method= cv2.CHAIN_APPROX_NONE)
-            contours = contours[0] if len(contours) == 2 else contours[1]
-
-            # If the image overlay needs to be saved. 
-            if save_image_overlay:
-                result = img.copy() 
-
-            # Gathering the points that were detected in the image. 
-            for contour in contours:
-                M = cv2.moments(contour)
-                if M["m00"] != 0:  # For divide by zero erros the popped up a few times. 
-                    cx = int(M["m10"] / M["m00"])
-                    cy = int(M["m01"] / M["m00"])
-                else:
-                    continue
-                pt = (cx,cy)
-                omr_marks.append(pt)
-                if self.save_image_overlay:
-                    cv2.circle(result, (cx, cy), 25, (0, 255, 0), -1)
-
-            # Saving the data according to if it was a key or game sheet. 
-            if data == 'key' and save_image_overlay:
-                omr_marks = tuple(sorted(omr_marks))
-                cv2.imwrite(('results/' + 'key_overlay_' + image_name), result)
-            elif data == 'key':
-                omr_marks = tuple(sorted(omr_marks))
-            elif data == 'scantron' and self.save_image_overlay:
-                omr_marks = tuple(sorted(omr_marks))
-                cv2.imwrite(('results/' + 'scantron_overlay_' + image_name), result)
-            elif data == 'scantron':
-                omr_marks = tuple(sorted(omr_marks))
-        except Exception as ex:
-            print('A problem occured with, ' + image_name)
-            print(ex)
-        return omr_marks
+        reduction = self._detector.get_parameters()['decode_reduction']
+        tasks: list[tuple] = []
+        for name in image_names:
+            path = self.directories[image_directory] + name
+            tasks.append(({'image_path': path,
+                           'overlay_path': ('results/' + data + '_overlay_' + name) if self.save_image_overlay else None,
+                           'file_hash': self._get_file_hash(path = path) if decode and self._mark_cache is not None else None,
+                           'decode': decode},
+                          self._scheduler.estimate_image_memory(path = path,
+                                                                reduction = reduction)))
+        return tasks
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _use_bubble_location(self) -> None:
+        """
+        Setting up everything that needs the averaged bubble locations once they are known, from the keys or the key calibration. \n
+        The detector gets the bubble centres, the decoder is made if set_decoding() was called, and the workers are sent both.
+        """
+        self._detector.set_bubble_centres(bubble_centres = [value[0] for value in self._bubble_location.values()])
+        if self._pixel_differential is not None:
+            self._decoder = Batch_Decoder(bubble_location = self._bubble_location,
+                                          pixel_differential = self._pixel_differential)
+        self._keys_ready = True
+        self._set_worker_state()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _add_key_tasks(self,
+                       graph: Task_Graph) -> tuple:
+        """
+        Adding the keys to the task graph, with a step after the last of them that averages them. 
+        Nothing is added if the bubble locations are already known.
+
+        Args:
+            graph (Task_Graph): Graph the keys are added to.
+
+        Returns:
+            tuple: Name of the step that averages the keys, for anything that has to come after it. Empty if there isn't one.
+        """
+        if self._keys_ready:
+            return ()
+        # The pdf pages go straight from poppler to the detector without being saved and read back in.
+        pdf_tasks, task_pdfs, cached_pages, _ = self._get_pdf_tasks(pdf_directory = 0,
+                                                                    data = 'Key',
+                                                                    pdf_names = self._keys_pdf_names)
+        # Only the ones that aren't in the mark cache are sent to the detector.
+        cached_keys, key_names = self._get_cached_marks(image_directory = 1,
+                                                        image_names = self._key_names)
+        image_tasks = self._get_image_tasks(image_directory = 1,
+                                            image_names = key_names,
+                                            data = 'key')
+        names: list = []
+        for i, (kwargs, memory) in enumerate(pdf_tasks):
+            names.append(('key_pdf', i))
+            graph.add_task(name = names[-1],
+                           function = _detect_pdf_pages,
+                           kwargs = kwargs,
+                           memory = memory)
+        for i, (kwargs, memory) in enumerate(image_tasks):
+            names.append(('key', i))
+            graph.add_task(name = names[-1],
+                           function = _detect_image,
+                           kwargs = kwargs,
+                           memory = memory)
+        graph.add_step(name = ('keys',),
+                       function = lambda: self._finish_keys(graph = graph,
+                                                            task_pdfs = task_pdfs,
+                                                            cached_pages = cached_pages,
+                                                            cached_keys = cached_keys,
+                                                            key_names = key_names),
+                       after = tuple(names))
+        return (('keys',),)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _finish_keys(self,
+                     graph: Task_Graph,
+                     task_pdfs: list[int],
+                     cached_pages: list[tuple],
+                     cached_keys: tuple,
+                     key_names: list[str]) -> None:
+        """
+        Averaging the keys once every one of them has been read, then letting the game sheets be decoded with the new bubble locations.
+
+        Args:
+            graph (Task_Graph): Graph the keys were read in.
+            task_pdfs (list[int]): Pdf number of each key pdf task.
+            cached_pages (list[tuple]): Pdf and page number with the marks of each key pdf page that was in the mark cache.
+            cached_keys (tuple): Marks of the keys that were in the mark cache.
+            key_names (list[str]): Names of the key images that were read.
+
+        Raises:
+            IndexError: If none of the keys had the right number of marks.
+        """
+        pdf_pages: list[tuple] = list(cached_pages)
+        for i, pdf_number in enumerate(task_pdfs):
+            for page_number, marks in graph.get_result(name = ('key_pdf', i)) or []:
+                pdf_pages.append(((pdf_number, page_number), marks))
+        self._scanned_keys += [marks for _, marks in sorted(pdf_pages, key = lambda x: x[0])]
+        self._scanned_keys += cached_keys
+        key_marks = [graph.get_result(name = ('key', i)) or () for i in range(len(key_names))]
+        self._cache_marks(image_directory = 1,
+                          image_names = key_names,
+                          image_marks = key_marks)
+        self._scanned_keys += key_marks
+
+        with Trace_Recorder.span('key_average', category = 'keys', keys = len(self._scanned_keys)):
+            self._sort_key_values()
+            if not self._sorted_key_values:
+                raise IndexError('No keys of appropriate length were found.')
+            self._get_key_average()
+            self._update_scantron_bubbles()
+            self._save_key_calibration()
+            self._use_bubble_location()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_rows(self,
+                  game_sheets: list[tuple]) -> list[tuple]:
+        """ The decoded rows for the marks from game sheets, or the marks as they are if there isn't a decoder. """
+        if self._decoder is None or not game_sheets:
+            return list(game_sheets)
+        return self._decoder.decode_rows(game_sheets = game_sheets)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _take_in_order(self,
+                       ready: dict,
+                       position: int,
+                       decode: bool):
+        """
+        Handing back the game sheets that are done in the order of the files, from position up to the first one that isn't done yet. \n
+        Marks that still have to be decoded are decoded here all at once. Before the keys are averaged there is nothing to decode them with, so it stops at the first of them instead.
+
+        Args:
+            ready (dict): Position of each game sheet that is done and whether it was decoded with its row or marks, or None for a pdf page that couldn't be read. 
+                Each one is taken out as it is handed back.
+            position (int): Position of the next game sheet to hand back.
+            decode (bool): The game sheets are being decoded.
+
+        Yields:
+            tuple: The marks found on a game sheet, or its row when decoding.
+
+        Returns:
+            int: Position of the next game sheet to hand back.
+        """
+        values: list = []
+        undecoded: list[tuple] = []  # Index in values and the marks, for the ones decoded here.
+        while position in ready:
+            if ready[position] is not None:
+                decoded, value = ready[position]
+                if decode and not decoded and self._decoder is None:
+                    break
+                if not decoded:
+                    undecoded.append((len(values), value))
+                values.append(value)
+            del ready[position]
+            position += 1
+        for (i, _), row in zip(undecoded, self._get_rows(game_sheets = [marks for _, marks in undecoded])):
+            values[i] = row
+        yield from values
+        return position
 
 # ======================================================================================================================
 # Public Functions
@@ -688,6 +757,7 @@ class OMR():
     def get_key_values(self) -> dict:
         """
         Method for getting the key values. \n
+        In the stream mode, keys that changed aren't averaged until stream_game_sheets() reads them along with the game sheets. \n
         Returns:
             dict: Averaged values for the location of all the bubble locations on the scantron sheet.
         """
@@ -702,6 +772,603 @@ class OMR():
         """
         return self._scanned_values
 
+#-----------------------------------------------------------------------------------------------------------------------
+    def get_game_sheet_total(self) -> int:
+        """
+        Number of game sheets the last call to stream_game_sheets() or stream_game_sheet_files() will hand back, counting each pdf page. \n
+        It is known once the first one is handed back. Pdfs that couldn't be opened aren't counted.
+        """
+        return self._game_sheet_total
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def stream_game_sheets(self):
+        """
+        Finding the marks on the game sheets that were in the folders when the OMR was made, handing each one back as soon as it is done. \n
+        If the keys still need to be read they are read at the same time. The process pool is shut down once they have all been handed back.
+
+        Yields:
+            tuple: The marks found on a game sheet, or its row after set_decoding().
+        """
+        try:
+            yield from self.stream_game_sheet_files(image_names = self._scantron_names,
+                                                    pdf_names = self._scantron_pdf_names)
+        finally:
+            self.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def stream_game_sheet_files(self,
+                                image_names: list[str],
+                                pdf_names: list[str]):
+        """
+        Finding the marks on game sheet files and handing back each sheet as soon as its worker is done with it, instead of once all of them are. \n
+        After set_decoding() the worker also decodes the sheet, so each one comes back as its finished row instead of its marks. \n
+        Everything goes through one Task_Graph. If the keys still need to be read, the game sheets are read right beside them since finding the marks doesn't need the keys. 
+        Only decoding does, so the sheets that finish first wait and are decoded here all at once when the keys are averaged, and the rest are decoded by the workers. 
+        The 'roi' backend is the exception and waits for the keys, since it only looks around the bubbles. \n
+        The sheets are handed back in the order of the files, the images in the order of image_names then each pdf's pages, so running the same files again saves the same rows in the same order. 
+        Each one is handed back once it and every one before it is done. The ones that finish early, or are in the mark cache, wait here until then. 
+        Only as many are sent to the pool as it can run at once, and the next one isn't sent until the last result is taken, so the memory stays the same no matter how many files there are. \n
+        The process pool is started the first time and kept open between calls so the workers don't import everything again for each file. close() shuts it down. \n
+        If the pool fails, the rest of the files are ran one at a time.
+
+        Args:
+            image_names (list[str]): Names of the images in scantron_images/.
+            pdf_names (list[str]): Names of the pdfs in scantron_pdf/.
+
+        Yields:
+            tuple: The marks found on a game sheet, or its row from Batch_Decoder.decode_rows() after set_decoding().
+        """
+        # Files can change between calls in the watch mode, and the hashes would otherwise pile up.
+        self._file_hashes = {}
+        graph = Task_Graph(scheduler = self._scheduler,
+                           max_in_flight = max(1, self.max_pdf_pages_in_flight // self.pdf_page_window))
+        keys = self._add_key_tasks(graph = graph)
+        after = keys if self.detector_backend == 'roi' else ()
+        decode = self._pixel_differential is not None
+
+        cached_marks, uncached_names = self._get_cached_marks(image_directory = 3,
+                                                              image_names = image_names)
+        pdf_tasks, task_pdfs, cached_pages, pdf_pages = self._get_pdf_tasks(pdf_directory = 2,
+                                                                            data = 'Scantron',
+                                                                            pdf_names = pdf_names)
+        self._game_sheet_total = len(cached_marks) + len(uncached_names) + len(pdf_pages)
+        for i, (kwargs, memory) in enumerate(pdf_tasks):
+            kwargs['decode'] = decode
+            graph.add_task(name = ('sheet_pdf', i),
+                           function = _detect_pdf_pages,
+                           kwargs = kwargs,
+                           memory = memory,
+                           after = after)
+        image_tasks = self._get_image_tasks(image_directory = 3,
+                                            image_names = uncached_names,
+                                            data = 'scantron',
+                                            decode = decode)
+        for i, (kwargs, memory) in enumerate(image_tasks):
+            graph.add_task(name = ('sheet', i),
+                           function = _detect_image,
+                           kwargs = kwargs,
+                           memory = memory,
+                           after = after)
+
+        # Position of each game sheet in the order of the files. The ones that are done wait in ready until every one before them is.
+        image_positions: dict = {name: i for i, name in enumerate(image_names)}
+        page_positions: dict = {page: len(image_names) + i for i, page in enumerate(pdf_pages)}
+        ready: dict = {}
+        uncached: set = set(uncached_names)
+        for name, marks in zip([name for name in image_names if name not in uncached], cached_marks):
+            ready[image_positions[name]] = (False, marks)
+        for page, marks in cached_pages:
+            ready[page_positions[page]] = (False, marks)
+        position = yield from self._take_in_order(ready = ready,
+                                                  position = 0,
+                                                  decode = decode)
+        for name, result in graph.run(description = 'game sheet processing'):
+            if name[0] == 'sheet_pdf':
+                kwargs = pdf_tasks[name[1]][0]
+                pdf_number = task_pdfs[name[1]]
+                for page_number in range(kwargs['first_page'], kwargs['last_page'] + 1):  # Pages that couldn't be read are skipped.
+                    ready[page_positions[(pdf_number, page_number)]] = None
+                for page_number, value in result or []:
+                    ready[page_positions[(pdf_number, page_number)]] = value if decode else (False, value)
+            elif name[0] == 'sheet':
+                if not decode and result:
+                    self._cache_marks(image_directory = 3,
+                                      image_names = [uncached_names[name[1]]],
+                                      image_marks = [result])
+                if result is None:  # Ran out of memory even by itself.
+                    result = (False, ()) if decode else ()
+                ready[image_positions[uncached_names[name[1]]]] = result if decode else (False, result)
+            elif name[0] != 'keys':
+                continue
+            position = yield from self._take_in_order(ready = ready,
+                                                      position = position,
+                                                      decode = decode)
+
+        # The workers only save to the mark cache, so what they saved is counted and the oldest used entries are deleted here once the files are done.
+        if self._mark_cache is not None:
+            self._mark_cache.refresh()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def set_decoding(self,
+                     pixel_differential: int) -> None:
+        """
+        Having the workers decode each game sheet as soon as they find its marks, instead of handing back the marks. \n
+        A Batch_Decoder is made once the bubble locations are known, right away if they already are or when the keys are averaged in stream_game_sheets(). 
+        It is sent to each worker once instead of with every task.
+
+        Args:
+            pixel_differential (int): The plus or minus that it will look for a corresponding mark in the bubble_location dictionary.
+        """
+        self._pixel_differential = pixel_differential
+        if self._keys_ready:
+            self._use_bubble_location()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def close(self) -> None:
+        """ Shutting down the process pool. The one pool is kept open between the pdfs, keys, and game sheets, and between calls to stream_game_sheet_files(). """
+        self._scheduler.close()
+
+# ======================================================================================================================
+# Bubble Locations
+# ----------------------------------------------------------------------------------------------------------------------
+def get_default_bubble_location() -> dict:
+    """
+    Where each bubble is printed on the game sheet, in pixels of a 700 dpi page, and what it is for. 
+    The keys move these to where the bubbles actually are on the scans. \n
+    A new dictionary is made every time since OMR changes its own copy.
+
+    Returns:
+        dict: Bubble key: [(X, Y), name], in the order the keys are read.
+    """
+    return {
+            # Column 1
+            0: [(905, 2335), 'Auton HP TL'],
+            1: [(903, 2497), 'Auton HP ML'],
+            2: [(903, 2658), 'Auton HP LLCone'],
+            3: [(903, 2818), 'Auton HP LLCube'],
+            4: [(897, 3949), 'Tele HP TL'],
+            5: [(896, 4110), 'Tele HP ML'],
+            6: [(896, 4271), 'Tele HP LLCone'],
+            7: [(896, 4433), 'Tele HP LLCube'],
+            # Column 2
+            8: [(1158, 1368), 'Blue Alliance'],
+            9: [(1157, 1529), 'Red Alliance'],
+            10: [(1154, 2336), 'Auton HP TM'],
+            11: [(1154, 2497), 'Auton HP MM'],
+            12: [(1153, 2658), 'Auton HP MLCone'],
+            13: [(1153, 2819), 'Auton HP MLCube'],
+            14: [(1147, 3949), 'Tele HP TM'],
+            15: [(1146, 4111), 'Tele HP MM'],
+            16: [(1146, 4272), 'Tele HP MLCone'],
+            17: [(1145, 4433), 'Tele HP MLCube'],
+            # Column 3
+            18: [(1408, 2337), 'Auton HP TR'],
+            19: [(1407, 2498), 'Auton HP MR'],
+            20: [(1406, 2658), 'Auton HP LRCone'],
+            21: [(1404, 2818), 'Auton HP LRCube'],
+            22: [(1400, 3950), 'Tele HP TR'],
+            23: [(1401, 4111), 'Tele HP MR'],
+            24: [(1399, 4271), 'Tele HP LRCone'],
+            25: [(1399, 4433), 'Tele HP LRCube'],
+            # Column 4
+            26: [(1651, 4918), 'Floor Yes'],
+            27: [(1651, 5076), 'Single Sub Yes'],
+            28: [(1650, 5234), 'Double Sub Slider Yes'],
+            29: [(1650, 5393), 'Double Sub Chute Yes'],
+            30: [(1648, 6353), 'Parked Yes'],
+            # Column 5
+            31: [(1913, 2338), 'Auton M TL'],
+            32: [(1912, 2498), 'Auton M ML'],
+            33: [(1912, 2660), 'Auton M LLCone'],
+            34: [(1911, 2819), 'Auton M LLCube'],
+            35: [(1906, 3950), 'Tele M TL'],
+            36: [(1905, 4111), 'Tele M ML'],
+            37: [(1905, 4272), 'Tele M LLCone'],
+            38: [(1905, 4434), 'Tele M LLCube'],
+            # Column 6
+            39: [(2175, 405), 'Match Deca Zero'],
+            40: [(2174, 569), 'Match Zero'],
+            41: [(2172, 1053), 'Team Kilo Zero'],
+            42: [(2170, 1211), 'Team Hecto Zero'],
+            43: [(2169, 1370), 'Team Deca Zero'],
+            44: [(2169, 1532), 'Team Zero'],
+            45: [(2166, 2338), 'Auton M TM'],
+            46: [(2165, 2499), 'Auton M MM'],
+            47: [(2165, 2660), 'Auton M MLCone'],
+            48: [(2164, 2820), 'Auton M MLCube'],
+            49: [(2163, 3142), 'Auton Charge Station On'],
+            50: [(2159, 3951), 'Tele M TM'],
+            51: [(2158, 4112), 'Tele M MM'],
+            52: [(2158, 4273), 'Tele M MLCone'],
+            53: [(2158, 4435), 'Tele M MLCube'],
+            54: [(2157, 4918), 'Floor No'],
+            55: [(2156, 5076), 'Single Sub No'],
+            56: [(2156, 5235), 'Double Sub Slider No'],
+            57: [(2155, 5393), 'Parked No'],
+            58: [(2154, 6031), 'End Game Charge Station On'],
+            59: [(2152, 6353), 'Parked No'],
+            # Column 7
+            60: [(2425, 406), 'Match Deca One'],
+            61: [(2425, 569), 'Match One'],
+            62: [(2422, 1053), 'Team Kilo One'],
+            63: [(2420, 1211), 'Team Hecto One'],
+            64: [(2419, 1371), 'Team Deca One'],
+            65: [(2419, 1532), 'Team One'],
+            66: [(2416, 2339), 'Auton M TR'],
+            67: [(2416, 2500), 'Auton M MR'],
+            68: [(2415, 2661), 'Auton M LRCone'],
+            69: [(2414, 2821), 'Auton M LRCube'],
+            70: [(2409, 3951), 'Tele M TR'],
+            71: [(2409, 4113), 'Tele M MR'],
+            72: [(2409, 4274), 'Tele M LRCone'],
+            73: [(2408, 4435), 'Tele M LRCube'],
+            # Column 8
+            74: [(2677, 406), 'Match Deca Two'],
+            75: [(2675, 570), 'Match Two'],
+            76: [(2673, 1054), 'Team Kilo Two'],
+            77: [(2671, 1213), 'Team Hecto Two'],
+            78: [(2671, 1372), 'Team Deca Two'],
+            79: [(2671, 1533), 'Team Two'],
+            # Column 9
+            80: [(2927, 409), 'Match Deca Three'],
+            81: [(2927, 573), 'Match Three'],
+            82: [(2923, 1056), 'Team Kilo Three'],
+            83: [(2922, 1214), 'Team Hecto Three'],
+            84: [(2921, 1374), 'Team Deca Three'],
+            85: [(2921, 1535), 'Team Three'],
+            86: [(2918, 2341), 'Auton ST TL'],
+            87: [(2916, 2503), 'Auton ST ML'],
+            88: [(2916, 2664), 'Auton ST LLCone'],
+            89: [(2915, 2824), 'Auton ST LLCube'],
+            90: [(2910, 3954), 'Tele ST TL'],
+            91: [(2910, 4114), 'Tele ST ML'],
+            92: [(2909, 4275), 'Tele ST LLCone'],
+            93: [(2909, 4437), 'Tele ST LLCube'],
+            # Column 10
+            94: [(3178, 410), 'Match Deca Four'],
+            95: [(3178, 573), 'Match Four'],
+            96: [(3175, 1057), 'Team Kilo Four'],
+            97: [(3174, 1216), 'Team Hecto Four'],
+            98: [(3173, 1375), 'Team Deca Four'],
+            99: [(3173, 1536), 'Team Four'],
+            100: [(3169, 2342), 'Auton ST TM'],
+            101: [(3169, 2504), 'Auton ST MM'],
+            102: [(3168, 2665), 'Auton ST MLCone'],
+            103: [(3168, 2823), 'Auton ST MLCube'],
+            104: [(3166, 3145), 'Auton Charge Station Balanced'],
+            105: [(3163, 3955), 'Tele ST TM'],
+            106: [(3162, 4115), 'Tele ST MM'],
+            107: [(3161, 4276), 'Tele ST MLCone'],
+            108: [(3161, 4439), 'Tele ST MLCube'],
+            109: [(3156, 6034), 'End Game Charge Station Balanced'],
+            # Column 11
+            110: [(3431, 410), 'Match Deca Five'],
+            111: [(3430, 574), 'Match Five'],
+            112: [(3427, 1058), 'Team Kilo Five'],
+            113: [(3426, 1217), 'Team Hecto Five'],
+            114: [(3426, 1376), 'Team Deca Five'],
+            115: [(3426, 1538), 'Team Five'],
+            116: [(3422, 2343), 'Auton ST TR'],
+            117: [(3422, 2505), 'Auton ST MR'],
+            118: [(3421, 2665), 'Auton ST LRCone'],
+            119: [(3420, 2825), 'Auton ST LRCube'],
+            120: [(3415, 3955), 'Tele ST TR'],
+            121: [(3415, 4116), 'Tele ST MR'],
+            122: [(3415, 4277), 'Tele ST LRCone'],
+            123: [(3415, 4438), 'Tele ST LRCube'],
+            # Column 12
+            124: [(3684, 412), 'Match Deca Six'],
+            125: [(3683, 576), 'Match Six'],
+            126: [(3680, 1060), 'Team Kilo Six'],
+            127: [(3679, 1217), 'Team Hecto Six'],
+            128: [(3679, 1377), 'Team Deca Six'],
+            129: [(3678, 1538), 'Team Six'],
+            # Column 13
+            130: [(3937, 412), 'Match Deca Seven'],
+            131: [(3936, 577), 'Match Seven'],
+            132: [(3933, 1061), 'Team Kilo Seven'],
+            133: [(3932, 1219), 'Team Hecto Seven'],
+            134: [(3931, 1379), 'Team Deca Seven'],
+            135: [(3931, 1539), 'Team Seven'],
+            # Column 14
+            136: [(4187, 414), 'Match Deca Eight'],
+            137: [(4187, 577), 'Match Eight'],
+            138: [(4184, 1061), 'Team Kilo Eight'],
+            139: [(4182, 1220), 'Team Hecto Eight'],
+            140: [(4182, 1379), 'Team Deca Eight'],
+            141: [(4182, 1540), 'Team Eight'],
+            # Column 15
+            142: [(4438, 415), 'Match Deca Nine'],
+            143: [(4437, 578), 'Match Nine'],
+            144: [(4434, 1063), 'Team Kilo Nine'],
+            145: [(4433, 1221), 'Team Hecto Nine'],
+            146: [(4433, 1381), 'Team Deca Nine'],
+            147: [(4433, 1541), 'Team Nine'],
+            148: [(4429, 2346), 'Left Community Yes'],
+            149: [(4428, 2508), 'Left Community No'],
+            150: [(4425, 3150), 'Auton Charge Station Not Attempted'],
+            151: [(4419, 4925), 'Travel Between HP and CS'],
+            152: [(4418, 5082), 'Travel Over Charge'],
+            153: [(4417, 5241), 'Travel Between ST and CS'],
+            154: [(4414, 6037), 'End Game Charge Station Not Attempted']
+           }
+
+# ======================================================================================================================
+# Worker Functions
+# ----------------------------------------------------------------------------------------------------------------------
+# Set once in each worker by _init_worker() so it doesn't get sent with every task.
+_worker_state: dict = {}
+
+def _init_worker(detector: Detector,
+                 rasterizer: Rasterizer,
+                 pdf_image_directory: str,
+                 image_format: str,
+                 overlay_directory: str,
+                 decoder: Batch_Decoder,
+                 mark_cache_directory: str,
+                 trace_directory: str = None) -> None:
+    """
+    Ran once by each worker when the pool starts, keeping what every task needs so each one only has to send its path or pages. \n
+    Ctrl+C is ignored in the workers, the main process stops the run and shuts the pool down instead of every worker printing its own traceback. \n
+    The same arguments are given to _load_worker_state(), which is all of this that is also done to the main process when the tasks have to be ran there.
+
+    Args:
+        detector (Detector): Settings for finding the marks.
+        rasterizer (Rasterizer): Settings for rendering the pdf pages.
+        pdf_image_directory (str): Folder to save a copy of each pdf page to. None if they aren't being saved.
+        image_format (str): The file type the pdf pages are saved as.
+        overlay_directory (str): Folder to save the pdf page overlays to. None if they aren't being saved.
+        decoder (Batch_Decoder): Decodes the marks into a row, with the averaged bubble locations from the keys. None before there is one.
+        mark_cache_directory (str): Folder of the mark cache. None if it isn't used.
+        trace_directory (str, optional): Folder the worker writes its spans to, from Trace_Recorder.get_directory(). None if it isn't being traced.
+            Defaults to None.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if trace_directory is not None:
+        Trace_Recorder.enable(directory = trace_directory,
+                              process_name = 'worker {}'.format(os.getpid()))
+    else:
+        Trace_Recorder.disable()
+    _load_worker_state(detector = detector,
+                       rasterizer = rasterizer,
+                       pdf_image_directory = pdf_image_directory,
+                       image_format = image_format,
+                       overlay_directory = overlay_directory,
+                       decoder = decoder,
+                       mark_cache_directory = mark_cache_directory)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def _load_worker_state(detector: Detector,
+                       rasterizer: Rasterizer,
+                       pdf_image_directory: str,
+                       image_format: str,
+                       overlay_directory: str,
+                       decoder: Batch_Decoder,
+                       mark_cache_directory: str,
+                       trace_directory: str = None) -> None:
+    """
+    Keeping what every task needs, without anything that should only be done to a worker. \n
+    The main process is set up with this when the pool fails and the rest of the tasks are ran there, so its trace and Ctrl+C are left alone.
+    The arguments are the same as _init_worker(), and trace_directory is not used. \n
+    The mark cache is only made the first time, since this is ran again whenever the state changes, like after the keys. 
+    It only reads and saves entries, the OMR deletes the old ones.
+    """
+    _worker_state['detector'] = detector
+    _worker_state['rasterizer'] = rasterizer
+    _worker_state['pdf_image_directory'] = pdf_image_directory
+    _worker_state['image_format'] = image_format
+    _worker_state['overlay_directory'] = overlay_directory
+    _worker_state['decoder'] = decoder
+    mark_cache: Mark_Cache = _worker_state.get('mark_cache')
+    if mark_cache_directory is None:
+        mark_cache = None
+    elif mark_cache is None or mark_cache.directory != mark_cache_directory:
+        try:
+            mark_cache = Mark_Cache(directory = mark_cache_directory,
+                                    evict = False)
+        except OSError:
+            mark_cache = None
+    _worker_state['mark_cache'] = mark_cache
+
+#-----------------------------------------------------------------------------------------------------------------------
+def _get_mark_cache_parameters(detector: Detector,
+                               dpi: int,
+                               page_number: int = None,
+                               extract_embedded: bool = False) -> dict:
+    """
+    The settings a mark cache entry is named with, the same in the OMR and in the workers. \n
+    A pdf page also has its page number, since every page has the same hash of the pdf, and if its jpeg is pulled out instead of rendered.
+    """
+    parameters = detector.get_parameters()
+    parameters['dpi'] = dpi
+    if page_number is not None:
+        parameters['page'] = page_number
+        parameters['extract_embedded'] = extract_embedded
+    return parameters
+
+#-----------------------------------------------------------------------------------------------------------------------
+def _cache_worker_marks(path: str,
+                        file_hash: bytes,
+                        marks: tuple,
+                        page_number: int = None) -> None:
+    """
+    Saving the marks a worker found to the mark cache, named with the worker's own detector settings. \n
+    Nothing is saved without the hash of the file or without any marks, since that is also what comes back when it couldn't be read.
+
+    Args:
+        path (str): Location of the image or pdf.
+        file_hash (bytes): Hash of the file from the OMR.
+        marks (tuple): The marks found on it.
+        page_number (int, optional): Page of the pdf the marks are from. None for an image.
+            Defaults to None.
+    """
+    mark_cache: Mark_Cache = _worker_state.get('mark_cache')
+    if not marks or file_hash is None or mark_cache is None:
+        return
+    rasterizer: Rasterizer = _worker_state['rasterizer']
+    try:
+        mark_cache.put(key = mark_cache.make_key(path = path,
+                                                 parameters = _get_mark_cache_parameters(detector = _worker_state['detector'],
+                                                                                         dpi = rasterizer.dpi,
+                                                                                         page_number = page_number,
+                                                                                         extract_embedded = rasterizer.extract_embedded),
+                                                 file_hash = file_hash),
+                       marks = marks)
+    except OSError:
+        pass
+
+#-----------------------------------------------------------------------------------------------------------------------
+def _decode_marks(marks: tuple) -> tuple:
+    """
+    The row for the marks from one game sheet, using the decoder from _init_worker(). \n
+    Before the keys are averaged there isn't a decoder yet, so the marks are sent back to be decoded once there is.
+
+    Returns:
+        tuple: True and the row, or False and the marks.
+    """
+    if _worker_state.get('decoder') is None:
+        return False, marks
+    return True, _worker_state['decoder'].decode_sheet(marks = marks)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def _detect_pdf_pages(pdf_path: str,
+                      first_page: int,
+                      last_page: int,
+                      page_prefix: str,
+                      file_hash: bytes = None,
+                      decode: bool = False) -> list[tuple]:
+    """
+    Rendering a range of pages from a pdf and finding the marks on each of them. \n
+    Kept outside of the class so the process pool only has to send the pdf and its pages instead of the whole OMR object. 
+    The rasterizer, detector, and where the pages and overlays are saved come from _init_worker().
+
+    Args:
+        pdf_path (str): Location of the pdf.
+        first_page (int): First page to render, starting at 1.
+        last_page (int): Last page to render. None goes to the end of the pdf.
+        page_prefix (str): Start of the name for each page, like Key_1, which gets the page number added on.
+        file_hash (bytes, optional): Hash of the pdf from the OMR. The marks on each page are saved to the mark cache under it, the page number, and this worker's detector settings. 
+            None to not save them.
+            Defaults to None.
+        decode (bool, optional): Each page is decoded into its row by the decoder from _init_worker() and that is sent back instead of the marks, from _decode_marks().
+            Defaults to False.
+
+    Returns:
+        list[tuple]: Page number and the marks found on it, or what _decode_marks() gave back, for each page that was read.
+    """
+    rasterizer: Rasterizer = _worker_state['rasterizer']
+    detector: Detector = _worker_state['detector']
+    pdf_image_directory: str = _worker_state['pdf_image_directory']
+    overlay_directory: str = _worker_state['overlay_directory']
+    page_marks: list[tuple] = []
+    try:
+        for page_number, page, color_order, scale in rasterizer.stream_pages(pdf_path = pdf_path,
+                                                                             first_page = first_page,
+                                                                             last_page = last_page):  # Each page of the pdf
+            page_name = page_prefix + '-' + str(page_number)
+            if pdf_image_directory is not None:
+                _save_pdf_image(page = page,
+                                color_order = color_order,
+                                location = pdf_image_directory + page_name,
+                                image_format = _worker_state['image_format'])
+            try:
+                with Trace_Recorder.span('find_marks', category = 'detector', file = pdf_path, page = page_number):
+                    marks = detector.find_marks(img = page,
+                                                color_order = color_order,
+                                                scale = scale)
+                _cache_worker_marks(path = pdf_path,
+                                    file_hash = file_hash,
+                                    marks = marks,
+                                    page_number = page_number)
+                page_marks.append((page_number, _decode_marks(marks = marks) if decode else marks))
+                if overlay_directory is not None:
+                    cv2.imwrite((overlay_directory + page_prefix.split('_')[0].lower() + '_overlay_' + page_name + '.jpeg'),
+                                detector.draw_overlay(img = page,
+                                                      marks = marks,
+                                                      color_order = color_order,
+                                                      scale = scale))
+            except Exception as ex:
+                if is_memory_error(ex):  # Sent back so the Pool_Scheduler can run fewer at once.
+                    raise
+                print('A problem occured with, ' + page_name)
+                print(ex)
+            page = None  # Letting go of the page before the next one is rendered.
+    except Exception as ex:
+        if is_memory_error(ex):
+            raise
+        print('A problem occured with, ' + pdf_path)
+        print(ex)
+    return page_marks
+
+#-----------------------------------------------------------------------------------------------------------------------
+def _detect_image(image_path: str,
+                  overlay_path: str,
+                  file_hash: bytes = None,
+                  decode: bool = False) -> tuple:
+    """
+    Reading in one image and finding its marks. \n
+    Only the path is sent to the worker, the detector comes from _init_worker(). Running out of memory is raised so the Pool_Scheduler can run fewer at once.
+
+    Args:
+        image_path (str): Location of the image.
+        overlay_path (str): Location to save the overlay to. None if it isn't being saved.
+        file_hash (bytes, optional): Hash of the image from the OMR. When decoding, the marks are saved to the mark cache under it and this worker's detector settings. 
+            None to not save them.
+            Defaults to None.
+        decode (bool, optional): The sheet is decoded into its row by the decoder from _init_worker() and that is sent back instead of the marks, from _decode_marks().
+            Defaults to False.
+
+    Returns:
+        tuple: The marks found on the image, or what _decode_marks() gave back when decoding. Empty marks if it couldn't be read.
+    """
+    detector: Detector = _worker_state['detector']
+    marks = ()
+    try:
+        img, scale = detector.read_image(path = image_path)
+        with Trace_Recorder.span('find_marks', category = 'detector', file = image_path):
+            marks = detector.find_marks(img = img,
+                                        scale = scale)
+        if overlay_path is not None:
+            cv2.imwrite(overlay_path,
+                        detector.draw_overlay(img = img,
+                                              marks = marks,
+                                              scale = scale))
+    except Exception as ex:
+        if is_memory_error(ex):
+            raise
+        print('A problem occured with, ' + image_path)
+        print(ex)
+    if not decode:
+        return marks
+    _cache_worker_marks(path = image_path,
+                        file_hash = file_hash,
+                        marks = marks)
+    return _decode_marks(marks = marks)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def _save_pdf_image(page: np.ndarray,
+                    color_order: str,
+                    location: str,
+                    image_format: str) -> None:
+    """
+    Saving a copy of a pdf page as an image of the specified file type from the class init. \n
+    They go in their own folder so they are not picked up as images the next time it is ran, since the pdf is still there.
+
+    Args:
+        page (np.ndarray): The page from the Rasterizer.
+        color_order (str): Channel order of page, 'BGR' or 'RGB'.
+        location (str): Folder and name of the page without the file extension.
+        image_format (str): The file type the page is saved as.
+    """
+    os.makedirs(os.path.dirname(location), exist_ok = True)
+    if color_order == 'RGB':
+        page = cv2.cvtColor(page, cv2.COLOR_RGB2BGR)
+    try:
+        if not cv2.imwrite(location + '.' + image_format, page):
+            raise ValueError('Could not save as ' + image_format)
+    except:
+        cv2.imwrite(location + '.jpg', page)
+
 # ======================================================================================================================
 # Main
 # ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,173 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Parquet_Writer.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+
+# pyarrow is optional. Without it only the csv is saved.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pq = None
+    pc = None
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Sheet_Schema import get_shared_schema
+import Trace_Recorder
+
+# ======================================================================================================================
+# Parquet_Writer Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Parquet_Writer():
+    """
+    Saving the same rows as Results_Writer to a Parquet file, with a type for each column so they don't have to be parsed again later. \n
+    Team and Match are saved as numbers instead of the zero padded strings in the csv, and the rest as small ints. \n
+    Rows are kept until there are row_group_size of them and then written as one row group, so the file grows as the sheets finish.
+    A Parquet file can't be read until it is closed, so it is written as a .tmp and only given its name by close().
+    If the program is stopped part way through, the csv still has every row. \n
+    read_season() loads every one of these files in a folder at once.
+    """
+    def __init__(self,
+                 path: str,
+                 columns: tuple,
+                 row_group_size: int = 64) -> None:
+        """
+        Args:
+            path (str): Location of the Parquet file.
+            columns (tuple): Names of the columns, like Sheet_Schema.columns.
+            row_group_size (int, optional): Rows kept before they are written as a row group.
+                Defaults to 64.
+
+        Raises:
+            ImportError: If pyarrow isn't installed. is_available() can be checked first.
+        """
+        if pa is None:
+            raise ImportError('pyarrow is needed to save the results as Parquet.')
+
+        # Class init values.
+        self.path: str = path
+        self.columns: tuple = tuple(columns)
+        self.row_group_size: int = max(1, row_group_size)
+
+        # Created within and used by the class.
+        self.schema = get_arrow_schema(columns = self.columns)
+        self._writer = None
+        self._pending: list[tuple] = []
+        self.rows: int = 0
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _write_row_group(self) -> None:
+        """ Writing the rows being kept as one row group, turning each column into its type. """
+        if not self._pending:
+            return
+        with Trace_Recorder.span('parquet_write', category = 'output', rows = len(self._pending)):
+            if self._writer is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok = True)
+                self._writer = pq.ParquetWriter(self.path + '.tmp', self.schema)
+            values = list(zip(*self._pending))
+            arrays = [pa.array([int(value) for value in values[i]], type = field.type) for i, field in enumerate(self.schema)]
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema = self.schema),
+                                     row_group_size = len(self._pending))
+        self._pending = []
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def write(self,
+              rows: list[tuple]) -> None:
+        """
+        Adding rows, writing a row group each time there are row_group_size of them.
+
+        Args:
+            rows (list[tuple]): The rows from Batch_Decoder.decode_rows(), with their values in the order of columns.
+        """
+        self._pending.extend(rows)
+        self.rows += len(rows)
+        if len(self._pending) >= self.row_group_size:
+            self._write_row_group()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def close(self) -> None:
+        """ Writing the last row group and finishing the file so it can be read. Nothing is made if no rows were written. """
+        self._write_row_group()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self.path + '.tmp', self.path)
+
+# ======================================================================================================================
+# Parquet Functions
+# ----------------------------------------------------------------------------------------------------------------------
+def is_available() -> bool:
+    """ If pyarrow is installed so the results can be saved as Parquet. """
+    return pa is not None
+
+#-----------------------------------------------------------------------------------------------------------------------
+def get_arrow_schema(columns: tuple):
+    """
+    The type of each column. Team and Match are numbers, and everything else is a 0 or 1 bubble or a small play style value.
+
+    Returns:
+        pyarrow.Schema: A field for each of the columns, in the same order.
+    """
+    types: dict = {'Team': pa.int32(),
+                   'Match': pa.int16()}
+    return pa.schema([pa.field(column, types.get(column, pa.int8()), nullable = False) for column in columns])
+
+#-----------------------------------------------------------------------------------------------------------------------
+def read_season(directory: str = 'results/',
+                columns: list[str] = None,
+                unique: bool = True):
+    """
+    Loading the results of every run saved in a folder as one table. \n
+    Each file is memory mapped, so only the columns asked for are read from the disk, and nothing is parsed like it would be with the csvs. \n
+    The files are named by the time they were made, so with unique the row from the newest run is kept when the same team and match was read more than once. 
+    Within one run the rows are saved in the order of the files, so it is the row from the last file, and the same row is kept every time.
+    Sheets with no team filled in are all kept since they can't be told apart.
+
+    Args:
+        directory (str, optional): Folder with the .parquet files.
+            Defaults to 'results/'.
+        columns (list[str], optional): Only load these columns. Team and Match are always loaded when unique is on.
+            Defaults to None, which is all of them.
+        unique (bool, optional): Keep only one row for each team and match.
+            Defaults to True.
+
+    Raises:
+        ImportError: If pyarrow isn't installed.
+
+    Returns:
+        pyarrow.Table: Every row, oldest run first. to_pandas() turns it into a DataFrame.
+    """
+    if pa is None:
+        raise ImportError('pyarrow is needed to read the Parquet results.')
+    if columns is not None and unique:
+        columns = list(dict.fromkeys(['Team', 'Match'] + list(columns)))
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.parquet'))
+    if not paths:
+        schema = get_arrow_schema(columns = get_shared_schema().columns)
+        return schema.empty_table().select(columns) if columns is not None else schema.empty_table()
+    table = pa.concat_tables([pq.read_table(path, columns = columns, memory_map = True) for path in paths])
+    if not unique:
+        return table
+
+    # The last row for each team and match, kept in the order they were saved. Sheets without a team filled in are all kept.
+    rows = table.append_column('_row', pa.array(range(table.num_rows), type = pa.int64()))
+    last = rows.filter(pc.not_equal(rows['Team'], 0)).group_by(['Team', 'Match']).aggregate([('_row', 'max')])['_row_max']
+    blank = rows.filter(pc.equal(rows['Team'], 0))['_row']
+    indices = pa.concat_arrays([last.combine_chunks(), blank.combine_chunks()])
+    return table.take(pc.take(indices, pc.array_sort_indices(indices)))
+
+# End of file.
@@ -0,0 +1,577 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Pool_Scheduler.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import sys
+import ctypes
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor as ppe
+from concurrent.futures import wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+
+# psutil is optional. Without it the memory is read from the OS directly.
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import Trace_Recorder
+
+# ======================================================================================================================
+# Pool_Scheduler Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Pool_Scheduler():
+    """
+    Running tasks on the process pool with only as many at once as there is memory for. \n
+    Each task comes with an estimate of the memory it needs, from the size of its image or pdf page and the dpi, and a new one is only sent once it fits in what was free when the run started. \n
+    If a worker runs out of memory anyway, the task is put back and fewer are ran at once, down to one, instead of giving up on the pool and running everything one at a time. \n
+    Results can be taken as each task finishes with run_as_completed(), or all at once in order with run(). \n
+    The pool is kept between runs until close() is called, so one pool does the pdfs, keys, and game sheets. Changing what the workers are set up with doesn't start a new one, 
+    each worker picks up the change with its next task. It is only started again after recycle_after tasks, so anything leaked by opencv or poppler doesn't build up.
+    """
+    def __init__(self,
+                 max_workers: int,
+                 reserve_mb: float = 1024,
+                 worker_overhead_mb: float = 200,
+                 bytes_per_pixel: int = 12,
+                 recycle_after: int = 1000) -> None:
+        """
+        Args:
+            max_workers (int): Most processes in the pool.
+            reserve_mb (float, optional): Memory left free for the OS and everything else running.
+                Defaults to 1024.
+            worker_overhead_mb (float, optional): Memory each worker uses before it has a page, for python, numpy, and opencv.
+                Defaults to 200.
+            bytes_per_pixel (int, optional): Memory needed for each pixel of a page while the marks are found.
+                The page, its HSV copy, the mask, and the morphology steps add up to about 12.
+                Defaults to 12.
+            recycle_after (int, optional): Tasks ran on a pool before it is shut down and a new one is started. None to keep it until close().
+                Defaults to 1000.
+        """
+
+        # Class init values.
+        self.max_workers: int = max(1, max_workers)
+        self.reserve_mb: float = reserve_mb
+        self.worker_overhead_mb: float = worker_overhead_mb
+        self.bytes_per_pixel: int = bytes_per_pixel
+        self.recycle_after: int = max(1, recycle_after) if recycle_after is not None else None
+
+        # Created within and used by the class.
+        self.initializer = None
+        self.initargs: tuple = ()
+        self.local_initializer = None
+        self._state_version: int = 0
+        self._local_version: int = None  # Version of the initargs apply_local_state() last set this process up with.
+        self._state: bytes = None  # initargs pickled once, for the workers that were started before they changed.
+        self._late_results: list[tuple] = []  # (task index, result) of tasks that finished after run_as_completed() raised.
+        self._executor: ppe = None
+        self._pool_size: int = 0
+        self._pool_tasks: int = 0
+        self._worker_limit: int = self.max_workers  # Only goes down, after running out of memory.
+        self._concurrency: int = self.max_workers
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _get_executor(self,
+                      workers: int) -> ppe:
+        """ The pool, started with the given number of workers if there isn't one running. """
+        if self._executor is None:
+            self._executor = ppe(max_workers = workers,
+                                 initializer = _init_state,
+                                 initargs = (self.initializer, self.initargs, self._state_version))
+            self._pool_size = workers
+            self._pool_tasks = 0
+        return self._executor
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_state(self) -> bytes:
+        """ The current initargs pickled, for sending to a worker that still has older ones. It is only pickled once for each change. """
+        if self._state is None:
+            self._state = pickle.dumps(self.initargs)
+        return self._state
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _needs_recycle(self) -> bool:
+        """ If the pool has ran recycle_after tasks and should be started again once the ones running are done. """
+        return self._executor is not None and self.recycle_after is not None and self._pool_tasks >= self.recycle_after
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _shrink(self,
+                reason: str) -> bool:
+        """
+        Running half as many tasks at once after one ran out of memory.
+
+        Returns:
+            bool: False if it was already down to one and can't shrink.
+        """
+        if self._concurrency <= 1:
+            return False
+        self._concurrency = max(1, self._concurrency // 2)
+        self._worker_limit = min(self._worker_limit, self._concurrency)
+        print('{}. Running {} at a time.'.format(reason, self._concurrency))
+        return True
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _finish_running(self,
+                        running: dict,
+                        stage_times: bool) -> None:
+        """
+        Once a run has failed, cancelling the tasks that haven't started yet and waiting on the ones that have. \n
+        The results of the ones that finish are kept for take_late_results(), so they aren't lost and ran again.
+
+        Args:
+            running (dict): Future of each task still running and its index and the concurrency it was sent with.
+            stage_times (bool): The results come with the stage times, which are taken off.
+        """
+        for future in running:
+            future.cancel()
+        wait(running)
+        for future, (index, _) in running.items():
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception:
+                continue
+            if stage_times:
+                result, task_stage_times = result
+                Trace_Recorder.add_stage_times(stage_times = task_stage_times)
+            self._late_results.append((index, result))
+        running.clear()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_budget(self) -> int:
+        """ Memory the tasks can use at once, being what is free minus the reserve and the workers themselves. None if it is unknown. """
+        available = get_available_memory()
+        if available is None:
+            return None
+        return int(available - (self.reserve_mb + self.worker_overhead_mb * self.max_workers) * 1024 * 1024)
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def estimate_image_memory(self,
+                              path: str,
+                              reduction: int = 1) -> int:
+        """
+        Memory needed to find the marks on an image, from the width and height in its header. The image isn't decoded.
+
+        Args:
+            path (str): Location of the image.
+            reduction (int, optional): How much the image is shrunk by while it is decoded, from Detector.read_image().
+                Defaults to 1.
+
+        Returns:
+            int: Bytes. A 700 dpi letter page is used if the header can't be read.
+        """
+        try:
+            with Image.open(path) as img:
+                width, height = img.size
+        except Exception:
+            width, height = 8.5 * 700, 11 * 700
+        return int(width * height * self.bytes_per_pixel / (reduction * reduction))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def estimate_page_memory(self,
+                             page_size: tuple,
+                             dpi: int,
+                             pages: int = 1) -> int:
+        """
+        Memory needed to render pdf pages and find the marks on them.
+
+        Args:
+            page_size (tuple): Width and height of a page in points, from Rasterizer.get_page_size().
+            dpi (int): Resolution the pages are rendered at.
+            pages (int, optional): Pages rendered at one time.
+                Defaults to 1.
+
+        Returns:
+            int: Bytes.
+        """
+        width, height = page_size[0] / 72 * dpi, page_size[1] / 72 * dpi
+        return int(width * height * self.bytes_per_pixel * pages)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def set_initializer(self,
+                        initializer,
+                        initargs: tuple = (),
+                        local_initializer = None) -> None:
+        """
+        Function each worker runs once when it starts, for sending it anything large that every task needs instead of sending it with each task. \n
+        A running pool is kept. Each of its workers notices it was set up with older arguments on its next task, which is sent back and sent again with the new ones, 
+        so it is only sent once to each worker and the pool doesn't have to start over. \n
+        Arguments that pickle the same as the current ones aren't a change, so setting them again doesn't make the workers get them again.
+
+        Args:
+            initializer (function): Module level function to run in each worker. None for nothing.
+            initargs (tuple, optional): Arguments for initializer.
+                Defaults to ().
+            local_initializer (function, optional): Takes the same initargs and sets up the main process for apply_local_state(), 
+                leaving out anything that should only be done to a worker. None uses initializer.
+                Defaults to None.
+        """
+        self.local_initializer = local_initializer
+        if initializer is self.initializer and initargs is self.initargs:
+            return
+        state = pickle.dumps(initargs)
+        if initializer is self.initializer and state == self._get_state():
+            self.initargs = initargs
+            return
+        self.initializer = initializer
+        self.initargs = initargs
+        self._state_version += 1
+        self._state = state
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def warm(self) -> None:
+        """
+        Starting the pool ahead of time so the workers import opencv and numpy and run the initializer while everything else is still getting ready. \n
+        Nothing is waited on. It does nothing if the pool is already running.
+        """
+        if self._executor is not None:
+            return
+        executor = self._get_executor(workers = self._worker_limit)
+        for _ in range(self._pool_size):
+            executor.submit(_warm_worker)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def run_as_completed(self,
+                         function,
+                         tasks: list[tuple],
+                         max_in_flight: int = None):
+        """
+        Running every task on the pool and handing back each result as soon as its task is done, in whatever order they finish. \n
+        The number ran at once is the smallest of the workers, max_in_flight, and what fits in memory. One is always let through so a big page can't stall it. \n
+        New tasks are only sent when the next result is asked for, so nothing piles up if whatever is using the results falls behind. 
+        Tasks added to the end of tasks while it is running are picked up too, which is how Task_Graph sends the ones that were waiting on others. \n
+        A task that runs out of memory is sent again with fewer running beside it. If the pool breaks, it is started again with the smaller number of workers.
+        Once it is down to one and a task still runs out of memory, that task's result is None. \n
+        If anything else is raised, the tasks that were already running are waited on before it is raised, and their results are kept for take_late_results().
+
+        Args:
+            function (function): Module level function to run. It has to raise MemoryError, or use is_memory_error(), for the memory to be handled.
+            tasks (list[tuple]): Keyword arguments for function and the bytes it needs, from estimate_image_memory() or estimate_page_memory(). 
+                A task can have its own function as a third value, which is used instead.
+            max_in_flight (int, optional): Most tasks that can be running at once. No limit other than the workers and memory if not given.
+                Defaults to None.
+
+        Yields:
+            tuple: Index of the task and what function returned for it.
+        """
+        if not tasks:
+            return
+
+        budget = self._get_budget()
+        self._concurrency = self._worker_limit if self._executor is None else min(self._worker_limit, self._pool_size)
+        if budget is not None:
+            self._concurrency = min(self._concurrency, max(1, budget // max(1, max(task[1] for task in tasks))))
+        if max_in_flight is not None:
+            self._concurrency = min(self._concurrency, max(1, max_in_flight))
+        if self._executor is None and self._concurrency < self._worker_limit:
+            print('Running {} at a time to fit in the memory that is free.'.format(self._concurrency))
+
+        queue: deque = deque(range(len(tasks)))
+        total_tasks: int = len(tasks)
+        running: dict = {}  # future: (task index, concurrency when it was sent)
+        send_state: set = set()  # Tasks that went to a worker with old initargs.
+        memory_in_flight: int = 0
+        stage_times: bool = Trace_Recorder.is_timing_stages()
+        self._late_results = []
+        try:
+            while queue or running:
+                # Nothing new is sent to a pool that is due to be recycled, and it is shut down once what is running is done.
+                if not running and self._needs_recycle():
+                    self.close()
+                executor = self._get_executor(workers = self._concurrency)
+                while queue and not self._needs_recycle() and (not running or (len(running) < self._concurrency and (budget is None or memory_in_flight + tasks[queue[0]][1] <= budget))):
+                    index = queue.popleft()
+                    running[executor.submit(_run_task,
+                                            function = tasks[index][2] if len(tasks[index]) > 2 else function,
+                                            kwargs = tasks[index][0],
+                                            version = self._state_version,
+                                            initializer = self.initializer,
+                                            state = self._get_state() if index in send_state else None,
+                                            stage_times = stage_times)] = (index, self._concurrency)
+                    send_state.discard(index)
+                    memory_in_flight += tasks[index][1]
+                    self._pool_tasks += 1
+
+                done, _ = wait(running, return_when = FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    index, sent_concurrency = running.pop(future)
+                    memory_in_flight -= tasks[index][1]
+                    try:
+                        result = future.result()
+                        if stage_times:
+                            result, task_stage_times = result
+                            Trace_Recorder.add_stage_times(stage_times = task_stage_times)
+                    except BrokenProcessPool:
+                        broken = True
+                        queue.appendleft(index)
+                        continue
+                    except Stale_Worker_State:
+                        send_state.add(index)
+                        queue.appendleft(index)
+                        continue
+                    except Exception as ex:
+                        if not is_memory_error(ex):
+                            raise
+                        # Tasks sent before the last shrink only go back in the queue, so one bad moment doesn't shrink it more than once.
+                        if sent_concurrency > self._concurrency or self._shrink(reason = 'A worker ran out of memory'):
+                            queue.appendleft(index)
+                            continue
+                        print('Not enough memory for a task even when running one at a time.')
+                        print(ex)
+                        result = None
+                    yield index, result
+                    if len(tasks) > total_tasks:
+                        queue.extend(range(total_tasks, len(tasks)))
+                        total_tasks = len(tasks)
+
+                # Everything still running on a broken pool is lost, so it all goes back in the queue.
+                if broken:
+                    for index, _ in running.values():
+                        queue.appendleft(index)
+                    running.clear()
+                    memory_in_flight = 0
+                    self.close()
+                    if not self._shrink(reason = 'The process pool stopped, likely from running out of memory'):
+                        raise BrokenProcessPool('The process pool stopped while running one task at a time.')
+        except Exception:
+            # Whatever is still running has to finish before the tasks can be ran again somewhere else, or it would be ran twice.
+            self._finish_running(running = running,
+                                 stage_times = stage_times)
+            raise
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def run(self,
+            function,
+            tasks: list[tuple],
+            max_in_flight: int = None) -> list:
+        """
+        Running every task on the pool with run_as_completed() and returning the results in the same order as the tasks.
+
+        Args:
+            function (function): Module level function to run.
+            tasks (list[tuple]): Keyword arguments for function and the bytes it needs.
+            max_in_flight (int, optional): Most tasks that can be running at once.
+                Defaults to None.
+
+        Returns:
+            list: What function returned for each task. None for a task that ran out of memory when running one at a time.
+        """
+        results: list = [None] * len(tasks)
+        for index, result in self.run_as_completed(function = function,
+                                                   tasks = tasks,
+                                                   max_in_flight = max_in_flight):
+            results[index] = result
+        return results
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def take_late_results(self) -> list[tuple]:
+        """
+        Results of the tasks that were still running when run_as_completed() raised, which it waited on before raising. They are let go once taken.
+
+        Returns:
+            list[tuple]: Index of the task and what function returned for it.
+        """
+        late_results, self._late_results = self._late_results, []
+        return late_results
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def apply_local_state(self) -> None:
+        """
+        Setting up the main process the same as a worker, so tasks can be ran here when the pool can't be used. \n
+        It uses local_initializer from set_initializer() if there is one. It is only ran again once the initargs have changed, so it can be called before every task.
+        """
+        if self._local_version == self._state_version:
+            return
+        initializer = self.local_initializer if self.local_initializer is not None else self.initializer
+        if initializer is not None:
+            initializer(*self.initargs)
+        self._local_version = self._state_version
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def close(self) -> None:
+        """ Shutting down the pool. A new one is started the next time a run is started. """
+        if self._executor is not None:
+            self._executor.shutdown(wait = True, cancel_futures = True)
+            self._executor = None
+            self._pool_size = 0
+            self._pool_tasks = 0
+
+# ======================================================================================================================
+# Worker Functions
+# ----------------------------------------------------------------------------------------------------------------------
+class Stale_Worker_State(Exception):
+    """ Raised by a worker that was set up with older initargs than the task was sent with. """
+
+# Version of the initargs this worker was set up with.
+_worker_version: int = None
+
+def _init_state(initializer,
+                initargs: tuple,
+                version: int) -> None:
+    """ Running the initializer in the worker and keeping which version of the initargs it was. """
+    global _worker_version
+    if initializer is not None:
+        initializer(*initargs)
+    _worker_version = version
+
+#-----------------------------------------------------------------------------------------------------------------------
+def _run_task(function,
+              kwargs: dict,
+              version: int,
+              initializer,
+              state: bytes,
+              stage_times: bool = False):
+    """
+    Running one task in the worker, after making sure the worker was set up with the current initargs. \n
+    When tracing, the task gets its own span and the worker's spans are written out after it, so they are there even if the worker is stopped. 
+    When the stage times are kept, the ones from this task are sent back with its result.
+
+    Args:
+        function (function): Module level function to run.
+        kwargs (dict): Keyword arguments for function.
+        version (int): Version of the initargs the task needs.
+        initializer (function): Function the worker is set up with.
+        state (bytes): The pickled initargs, only sent after the worker raised Stale_Worker_State. None otherwise.
+        stage_times (bool, optional): Send back the result and the stage times from Trace_Recorder.take_stage_times() instead of only the result.
+            Defaults to False.
+
+    Raises:
+        Stale_Worker_State: If the worker has older initargs and they weren't sent with it.
+    """
+    if state is not None:
+        _init_state(initializer = initializer,
+                    initargs = pickle.loads(state),
+                    version = version)
+    elif _worker_version != version:
+        raise Stale_Worker_State(version)
+    if stage_times:
+        Trace_Recorder.start_stage_times()
+    else:
+        Trace_Recorder.stop_stage_times()
+    try:
+        with Trace_Recorder.span(function.__name__, category = 'worker', task = _get_trace_args(kwargs = kwargs)):
+            result = function(**kwargs)
+    finally:
+        Trace_Recorder.flush()
+    return (result, Trace_Recorder.take_stage_times()) if stage_times else result
+
+#-----------------------------------------------------------------------------------------------------------------------
+def _get_trace_args(kwargs: dict) -> dict:
+    """ The task's arguments that can be shown in the trace, like the image path and page range. Anything else, like the hash of a file, is left out so the trace can be saved as json. """
+    return {key: value for key, value in kwargs.items() if value is None or isinstance(value, (str, int, float, bool))}
+
+#-----------------------------------------------------------------------------------------------------------------------
+def _warm_worker() -> int:
+    """ Nothing to do, it is only sent so the worker gets started. """
+    return os.getpid()
+
+# ======================================================================================================================
+# Memory Functions
+# ----------------------------------------------------------------------------------------------------------------------
+def get_available_memory() -> int:
+    """
+    Memory that can be used without swapping, in bytes. \n
+    psutil is used if it is installed, otherwise it is asked for from Windows or read from /proc/meminfo on Linux.
+
+    Returns:
+        int: Bytes, or None if it couldn't be found.
+    """
+    if psutil is not None:
+        return int(psutil.virtual_memory().available)
+    try:
+        if sys.platform.startswith('win'):
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [('dwLength', ctypes.c_ulong),
+                            ('dwMemoryLoad', ctypes.c_ulong),
+                            ('ullTotalPhys', ctypes.c_ulonglong),
+                            ('ullAvailPhys', ctypes.c_ulonglong),
+                            ('ullTotalPageFile', ctypes.c_ulonglong),
+                            ('ullAvailPageFile', ctypes.c_ulonglong),
+                            ('ullTotalVirtual', ctypes.c_ulonglong),
+                            ('ullAvailVirtual', ctypes.c_ulonglong),
+                            ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return int(status.ullAvailPhys)
+            return None
+        if os.path.exists('/proc/meminfo'):
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) * 1024
+    except Exception:
+        return None
+    return None
+
+#-----------------------------------------------------------------------------------------------------------------------
+def is_memory_error(ex: Exception) -> bool:
+    """ If an exception was from running out of memory, either python's MemoryError or opencv's Insufficient memory error. """
+    if isinstance(ex, MemoryError):
+        return True
+    message = str(ex)
+    return 'Insufficient memory' in message or 'Failed to allocate' in message
+
+#-----------------------------------------------------------------------------------------------------------------------
+def get_process_memory() -> int:
+    """
+    Memory in use by this process and every process it started, like the workers, in bytes. \n
+    psutil is used if it is installed, otherwise it is read from /proc on Linux.
+
+    Returns:
+        int: Bytes, or None if it couldn't be found.
+    """
+    try:
+        if psutil is not None:
+            process = psutil.Process()
+            total = process.memory_info().rss
+            for child in process.children(recursive = True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            return int(total)
+        if not os.path.exists('/proc/self/status'):
+            return None
+        # Every process's parent, to find the ones started from this one.
+        parents: dict = {}
+        for name in os.listdir('/proc'):
+            if name.isdigit():
+                try:
+                    with open('/proc/{}/stat'.format(name), 'r') as f:
+                        parents[int(name)] = int(f.read().rsplit(')', 1)[1].split()[1])
+                except (OSError, IndexError, ValueError):
+                    pass
+        pids, total = [os.getpid()], 0
+        while pids:
+            pid = pids.pop()
+            pids.extend(child for child, parent in parents.items() if parent == pid)
+            try:
+                with open('/proc/{}/status'.format(pid), 'r') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            total += int(line.split()[1]) * 1024
+            except OSError:
+                pass
+        return total
+    except Exception:
+        return None
+
+# End of file.
@@ -0,0 +1,254 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Progress_Reporter.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Pool_Scheduler import get_process_memory
+import Trace_Recorder
+
+# ======================================================================================================================
+# Progress_Reporter Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Progress_Reporter():
+    """
+    Showing how a run is going while it is going, so a long one isn't silent until the end and a stall can be told apart from a slow step. \n
+    update() is called each time a game sheet comes back from the pool. Every interval seconds a line is printed with the sheets done, pages a second,
+    how long each step has been taking, the memory in use by this process and the workers, and the time left. \n
+    The same is written to status_path as json, so another program like a dashboard at the event can read it without touching the run.
+    It is written to a temporary file and then moved over the old one, so it is never read half written. \n
+    The step times come from Trace_Recorder's stage times, which the workers send back with each result, so it doesn't need the trace turned on.
+    """
+    def __init__(self,
+                 total: int = None,
+                 status_path: str = None,
+                 interval: float = 5.0,
+                 smoothing: float = 0.3,
+                 show: bool = True) -> None:
+        """
+        Args:
+            total (int, optional): Number of game sheets that will be read, for the percent and time left. Can be given later with update().
+                Defaults to None.
+            status_path (str, optional): Location of the json status file. Nothing is written if not given.
+                Defaults to None.
+            interval (float, optional): Seconds between each report.
+                Defaults to 5.0.
+            smoothing (float, optional): How much each report's pages a second and step times count towards the moving averages, from 0 to 1.
+                Higher follows changes faster but jumps around more.
+                Defaults to 0.3.
+            show (bool, optional): Print each report. The status file is still written if it is off.
+                Defaults to True.
+        """
+
+        # Class init values.
+        self.total: int = total
+        self.status_path: str = status_path
+        self.interval: float = max(0.1, interval)
+        self.smoothing: float = min(1.0, max(0.01, smoothing))
+        self.show: bool = show
+
+        # Created within and used by the class.
+        self.done: int = 0
+        self.state: str = 'running'
+        self._lock: threading.Lock = threading.Lock()
+        self._stop: threading.Event = threading.Event()
+        self._thread: threading.Thread = None
+        self._started: datetime = datetime.now()
+        self._start_time: float = time.perf_counter()
+        self._last_done_time: float = self._start_time
+        self._last_report_time: float = self._start_time
+        self._last_report_done: int = 0
+        self._rate: float = None  # Moving average of pages a second.
+        self._stage_totals: dict = {}  # Step: [times ran, seconds] for the whole run.
+        self._stage_pending: dict = {}  # Step: [times ran, seconds] since the last report.
+        self._stage_averages: dict = {}  # Step: moving average of milliseconds each time it ran.
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _add_stage_times(self,
+                         stage_times: dict) -> None:
+        """ Adding the stage times taken from Trace_Recorder to the ones for the run and the ones since the last report. """
+        for name, (count, seconds) in stage_times.items():
+            for stages in (self._stage_totals, self._stage_pending):
+                entry = stages.setdefault(name, [0, 0.0])
+                entry[0] += count
+                entry[1] += seconds
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _update_averages(self,
+                         now: float) -> None:
+        """ Moving the pages a second and step time averages along with what happened since the last report. """
+        elapsed = now - self._last_report_time
+        if elapsed > 0 and (self.done > self._last_report_done or self._rate is not None):
+            rate = (self.done - self._last_report_done) / elapsed
+            self._rate = rate if self._rate is None else self.smoothing * rate + (1 - self.smoothing) * self._rate
+        for name, (count, seconds) in self._stage_pending.items():
+            if count:
+                average = seconds / count * 1000
+                self._stage_averages[name] = average if name not in self._stage_averages else self.smoothing * average + (1 - self.smoothing) * self._stage_averages[name]
+        self._stage_pending = {}
+        self._last_report_time = now
+        self._last_report_done = self.done
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_status(self,
+                    now: float) -> dict:
+        """ Everything in a report, as it is saved in the status file. """
+        elapsed = now - self._start_time
+        average_rate = self.done / elapsed if elapsed > 0 else 0.0
+        # The moving average while it is running, and the average for the whole run once it is over.
+        rate = self._rate if self._rate and self.state == 'running' else average_rate
+        remaining = max(0, self.total - self.done) if self.total is not None else None
+        memory = get_process_memory()
+        return {'state': self.state,
+                'pid': os.getpid(),
+                'started': self._started.isoformat(timespec = 'seconds'),
+                'updated': datetime.now().isoformat(timespec = 'seconds'),
+                'elapsed_seconds': round(elapsed, 1),
+                'sheets_done': self.done,
+                'sheets_total': self.total,
+                'percent': round(100 * self.done / self.total, 1) if self.total else None,
+                'pages_per_second': round(rate, 3),
+                'average_pages_per_second': round(average_rate, 3),
+                'eta_seconds': round(remaining / rate, 1) if remaining is not None and rate > 0 else None,
+                'seconds_since_last_sheet': round(now - self._last_done_time, 1),
+                'memory_mb': round(memory / 2**20, 1) if memory is not None else None,
+                'stages': {name: {'count': count,
+                                  'average_ms': round(seconds / count * 1000, 3) if count else None,
+                                  'moving_average_ms': round(self._stage_averages[name], 3) if name in self._stage_averages else None}
+                           for name, (count, seconds) in self._stage_totals.items()}}
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _print_status(self,
+                      status: dict) -> None:
+        """ One line for the report, with the three slowest steps. """
+        line = 'Game sheets: {}'.format(status['sheets_done'])
+        if status['sheets_total'] is not None:
+            line += '/{} ({}%)'.format(status['sheets_total'], status['percent'] if status['percent'] is not None else 100.0)
+        line += ' | {:.2f} pages/s'.format(status['pages_per_second'])
+        if status['eta_seconds'] is not None and self.state == 'running':
+            line += ' | ETA {}'.format(timedelta(seconds = int(status['eta_seconds'])))
+        if status['memory_mb'] is not None:
+            line += ' | {:.0f} MB'.format(status['memory_mb'])
+        stages = sorted(((values['moving_average_ms'], name) for name, values in status['stages'].items() if values['moving_average_ms'] is not None), reverse = True)[:3]
+        if stages:
+            line += ' | ' + ', '.join('{} {:.0f} ms'.format(name, average) for average, name in stages)
+        print(line)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _write_status(self,
+                      status: dict) -> None:
+        """ Writing the status file to a temporary file first and moving it over the old one, so whoever reads it never gets half of it. """
+        if not self.status_path:
+            return
+        temporary_path = self.status_path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.status_path) or '.', exist_ok = True)
+            with open(temporary_path, 'w') as f:
+                json.dump(status, f, indent = 2)
+            os.replace(temporary_path, self.status_path)
+        except OSError:
+            # The reader can have it open on Windows, it is written again next interval.
+            pass
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _run(self) -> None:
+        """ Reporting every interval on its own thread, so the status file still changes while a sheet is taking a long time. """
+        while not self._stop.wait(self.interval):
+            self.report()
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def start(self) -> None:
+        """ Starting to keep the stage times and report every interval. The first status file is written right away. """
+        Trace_Recorder.start_stage_times()
+        self._start_time = self._last_done_time = self._last_report_time = time.perf_counter()
+        self._started = datetime.now()
+        self.report(show = False)
+        self._thread = threading.Thread(target = self._run,
+                                        name = 'Progress_Reporter',
+                                        daemon = True)
+        self._thread.start()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def update(self,
+               sheets: int = 1,
+               total: int = None) -> None:
+        """
+        Counting game sheets that came back from the pool, and taking the stage times that came back with them.
+
+        Args:
+            sheets (int, optional): Number of game sheets that are done.
+                Defaults to 1.
+            total (int, optional): Number of game sheets that will be read, if it is known now.
+                Defaults to None.
+        """
+        # Taken here since the stage times are added to on this thread.
+        stage_times = Trace_Recorder.take_stage_times()
+        with self._lock:
+            if total is not None:
+                self.total = total
+            self.done += sheets
+            self._last_done_time = time.perf_counter()
+            self._add_stage_times(stage_times = stage_times)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def report(self,
+               show: bool = None) -> dict:
+        """
+        Printing the progress and writing the status file now instead of waiting for the next interval.
+
+        Args:
+            show (bool, optional): Print it. Uses show from the init if not given.
+                Defaults to None.
+
+        Returns:
+            dict: The status, as saved in the status file.
+        """
+        with self._lock:
+            now = time.perf_counter()
+            self._update_averages(now = now)
+            status = self._get_status(now = now)
+            self._write_status(status = status)
+        if self.show if show is None else show:
+            self._print_status(status = status)
+        return status
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def finish(self,
+               state: str = 'done') -> dict:
+        """
+        Stopping the reports and writing the last one with the state the run ended in.
+
+        Args:
+            state (str, optional): How the run ended, like 'done', 'failed', or 'stopped'.
+                Defaults to 'done'.
+
+        Returns:
+            dict: The last status.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._add_stage_times(stage_times = Trace_Recorder.take_stage_times())
+            self.state = state
+        Trace_Recorder.stop_stage_times()
+        return self.report()
+
+# End of file.
@@ -0,0 +1,308 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Rasterizer.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import re
+import cv2
+import subprocess
+import tempfile
+import numpy as np
+from collections.abc import Iterator
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import Trace_Recorder
+
+# ======================================================================================================================
+# Rasterizer Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Rasterizer():
+    """
+    Converting pdf files into images a few pages at a time. \n
+    convert_from_path on a whole pdf keeps every page in memory at 700 dpi before any of them are used, which is what ran the 8gb laptops out of ram. \n
+    Asking poppler for a small window of pages keeps the memory the same no matter how many pages the pdf has. \n
+    Pages from the scanner are only a jpeg wrapped in a pdf, so those have the jpeg pulled straight out instead of being rendered again.
+    """
+    def __init__(self,
+                 dpi: int = 700,
+                 poppler_path: str = 'poppler/Library/bin',
+                 page_window: int = 1,
+                 thread_count: int = 1,
+                 extract_embedded: bool = True) -> None:
+        """
+        Args:
+            dpi (int, optional): Resolution the pages are rendered at. The bubble locations are based on 700.
+                Defaults to 700.
+            poppler_path (str, optional): Folder with the poppler binaries.
+                Defaults to 'poppler/Library/bin'.
+            page_window (int, optional): Most pages that are held in memory at one time.
+                Defaults to 1.
+            thread_count (int, optional): Threads poppler can use for a window. It can't use more than the number of pages in the window.
+                Defaults to 1.
+            extract_embedded (bool, optional): Pull the jpeg out of pages that are only a scanned image instead of rendering them.
+                Defaults to True.
+        """
+
+        # Class init values.
+        self.dpi: int = dpi
+        self.poppler_path: str = poppler_path
+        self.page_window: int = max(1, page_window)
+        self.thread_count: int = max(1, thread_count)
+        self.extract_embedded: bool = extract_embedded
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _poppler_command(self,
+                         command: str) -> str:
+        """ Path to one of the poppler programs, the same way pdf2image finds them. """
+        if self.poppler_path is not None:
+            return os.path.join(self.poppler_path, command)
+        return command
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _run_poppler(self,
+                     args: list[str]) -> str:
+        """
+        Running one of the poppler programs and returning what it printed.
+
+        Args:
+            args (list[str]): The program name followed by its arguments.
+
+        Returns:
+            str: Everything the program printed.
+        """
+        with Trace_Recorder.span(args[0], category = 'poppler'):
+            result = subprocess.run([self._poppler_command(args[0])] + args[1:],
+                                    stdout = subprocess.PIPE,
+                                    stderr = subprocess.DEVNULL,
+                                    check = True)
+        return result.stdout.decode('utf8', 'ignore')
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_embedded_pages(self,
+                            pdf_path: str,
+                            first_page: int,
+                            last_page: int) -> dict:
+        """
+        Finding the pages that are only a single scanned jpeg covering the whole page. \n
+        A page counts if pdfimages lists exactly one rgb or gray jpeg on it, the page isn't rotated, there is no text on it, and the image is the size of the page. \n
+        Anything else is real pdf content and has to be rendered.
+
+        Args:
+            pdf_path (str): Location of the pdf.
+            first_page (int): First page to check, starting at 1.
+            last_page (int): Last page to check.
+
+        Returns:
+            dict: Page number and the resolution (ppi) of its jpeg, for each page the jpeg can be used for.
+        """
+        page_range = ['-f', str(first_page), '-l', str(last_page)]
+        try:
+            image_list = self._run_poppler(['pdfimages', '-list'] + page_range + [pdf_path])
+            page_info = self._run_poppler(['pdfinfo'] + page_range + [pdf_path])
+            page_text = self._run_poppler(['pdftotext'] + page_range + [pdf_path, '-'])
+        except Exception:  # Older poppler or a broken pdf, so everything gets rendered.
+            return {}
+
+        # page: [(type, width, height, color, enc, x-ppi, y-ppi), ...]
+        images: dict = {}
+        for line in image_list.splitlines()[2:]:
+            values = line.split()
+            if len(values) < 14 or not values[0].isdigit():
+                continue
+            images.setdefault(int(values[0]), []).append((values[2], int(values[3]), int(values[4]), values[5], values[8], float(values[12]), float(values[13])))
+
+        sizes: dict = {int(page): (float(width), float(height)) for page, width, height in re.findall(r'Page\s+(\d+)\s+size:\s+([\d.]+)\s+x\s+([\d.]+)', page_info)}
+        rotations: dict = {int(page): int(rotation) for page, rotation in re.findall(r'Page\s+(\d+)\s+rot:\s+(\d+)', page_info)}
+        texts: list[str] = page_text.split('\f')
+
+        embedded_pages: dict = {}
+        for page in range(first_page, last_page + 1):
+            if len(images.get(page, [])) != 1 or page not in sizes:
+                continue
+            image_type, width, height, color, enc, x_ppi, y_ppi = images[page][0]
+            if image_type != 'image' or enc != 'jpeg' or color not in ('rgb', 'gray'):
+                continue
+            if rotations.get(page, 0) != 0 or x_ppi <= 0 or abs(x_ppi - y_ppi) > 1:
+                continue
+            if (page - first_page) < len(texts) and texts[page - first_page].strip():
+                continue
+            # The image has to cover the page so its pixels line up with the rendered pages.
+            page_width, page_height = sizes[page]
+            if abs(width / x_ppi * 72 - page_width) > page_width * 0.02 or abs(height / y_ppi * 72 - page_height) > page_height * 0.02:
+                continue
+            embedded_pages[page] = x_ppi
+        return embedded_pages
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _extract_embedded_page(self,
+                               pdf_path: str,
+                               page: int) -> np.ndarray:
+        """
+        Pulling the jpeg out of a page as is with pdfimages and decoding it. No rendering is done.
+
+        Args:
+            pdf_path (str): Location of the pdf.
+            page (int): Page number, starting at 1.
+
+        Returns:
+            np.ndarray: The page as BGR, or None if the jpeg couldn't be pulled out.
+        """
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                self._run_poppler(['pdfimages', '-j', '-f', str(page), '-l', str(page), pdf_path, os.path.join(folder, 'page')])
+                names = [i for i in os.listdir(folder) if i.endswith('.jpg')]
+                if len(names) != 1:
+                    return None
+                with Trace_Recorder.span('imread', category = 'image', file = pdf_path, page = page):
+                    return cv2.imread(os.path.join(folder, names[0]), cv2.IMREAD_COLOR)
+        except Exception:
+            return None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _render_pages(self,
+                      pdf_path: str,
+                      pages: list[int]) -> Iterator:
+        """
+        Rendering a run of pages with poppler, page_window at a time.
+
+        Args:
+            pdf_path (str): Location of the pdf.
+            pages (list[int]): Page numbers in a row, like [3, 4, 5].
+
+        Yields:
+            tuple: Page number, the page as RGB, its color order, and its scale.
+        """
+        for i in range(0, len(pages), self.page_window):
+            window = pages[i: i + self.page_window]
+            with Trace_Recorder.span('pdftoppm', category = 'poppler', file = pdf_path, first_page = window[0], last_page = window[-1]):
+                images = convert_from_path(pdf_path = pdf_path,
+                                           poppler_path = self.poppler_path,
+                                           dpi = self.dpi,
+                                           first_page = window[0],
+                                           last_page = window[-1],
+                                           thread_count = min(self.thread_count, len(window)))
+            for j in range(len(images)):
+                yield window[0] + j, np.asarray(images[j]), 'RGB', 1.0
+                images[j] = None  # So the page is gone once the caller is done with it.
+            del images
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def get_page_count(self,
+                       pdf_path: str) -> int:
+        """
+        Asking poppler how many pages are in the pdf without rendering any of them.
+
+        Args:
+            pdf_path (str): Location of the pdf.
+
+        Returns:
+            int: Number of pages.
+        """
+        info = pdfinfo_from_path(pdf_path = pdf_path,
+                                 poppler_path = self.poppler_path)
+        return int(info['Pages'])
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def get_page_size(self,
+                      pdf_path: str) -> tuple:
+        """
+        Asking poppler for the size of the first page, used to estimate how much memory rendering it takes.
+
+        Args:
+            pdf_path (str): Location of the pdf.
+
+        Returns:
+            tuple: Width and height in points (1/72 inch).
+        """
+        info = pdfinfo_from_path(pdf_path = pdf_path,
+                                 poppler_path = self.poppler_path)
+        width, height = re.findall(r'[\d.]+', info['Page size'])[:2]
+        return float(width), float(height)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def stream_pages(self,
+                     pdf_path: str,
+                     first_page: int = 1,
+                     last_page: int = None) -> Iterator:
+        """
+        Yielding the pages of a pdf one at a time while only page_window of them are rendered at once. \n
+        Scanned pages have their jpeg decoded at the scanner's resolution, so the scale that comes with each page is what Detector.find_marks() needs to put the marks back into 700 dpi pixels. \n
+        The pages that have to be rendered are grouped into windows between the scanned ones so they still come out in order.
+
+        Args:
+            pdf_path (str): Location of the pdf.
+            first_page (int, optional): First page to render, starting at 1.
+                Defaults to 1.
+            last_page (int, optional): Last page to render. Goes to the end of the pdf if not given.
+                Defaults to None.
+
+        Yields:
+            tuple: Page number, the page as an array, its color order ('RGB' or 'BGR'), and its scale compared to dpi.
+        """
+        if last_page is None:
+            last_page = self.get_page_count(pdf_path = pdf_path)
+
+        embedded_pages: dict = {}
+        if self.extract_embedded:
+            embedded_pages = self._get_embedded_pages(pdf_path = pdf_path,
+                                                      first_page = first_page,
+                                                      last_page = last_page)
+
+        pages_to_render: list[int] = []
+        for page in range(first_page, last_page + 1):
+            img = None
+            if page in embedded_pages:
+                img = self._extract_embedded_page(pdf_path = pdf_path,
+                                                  page = page)
+            if img is None:
+                pages_to_render.append(page)
+                continue
+
+            # Rendering what is waiting first so the pages stay in order.
+            yield from self._render_pages(pdf_path = pdf_path,
+                                          pages = pages_to_render)
+            pages_to_render = []
+            yield page, img, 'BGR', embedded_pages[page] / self.dpi
+            img = None
+
+        yield from self._render_pages(pdf_path = pdf_path,
+                                      pages = pages_to_render)
+
+# ======================================================================================================================
+# Page Ranges
+# ----------------------------------------------------------------------------------------------------------------------
+def get_page_ranges(pages: list[int],
+                    page_window: int) -> list[tuple]:
+    """
+    Grouping page numbers into ranges of pages that are next to each other, with at most page_window pages in each, 
+    like the pages of a pdf that weren't in the mark cache.
+
+    Args:
+        pages (list[int]): Page numbers in order.
+        page_window (int): Most pages in a range.
+
+    Returns:
+        list[tuple]: First and last page of each range.
+    """
+    page_window = max(1, page_window)
+    ranges: list[tuple] = []
+    for page in pages:
+        if ranges and page == ranges[-1][1] + 1 and page - ranges[-1][0] < page_window:
+            ranges[-1] = (ranges[-1][0], page)
+        else:
+            ranges.append((page, page))
+    return ranges
+
+# End of file.
@@ -0,0 +1,87 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Results_Writer.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import csv
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import Trace_Recorder
+
+# ======================================================================================================================
+# Results_Writer Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Results_Writer():
+    """
+    Adding rows of game data to the end of a csv as soon as they are decoded, instead of keeping every row until the end. \n
+    The file is kept open and flushed after each write, so what was written is there even if the program is stopped part way through. \n
+    Nothing is made until the first rows are written. The header is only written when the file is new.
+    """
+    def __init__(self,
+                 path: str,
+                 columns: tuple) -> None:
+        """
+        Args:
+            path (str): Location of the csv.
+            columns (tuple): Names of the columns, like Sheet_Schema.columns.
+        """
+
+        # Class init values.
+        self.path: str = path
+        self.columns: tuple = tuple(columns)
+
+        # Created within and used by the class.
+        self._file = None
+        self._writer = None
+        self.rows: int = 0
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _open(self) -> bool:
+        """
+        Opening the csv to add to it.
+
+        Returns:
+            bool: True if the file is new or empty and needs the header.
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok = True)
+        self._file = open(self.path, 'a', newline = '')
+        # The same line endings pandas' to_csv() used.
+        self._writer = csv.writer(self._file, lineterminator = os.linesep)
+        return self._file.tell() == 0
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def write(self,
+              rows: list[tuple]) -> None:
+        """
+        Adding rows to the end of the csv.
+
+        Args:
+            rows (list[tuple]): The rows from Batch_Decoder.decode_rows(), with their values in the order of columns.
+        """
+        with Trace_Recorder.span('csv_write', category = 'output', rows = len(rows)):
+            if self._file is None and self._open():
+                self._writer.writerow(self.columns)
+            self._writer.writerows(rows)
+            self._file.flush()
+        self.rows += len(rows)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def close(self) -> None:
+        """ Closing the csv. Writing again opens it back up and adds to the end. """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+# End of file.
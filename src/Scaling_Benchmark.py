@@ -0,0 +1,442 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Scaling_Benchmark.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import re
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+import platform
+import threading
+import subprocess
+from datetime import datetime
+
+# psutil is optional. Without it the memory is read from /proc, and isn't measured on other systems.
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Scan_Generator import Scan_Generator
+
+# ======================================================================================================================
+# Scaling_Benchmark Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Scaling_Benchmark():
+    """
+    Running the whole Bubble_Sheet().main() on made up batches of game sheets, for each batch size and number of workers, to see how it scales. \n
+    Each run is its own process in a folder set up like the real one, so it is timed from the start like someone running the exe.
+    The time until the first row is in the csv, the sheets a second, and the most memory used by the main process and the workers are recorded. \n
+    The mark cache and key calibration are turned off so every run reads everything.
+    Only unique_sheets different sheets are made, and they are used over and over to fill the larger batches, since making each one takes about as long as reading it.
+    """
+    def __init__(self,
+                 sizes: tuple = (10, 50, 200, 500, 1000, 2000),
+                 workers: tuple = None,
+                 kinds: tuple = ('images', 'pdf'),
+                 unique_sheets: int = 20,
+                 pages_per_pdf: int = 50,
+                 keys: int = 2,
+                 seed: int = 0,
+                 sample_interval: float = 0.1,
+                 work_directory: str = 'results/scaling_benchmark/') -> None:
+        """
+        Args:
+            sizes (tuple, optional): Number of game sheets in each batch.
+                Defaults to (10, 50, 200, 500, 1000, 2000).
+            workers (tuple, optional): Numbers of workers to run each batch with. 1, 2, 4, and so on up to the number of CPU threads if not given.
+                Defaults to None.
+            kinds (tuple, optional): 'images' for a folder of jpegs, 'pdf' for the same sheets in pdfs.
+                Defaults to ('images', 'pdf').
+            unique_sheets (int, optional): Different game sheets made to fill the batches with.
+                Defaults to 20.
+            pages_per_pdf (int, optional): Most pages in each pdf.
+                Defaults to 50.
+            keys (int, optional): Keys in each run.
+                Defaults to 2.
+            seed (int, optional): Seed for Scan_Generator so the same sheets are used each time.
+                Defaults to 0.
+            sample_interval (float, optional): Seconds between checking the memory and the csv.
+                Defaults to 0.1.
+            work_directory (str, optional): Folder the sheets and runs are made in. It is deleted once it is done.
+                Defaults to 'results/scaling_benchmark/'.
+        """
+
+        # Class init values.
+        self.sizes: tuple = tuple(sizes)
+        self.workers: tuple = tuple(workers) if workers else self._get_worker_counts()
+        self.kinds: tuple = tuple(kinds)
+        self.unique_sheets: int = max(1, unique_sheets)
+        self.pages_per_pdf: int = max(1, pages_per_pdf)
+        self.keys: int = keys
+        self.seed: int = seed
+        self.sample_interval: float = sample_interval
+        self.work_directory: str = work_directory
+
+        # Created within and used by the class.
+        self._source_directory: str = os.path.join(work_directory, 'source')
+        self._input_directory: str = os.path.join(work_directory, 'inputs')
+        self._run_directory: str = os.path.join(work_directory, 'run')
+        self._folders: tuple = ('key_pdf', 'key_images', 'scantron_pdf', 'scantron_images', 'results')
+        self._runs: list[dict] = []
+        self._report: dict = {}
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _get_worker_counts(self) -> tuple:
+        """ 1, 2, 4, and so on, with the number of CPU threads last. """
+        cpu_threads = os.cpu_count() or 1
+        counts: list[int] = []
+        count = 1
+        while count < cpu_threads:
+            counts.append(count)
+            count *= 2
+        counts.append(cpu_threads)
+        return tuple(counts)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _make_sources(self) -> None:
+        """ Making the keys and the different game sheets once, for every batch to use. """
+        generator = Scan_Generator(seed = self.seed)
+        generator.write_images(directory = os.path.join(self._source_directory, 'keys'),
+                               count = self.keys,
+                               prefix = 'Generated_Key',
+                               key = True)
+        generator.write_images(directory = os.path.join(self._source_directory, 'sheets'),
+                               count = self.unique_sheets,
+                               truth_path = os.path.join(self._source_directory, 'ground_truth.json'))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _link(self,
+              source: str,
+              destination: str) -> None:
+        """ Hard linking a file so the large batches don't take up the drive, copying it if the drive can't. """
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _make_inputs(self,
+                     kind: str,
+                     size: int) -> str:
+        """
+        Filling a batch with the game sheets from _make_sources(), as images or in pdfs.
+
+        Returns:
+            str: Folder with the batch's scantron_images/ or scantron_pdf/.
+        """
+        directory = os.path.join(self._input_directory, '{}_{}'.format(kind, size))
+        shutil.rmtree(directory, ignore_errors = True)
+        os.makedirs(directory)
+        sheets = sorted(glob.glob(os.path.join(self._source_directory, 'sheets', '*.jpg')))
+        batch = [sheets[i % len(sheets)] for i in range(size)]
+        if kind == 'images':
+            for i, path in enumerate(batch):
+                self._link(path, os.path.join(directory, 'Generated_{}.jpg'.format(i)))
+            return directory
+
+        generator = Scan_Generator(seed = self.seed)
+        for start in range(0, size, self.pages_per_pdf):
+            def read_pages(paths: list[str]):
+                for path in paths:
+                    with open(path, 'rb') as f:
+                        yield f.read()
+            generator.write_pdf(path = os.path.join(directory, 'Generated_{}.pdf'.format(start // self.pages_per_pdf)),
+                                sheets = read_pages(batch[start:start + self.pages_per_pdf]))
+        return directory
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _set_up_run(self,
+                    kind: str,
+                    inputs: str) -> None:
+        """ Making a fresh folder for one run with the keys and the batch in it, since OMR renames the files it reads. """
+        shutil.rmtree(self._run_directory, ignore_errors = True)
+        for folder in self._folders:
+            os.makedirs(os.path.join(self._run_directory, folder))
+        for name in os.listdir(os.path.join(self._source_directory, 'keys')):
+            self._link(os.path.join(self._source_directory, 'keys', name),
+                       os.path.join(self._run_directory, 'key_images', name))
+        folder = 'scantron_images' if kind == 'images' else 'scantron_pdf'
+        for name in os.listdir(inputs):
+            self._link(os.path.join(inputs, name),
+                       os.path.join(self._run_directory, folder, name))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_processes(self,
+                       pid: int) -> list[int]:
+        """ The process and everything it started, like the pool's workers and poppler. """
+        if psutil is not None:
+            try:
+                process = psutil.Process(pid)
+                return [pid] + [child.pid for child in process.children(recursive = True)]
+            except psutil.Error:
+                return []
+        if not os.path.isdir('/proc'):
+            return [pid]
+        parents: dict = {}
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    with open('/proc/{}/stat'.format(entry)) as f:
+                        # The name is in brackets and can have spaces, so the fields are counted from after it.
+                        parents.setdefault(int(f.read().rsplit(')', 1)[1].split()[1]), []).append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    continue
+        processes: list[int] = [pid]
+        for process in processes:
+            processes.extend(parents.get(process, []))
+        return processes
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_memory(self,
+                    pid: int) -> tuple:
+        """
+        Memory a process is using now and the most it has used, in bytes.
+        The most comes from the OS where it keeps track of it, so a spike between checks isn't missed.
+
+        Returns:
+            tuple: Resident memory and peak resident memory. None for either if it couldn't be read.
+        """
+        rss, peak = None, None
+        try:
+            with open('/proc/{}/status'.format(pid)) as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss = int(line.split()[1]) * 1024
+                    elif line.startswith('VmHWM:'):
+                        peak = int(line.split()[1]) * 1024
+        except OSError:
+            if psutil is not None:
+                try:
+                    info = psutil.Process(pid).memory_info()
+                    rss, peak = info.rss, getattr(info, 'peak_wset', None)  # peak_wset is only on Windows.
+                except psutil.Error:
+                    pass
+        if rss is not None and (peak is None or peak < rss):
+            peak = rss
+        return rss, peak
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _count_rows(self) -> int:
+        """ Rows written to the csv in the run's results/ so far, not counting the header. """
+        rows = 0
+        for path in glob.glob(os.path.join(self._run_directory, 'results', '*.csv')):
+            with open(path, 'rb') as f:
+                rows += max(0, sum(1 for line in f if line.strip()) - 1)
+        return rows
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _run_one(self,
+                 kind: str,
+                 size: int,
+                 workers: int) -> dict:
+        """ Running main() once and watching it until it is done. """
+        settings = {'cpu_threads': workers,
+                    'use_mark_cache': False,
+                    'use_key_calibration': False}
+        environment = dict(os.environ)
+        environment['PYTHONPATH'] = os.path.dirname(os.path.abspath(__file__)) + os.pathsep + environment.get('PYTHONPATH', '')
+        peaks: dict = {}
+        workers_peak: int = None
+        first_result: float = None
+
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--main', json.dumps(settings)],
+                                   cwd = self._run_directory,
+                                   env = environment,
+                                   stdout = subprocess.PIPE,
+                                   stderr = subprocess.STDOUT,
+                                   text = True)
+        # The output is read on its own thread so a full pipe can't stall the run.
+        output: list[str] = []
+        reader = threading.Thread(target = lambda: output.extend(process.stdout), daemon = True)
+        reader.start()
+        while process.poll() is None:
+            in_use = 0
+            for pid in self._get_processes(pid = process.pid):
+                rss, peak = self._get_memory(pid = pid)
+                if peak is not None:
+                    peaks[pid] = max(peaks.get(pid, 0), peak)
+                if pid != process.pid and rss is not None:
+                    in_use += rss
+            if in_use:
+                workers_peak = max(workers_peak or 0, in_use)
+            if first_result is None and self._count_rows() > 0:
+                first_result = time.perf_counter() - start
+            time.sleep(self.sample_interval)
+        seconds = time.perf_counter() - start
+        reader.join(timeout = 5)
+
+        rows = self._count_rows()
+        worker_peaks = [peak for pid, peak in peaks.items() if pid != process.pid]
+        to_mb = lambda value: round(value / 2**20, 1) if value else None
+        return {'kind': kind,
+                'pages': size,
+                'workers': workers,
+                'seconds': round(seconds, 3),
+                'rows': rows,
+                'complete': rows == size and process.returncode == 0,
+                'exit_code': process.returncode,
+                'sheets_per_second': round(rows / seconds, 3) if seconds > 0 else None,
+                'time_to_first_result': round(first_result, 3) if first_result is not None else None,
+                'parent_peak_rss_mb': to_mb(peaks.get(process.pid)),
+                'worker_peak_rss_mb': to_mb(max(worker_peaks, default = 0)),
+                'workers_total_peak_rss_mb': to_mb(workers_peak),
+                'processes': len(peaks),
+                'output_tail': ''.join(output[-5:]).strip()}
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _add_speedup(self) -> None:
+        """ How much faster each run was than the same batch with the fewest workers. """
+        for run in self._runs:
+            base = [other for other in self._runs if other['kind'] == run['kind'] and other['pages'] == run['pages'] and other['workers'] == min(self.workers)]
+            if base and base[0]['seconds'] and run['complete'] and base[0]['complete']:
+                run['speedup'] = round(base[0]['seconds'] / run['seconds'], 3)
+                run['efficiency'] = round(run['speedup'] * min(self.workers) / run['workers'], 3)
+            else:
+                run['speedup'], run['efficiency'] = None, None
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def run(self,
+            keep_files: bool = False) -> dict:
+        """
+        Running every batch size with every number of workers. Each batch is made once and used for all of the worker counts, then deleted.
+
+        Args:
+            keep_files (bool, optional): Keep the work_directory instead of deleting it, to look at the runs.
+                Defaults to False.
+
+        Returns:
+            dict: The report, with the settings and one entry for each run.
+        """
+        self._runs = []
+        shutil.rmtree(self.work_directory, ignore_errors = True)
+        try:
+            self._make_sources()
+            for kind in self.kinds:
+                for size in self.sizes:
+                    inputs = self._make_inputs(kind = kind,
+                                               size = size)
+                    for workers in self.workers:
+                        self._set_up_run(kind = kind,
+                                         inputs = inputs)
+                        run = self._run_one(kind = kind,
+                                            size = size,
+                                            workers = workers)
+                        print('{} {} with {} worker(s): {} seconds, {} sheet(s) a second.'.format(size, kind, workers, run['seconds'], run['sheets_per_second']))
+                        self._runs.append(run)
+                    if not keep_files:
+                        shutil.rmtree(inputs, ignore_errors = True)
+        finally:
+            if not keep_files:
+                shutil.rmtree(self.work_directory, ignore_errors = True)
+
+        self._add_speedup()
+        self._report = {'created': datetime.now().isoformat(timespec = 'seconds'),
+                        'settings': {'sizes': list(self.sizes),
+                                     'workers': list(self.workers),
+                                     'kinds': list(self.kinds),
+                                     'unique_sheets': self.unique_sheets,
+                                     'pages_per_pdf': self.pages_per_pdf,
+                                     'keys': self.keys,
+                                     'seed': self.seed},
+                        'environment': {'python': platform.python_version(),
+                                        'platform': platform.platform(),
+                                        'processor': platform.processor(),
+                                        'cpu_count': os.cpu_count(),
+                                        'total_memory_mb': round(psutil.virtual_memory().total / 2**20) if psutil is not None else None},
+                        'runs': self._runs}
+        return self._report
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def get_table(self) -> str:
+        """
+        The last run() as a markdown table, with a row for each batch and a column for each number of workers.
+
+        Returns:
+            str: Sheets a second, speedup, time to the first result, and the most memory for the workers combined in each cell.
+        """
+        lines = ['| Input | Pages | ' + ' | '.join('{} worker(s)'.format(workers) for workers in self.workers) + ' |',
+                 '|---|---:|' + '---:|' * len(self.workers)]
+        for kind in self.kinds:
+            for size in self.sizes:
+                cells = []
+                for workers in self.workers:
+                    run = [run for run in self._runs if run['kind'] == kind and run['pages'] == size and run['workers'] == workers]
+                    if not run or not run[0]['complete']:
+                        cells.append('failed')
+                        continue
+                    run = run[0]
+                    cells.append('{}/s x{} first {}s {} MB'.format(run['sheets_per_second'], run['speedup'], run['time_to_first_result'], run['workers_total_peak_rss_mb']))
+                lines.append('| {} | {} | '.format(kind, size) + ' | '.join(cells) + ' |')
+        return '\n'.join(lines)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def save_report(self,
+                    directory: str = 'results/') -> tuple:
+        """
+        Saving the last run() as json and the table from get_table() as markdown, with the current time as their name.
+
+        Returns:
+            tuple: Location of the json and of the table.
+        """
+        os.makedirs(directory, exist_ok = True)
+        file_name: str = 'scaling_benchmark_' + re.sub('-|:|\.|\s', '_', str(datetime.now()))
+        json_path = os.path.join(directory, file_name + '.json')
+        table_path = os.path.join(directory, file_name + '.md')
+        with open(json_path, 'w') as f:
+            json.dump(self._report, f, indent = 2)
+        with open(table_path, 'w') as f:
+            f.write(self.get_table() + '\n')
+        return json_path, table_path
+
+# ======================================================================================================================
+# Worker Functions
+# ----------------------------------------------------------------------------------------------------------------------
+def _run_main(settings: str) -> None:
+    """ Running Bubble_Sheet().main() in the folder the process was started in, for Scaling_Benchmark._run_one(). """
+    from Bubble_Sheet import Bubble_Sheet
+    Bubble_Sheet(omr_settings = json.loads(settings)).main()
+
+# ======================================================================================================================
+# Main
+# ----------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Time Bubble_Sheet().main() for each batch size and number of workers.')
+    parser.add_argument('--sizes', default = '10,50,200,500,1000,2000', help = 'Game sheets in each batch, separated by commas.')
+    parser.add_argument('--workers', default = None, help = 'Numbers of workers, separated by commas. 1, 2, 4, and so on up to the CPU threads if not given.')
+    parser.add_argument('--kinds', default = 'images,pdf', help = 'images, pdf, or both.')
+    parser.add_argument('--unique-sheets', type = int, default = 20, help = 'Different game sheets made to fill the batches with.')
+    parser.add_argument('--keep-files', action = 'store_true', help = 'Keep the made sheets and runs.')
+    parser.add_argument('--main', default = None, help = argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.main is not None:
+        _run_main(settings = arguments.main)
+        sys.exit(0)
+
+    benchmark = Scaling_Benchmark(sizes = [int(i) for i in arguments.sizes.split(',')],
+                                  workers = [int(i) for i in arguments.workers.split(',')] if arguments.workers else None,
+                                  kinds = arguments.kinds.split(','),
+                                  unique_sheets = arguments.unique_sheets)
+    benchmark.run(keep_files = arguments.keep_files)
+    print(benchmark.get_table())
+    print('The report was saved to {} and {}.'.format(*benchmark.save_report()))
+
+# End of file.
@@ -0,0 +1,302 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Scan_Generator.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import json
+import cv2
+import numpy as np
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from OMR import get_default_bubble_location
+
+# ======================================================================================================================
+# Scan_Generator Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Scan_Generator():
+    """
+    Making fake 700 dpi scans of the game sheet so the speed and accuracy can be checked without filling out and scanning real paper. \n
+    Each bubble that is picked is filled in with a slightly different blue and size, moved a little from where it is printed,
+    then the whole page is turned a bit, has noise added, and is saved as a jpeg like the scanner does. \n
+    Which bubbles were filled in is kept as the ground truth to check the marks that are found against.
+    """
+    def __init__(self,
+                 bubble_location: dict = None,
+                 seed: int = 0,
+                 fill_rate: float = 0.2,
+                 jitter: int = 8,
+                 max_rotation: float = 0.3,
+                 noise: float = 6.0,
+                 jpeg_quality: int = 80,
+                 page_size: tuple = (5950, 7700)) -> None:
+        """
+        Args:
+            bubble_location (dict, optional): Where each bubble is on the page. The printed locations from get_default_bubble_location() if not given.
+                Defaults to None.
+            seed (int, optional): Seed for the random numbers so the same sheets are made every time.
+                Defaults to 0.
+            fill_rate (float, optional): Chance of each bubble being filled in on a game sheet.
+                Defaults to 0.2.
+            jitter (int, optional): Most a fill is moved from the centre of its bubble, in pixels.
+                Defaults to 8.
+            max_rotation (float, optional): Most the page is turned, in degrees either way.
+                Defaults to 0.3.
+            noise (float, optional): Standard deviation of the noise added to every pixel.
+                Defaults to 6.0.
+            jpeg_quality (int, optional): Quality the page is saved at, 0 to 100.
+                Defaults to 80.
+            page_size (tuple, optional): Width and height of the page in pixels. Letter at 700 dpi by default.
+                Defaults to (5950, 7700).
+        """
+
+        # Class init values.
+        self.bubble_location: dict = bubble_location if bubble_location is not None else get_default_bubble_location()
+        self.seed: int = seed
+        self.fill_rate: float = fill_rate
+        self.jitter: int = jitter
+        self.max_rotation: float = max_rotation
+        self.noise: float = noise
+        self.jpeg_quality: int = jpeg_quality
+        self.page_size: tuple = page_size
+
+        # Created within and used by the class.
+        self._rng: np.random.Generator = np.random.default_rng(seed)
+        self._bubble_keys: list = list(self.bubble_location)
+        self._bubble_xy: np.ndarray = np.array([value[0] for value in self.bubble_location.values()], dtype = np.float64)
+        self._bubble_radius: int = 25  # 50 pixel bubbles at 700 dpi.
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _draw_page(self,
+                   marked: list,
+                   jitter: int) -> tuple:
+        """
+        Drawing the printed bubbles and filling in the marked ones.
+
+        Returns:
+            tuple: The page as BGR and the centre of each fill, before the page is turned.
+        """
+        img = np.full(shape = (self.page_size[1], self.page_size[0], 3),
+                      fill_value = 255,
+                      dtype = np.uint8)
+        # The printed outlines are black so they aren't picked up as marks.
+        for x, y in self._bubble_xy.astype(np.int32):
+            cv2.circle(img, (int(x), int(y)), self._bubble_radius, (40, 40, 40), 3)
+
+        centres: list = []
+        for key in marked:
+            x, y = self._bubble_xy[self._bubble_keys.index(key)] + self._rng.integers(-jitter, jitter + 1, size = 2)
+            # Ballpoint blue, with how hard it was pressed changing the shade. Green is kept close to red so the hue stays near the middle of blue.
+            blue, red = int(self._rng.integers(160, 221)), int(self._rng.integers(10, 61))
+            color = (blue, red + int(self._rng.integers(-(blue - red) // 8, (blue - red) // 5)), red)
+            axes = (int(self._rng.integers(22, 29)), int(self._rng.integers(22, 29)))
+            cv2.ellipse(img, (int(x), int(y)), axes, float(self._rng.uniform(0, 180)), 0, 360, color, -1)
+            centres.append((float(x), float(y)))
+        return img, centres
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _rotate(self,
+                img: np.ndarray,
+                centres: list) -> tuple:
+        """
+        Turning the page around its centre like a sheet that went into the scanner a little crooked.
+
+        Returns:
+            tuple: The turned page, where each of the centres ended up, and the angle in degrees.
+        """
+        angle = float(self._rng.uniform(-self.max_rotation, self.max_rotation))
+        matrix = cv2.getRotationMatrix2D((self.page_size[0] / 2, self.page_size[1] / 2), angle, 1.0)
+        img = cv2.warpAffine(src = img,
+                             M = matrix,
+                             dsize = self.page_size,
+                             flags = cv2.INTER_LINEAR,
+                             borderValue = (255, 255, 255))
+        if centres:
+            points = np.hstack([np.array(centres), np.ones((len(centres), 1))]) @ matrix.T
+            centres = [(round(float(x), 1), round(float(y), 1)) for x, y in points]
+        return img, centres, angle
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _add_noise(self,
+                   img: np.ndarray) -> np.ndarray:
+        """ Adding the sensor noise of the scanner, done in strips so the whole page isn't copied as floats at once. """
+        if self.noise <= 0:
+            return img
+        for top in range(0, img.shape[0], 512):
+            strip = img[top:top + 512]
+            noise = self._rng.normal(0, self.noise, size = strip.shape)
+            img[top:top + 512] = np.clip(strip + noise, 0, 255).astype(np.uint8)
+        return img
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def make_sheet(self,
+                   marked: list = None,
+                   key: bool = False) -> tuple:
+        """
+        Making one scanned sheet.
+
+        Args:
+            marked (list, optional): Keys of the bubbles to fill in. They are picked at random with fill_rate if not given.
+                Defaults to None.
+            key (bool, optional): Fill in every bubble like a key, with a third of the jitter since keys are filled in carefully.
+                Defaults to False.
+
+        Returns:
+            tuple: The jpeg's bytes and its ground truth, being the bubbles filled in, where each fill ended up, and the angle the page was turned.
+        """
+        if key:
+            marked = list(self._bubble_keys)
+        elif marked is None:
+            marked = [k for k in self._bubble_keys if self._rng.random() < self.fill_rate]
+        img, centres = self._draw_page(marked = marked,
+                                       jitter = max(1, self.jitter // 3) if key else self.jitter)
+        img, centres, angle = self._rotate(img = img,
+                                           centres = centres)
+        img = self._add_noise(img = img)
+        ok, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError('The sheet could not be saved as a jpeg.')
+        return buffer.tobytes(), {'marked': sorted(marked),
+                                  'centres': centres,
+                                  'rotation': round(angle, 4),
+                                  'key': key}
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def get_truth_marks(self,
+                        truth: dict) -> tuple:
+        """
+        The marks a perfect detector would find, being the location of each bubble in the ground truth.
+        Decoding these gives what the sheet's row should be.
+
+        Args:
+            truth (dict): Ground truth from make_sheet().
+
+        Returns:
+            tuple: X and Y of each filled in bubble, sorted like Detector.find_marks().
+        """
+        return tuple(sorted(tuple(int(v) for v in self.bubble_location[key][0]) for key in truth['marked']))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def write_images(self,
+                     directory: str,
+                     count: int,
+                     prefix: str = 'Generated',
+                     key: bool = False,
+                     truth_path: str = None) -> list[dict]:
+        """
+        Saving sheets as jpegs, like the folders of scans OMR reads.
+
+        Args:
+            directory (str): Folder they are saved in. It is made if it isn't there.
+            count (int): How many to make.
+            prefix (str, optional): Start of each file name, followed by its number. 
+                It shouldn't be Key or Scantron, since OMR._change_names() would rename them over each other.
+                Defaults to 'Generated'.
+            key (bool, optional): Make keys instead of game sheets.
+                Defaults to False.
+            truth_path (str, optional): Json file the ground truth of each sheet is saved to, by file name. Not saved if not given.
+                Defaults to None.
+
+        Returns:
+            list[dict]: Ground truth of each sheet, with the file name added.
+        """
+        os.makedirs(directory, exist_ok = True)
+        truths: list[dict] = []
+        for i in range(count):
+            data, truth = self.make_sheet(key = key)
+            truth['file'] = '{}_{}.jpg'.format(prefix, i)
+            with open(os.path.join(directory, truth['file']), 'wb') as f:
+                f.write(data)
+            truths.append(truth)
+        if truth_path is not None:
+            with open(truth_path, 'w') as f:
+                json.dump({truth['file']: truth for truth in truths}, f)
+        return truths
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def write_pdf(self,
+                  path: str,
+                  sheets: list[bytes]) -> None:
+        """
+        Saving jpegs as the pages of a pdf without decoding them again, like the ScanSnap does, so each page is only an image. \n
+        Pages are written to the file one at a time, so a large pdf doesn't have to fit in memory.
+
+        Args:
+            path (str): Location of the pdf.
+            sheets (list[bytes]): The jpeg of each page, from make_sheet() or read from a file.
+        """
+        width, height = self.page_size
+        # Points for a page at 700 dpi.
+        page_width, page_height = round(width / 700 * 72, 2), round(height / 700 * 72, 2)
+        offsets: dict = {}
+        pages: list[int] = []
+        with open(path, 'wb') as f:
+            def write_object(number: int, data: bytes) -> None:
+                offsets[number] = f.tell()
+                f.write(b'%d 0 obj\n' % number + data + b'\nendobj\n')
+
+            f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+            number = 3  # 1 and 2 are the catalog and page tree, written once all the pages are.
+            for data in sheets:
+                write_object(number, b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n'
+                                     % (width, height, len(data)) + data + b'\nendstream')
+                content = b'q %s 0 0 %s 0 0 cm /Im0 Do Q' % (str(page_width).encode(), str(page_height).encode())
+                write_object(number + 1, b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+                write_object(number + 2, b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %s %s] /Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>'
+                                         % (str(page_width).encode(), str(page_height).encode(), number, number + 1))
+                pages.append(number + 2)
+                number += 3
+            write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+            write_object(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(b'%d 0 R' % page for page in pages), len(pages)))
+
+            xref = f.tell()
+            f.write(b'xref\n0 %d\n0000000000 65535 f \n' % number)
+            for i in range(1, number):
+                f.write(b'%010d 00000 n \n' % offsets[i])
+            f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (number, xref))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def make_pdf(self,
+                 path: str,
+                 pages: int,
+                 key: bool = False,
+                 truth_path: str = None) -> list[dict]:
+        """
+        Making a pdf of new sheets, like the folders of scanned pdfs OMR reads.
+
+        Args:
+            path (str): Location of the pdf.
+            pages (int): How many pages to make.
+            key (bool, optional): Make keys instead of game sheets.
+                Defaults to False.
+            truth_path (str, optional): Json file the ground truth of each page is saved to, in page order. Not saved if not given.
+                Defaults to None.
+
+        Returns:
+            list[dict]: Ground truth of each page, with the file name and page number added.
+        """
+        truths: list[dict] = []
+        def get_sheets():
+            for page in range(1, pages + 1):
+                data, truth = self.make_sheet(key = key)
+                truth['file'], truth['page'] = os.path.basename(path), page
+                truths.append(truth)
+                yield data
+        self.write_pdf(path = path,
+                       sheets = get_sheets())
+        if truth_path is not None:
+            with open(truth_path, 'w') as f:
+                json.dump(truths, f)
+        return truths
+
+# End of file.
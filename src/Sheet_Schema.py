@@ -0,0 +1,470 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Sheet_Schema.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import numpy as np
+from types import MappingProxyType
+
+# ======================================================================================================================
+# Sheet_Schema Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Sheet_Schema():
+    """
+    Layout of the game sheet, being what each bubble means and which column of the results it goes in. \n
+    The dictionaries are the same ones Scantron was using, made once and set to read only so they can be shared. \n
+    They are also turned into arrays of bubble keys so a whole batch of sheets can be decoded at once.
+    """
+    def __init__(self) -> None:
+        """ Everything is built here and nothing is changed after. """
+
+        # Column name: [column position, default value]
+        self.raw_data: dict = {
+                               'Team': [0, 0],
+                               'Match': [1, 0],
+                               'Alliance': [2, 0],
+                               'Auton HP TL': [3, 0],
+                               'Auton HP ML': [4, 0],
+                               'Auton HP LLCube': [5, 0],
+                               'Auton HP LLCone': [6, 0],
+                               'Auton HP TM': [7, 0],
+                               'Auton HP MM': [8, 0],
+                               'Auton HP MLCube': [9, 0],
+                               'Auton HP MLCone': [10, 0],
+                               'Auton HP TR': [11, 0],
+                               'Auton HP MR': [12, 0],
+                               'Auton HP LRCube': [13, 0],
+                               'Auton HP LRCone': [14, 0],
+                               'Auton M TL': [15, 0],
+                               'Auton M ML': [16, 0],
+                               'Auton M LLCube': [17, 0],
+                               'Auton M LLCone': [18, 0],
+                               'Auton M TM': [19, 0],
+                               'Auton M MM': [20, 0],
+                               'Auton M MLCube': [21, 0],
+                               'Auton M MLCone': [22, 0],
+                               'Auton M TR': [23, 0],
+                               'Auton M MR': [24, 0],
+                               'Auton M LRCube': [25, 0],
+                               'Auton M LRCone': [26, 0],
+                               'Auton ST TL': [27, 0],
+                               'Auton ST ML': [28, 0],
+                               'Auton ST LLCube': [29, 0],
+                               'Auton ST LLCone': [30, 0],
+                               'Auton ST TM': [31, 0],
+                               'Auton ST MM': [32, 0],
+                               'Auton ST MLCube': [33, 0],
+                               'Auton ST MLCone': [34, 0],
+                               'Auton ST TR': [35, 0],
+                               'Auton ST MR': [36, 0],
+                               'Auton ST LRCube': [37, 0],
+                               'Auton ST LRCone': [38, 0],
+                               'Tele HP TL': [39, 0],
+                               'Tele HP ML': [40, 0],
+                               'Tele HP LLCube': [41, 0],
+                               'Tele HP LLCone': [42, 0],
+                               'Tele HP TM': [43, 0],
+                               'Tele HP MM': [44, 0],
+                               'Tele HP MLCube': [45, 0],
+                               'Tele HP MLCone': [46, 0],
+                               'Tele HP TR': [47, 0],
+                               'Tele HP MR': [48, 0],
+                               'Tele HP LRCube': [49, 0],
+                               'Tele HP LRCone': [50, 0],
+                               'Tele M TL': [51, 0],
+                               'Tele M ML': [52, 0],
+                               'Tele M LLCube': [53, 0],
+                               'Tele M LLCone': [54, 0],
+                               'Tele M TM': [55, 0],
+                               'Tele M MM': [56, 0],
+                               'Tele M MLCube': [57, 0],
+                               'Tele M MLCone': [58, 0],
+                               'Tele M TR': [59, 0],
+                               'Tele M MR': [60, 0],
+                               'Tele M LRCube': [61, 0],
+                               'Tele M LRCone': [62, 0],
+                               'Tele ST TL': [63, 0],
+                               'Tele ST ML': [64, 0],
+                               'Tele ST LLCube': [65, 0],
+                               'Tele ST LLCone': [66, 0],
+                               'Tele ST TM': [67, 0],
+                               'Tele ST MM': [68, 0],
+                               'Tele ST MLCube': [69, 0],
+                               'Tele ST MLCone': [70, 0],
+                               'Tele ST TR': [71, 0],
+                               'Tele ST MR': [72, 0],
+                               'Tele ST LRCube': [73, 0],
+                               'Tele ST LRCone': [74, 0],
+                               'Community': [75, 0],
+                               'Auton Charge Station': [76, 0],
+                               'Floor': [77, 0],
+                               'Single Sub': [78, 0],
+                               'Slider': [79, 0],
+                               'Chute': [80, 0],
+                               'HP & CS': [81, 0],
+                               'Over Charge': [82, 0],
+                               'ST & CS': [83, 0],
+                               'Tele Charge Station': [84, 0],
+                               'Parked': [85, 0]
+                               }
+        # Bubble key: [digit, place]
+        self.team_number_location: dict = {
+                                           41: [0, 0],
+                                           42: [0, 1],
+                                           43: [0, 2],
+                                           44: [0, 3],
+                                           62: [1, 0],
+                                           63: [1, 1],
+                                           64: [1, 2],
+                                           65: [1, 3],
+                                           76: [2, 0],
+                                           77: [2, 1],
+                                           78: [2, 2],
+                                           79: [2, 3],
+                                           82: [3, 0],
+                                           83: [3, 1],
+                                           84: [3, 2],
+                                           85: [3, 3],
+                                           96: [4, 0],
+                                           97: [4, 1],
+                                           98: [4, 2],
+                                           99: [4, 3],
+                                           112: [5, 0],
+                                           113: [5, 1],
+                                           114: [5, 2],
+                                           115: [5, 3],
+                                           126: [6, 0],
+                                           127: [6, 1],
+                                           128: [6, 2],
+                                           129: [6, 3],
+                                           132: [7, 0],
+                                           133: [7, 1],
+                                           134: [7, 2],
+                                           135: [7, 3],
+                                           138: [8, 0],
+                                           139: [8, 1],
+                                           140: [8, 2],
+                                           141: [8, 3],
+                                           144: [9, 0],
+                                           145: [9, 1],
+                                           146: [9, 2],
+                                           147: [9, 3]
+                                           }
+        # Bubble key: [digit, place]
+        self.match_number_location: dict = {
+                                            39: [0, 0],
+                                            40: [0, 1],
+                                            60: [1, 0],
+                                            61: [1, 1],
+                                            74: [2, 0],
+                                            75: [2, 1],
+                                            80: [3, 0],
+                                            81: [3, 1],
+                                            94: [4, 0],
+                                            95: [4, 1],
+                                            110: [5, 0],
+                                            111: [5, 1],
+                                            124: [6, 0],
+                                            125: [6, 1],
+                                            130: [7, 0],
+                                            131: [7, 1],
+                                            136: [8, 0],
+                                            137: [8, 1],
+                                            142: [9, 0],
+                                            143: [9, 1]
+                                            }
+        # Bubble key: [0 for blue, 1 for red]
+        self.alliance_location: dict = {
+                                        8: [0],
+                                        9: [1]
+                                        }
+        # Bubble key: column, flipped between the alliances since the sheet is from the driver station's view.
+        self.game_red_results_locations: dict = {
+                                                 0: 'Auton HP TL',
+                                                 1: 'Auton HP ML',
+                                                 2: 'Auton HP LLCone',
+                                                 3: 'Auton HP LLCube',
+                                                 4: 'Tele HP TL',
+                                                 5: 'Tele HP ML',
+                                                 6: 'Tele HP LLCone',
+                                                 7: 'Tele HP LLCube',
+                                                 10: 'Auton HP TM',
+                                                 11: 'Auton HP MM',
+                                                 12: 'Auton HP MLCone',
+                                                 13: 'Auton HP MLCube',
+                                                 14: 'Tele HP TM',
+                                                 15: 'Tele HP MM',
+                                                 16: 'Tele HP MLCone',
+                                                 17: 'Tele HP MLCube',
+                                                 18: 'Auton HP TR',
+                                                 19: 'Auton HP MR',
+                                                 20: 'Auton HP LRCone',
+                                                 21: 'Auton HP LRCube',
+                                                 22: 'Tele HP TR',
+                                                 23: 'Tele HP MR',
+                                                 24: 'Tele HP LRCone',
+                                                 25: 'Tele HP LRCube',
+                                                 31: 'Auton M TL',
+                                                 32: 'Auton M ML',
+                                                 33: 'Auton M LLCone',
+                                                 34: 'Auton M LLCube',
+                                                 35: 'Tele M TL',
+                                                 36: 'Tele M ML',
+                                                 37: 'Tele M LLCone',
+                                                 38: 'Tele M LLCube',
+                                                 45: 'Auton M TM',
+                                                 46: 'Auton M MM',
+                                                 47: 'Auton M MLCone',
+                                                 48: 'Auton M MLCube',
+                                                 50: 'Tele M TM',
+                                                 51: 'Tele M MM',
+                                                 52: 'Tele M MLCone',
+                                                 53: 'Tele M MLCube',
+                                                 66: 'Auton M TR',
+                                                 67: 'Auton M MR',
+                                                 68: 'Auton M LRCone',
+                                                 69: 'Auton M LRCube',
+                                                 70: 'Tele M TR',
+                                                 71: 'Tele M MR',
+                                                 72: 'Tele M LRCone',
+                                                 73: 'Tele M LRCube',
+                                                 86: 'Auton ST TL',
+                                                 87: 'Auton ST ML',
+                                                 88: 'Auton ST LLCone',
+                                                 89: 'Auton ST LLCube',
+                                                 90: 'Tele ST TL',
+                                                 91: 'Tele ST ML',
+                                                 92: 'Tele ST LLCone',
+                                                 93: 'Tele ST LLCube',
+                                                 100: 'Auton ST TM',
+                                                 101: 'Auton ST MM',
+                                                 102: 'Auton ST MLCone',
+                                                 103: 'Auton ST MLCube',
+                                                 105: 'Tele ST TM',
+                                                 106: 'Tele ST MM',
+                                                 107: 'Tele ST MLCone',
+                                                 108: 'Tele ST MLCube',
+                                                 116: 'Auton ST TR',
+                                                 117: 'Auton ST MR',
+                                                 118: 'Auton ST LRCone',
+                                                 119: 'Auton ST LRCube',
+                                                 120: 'Tele ST TR',
+                                                 121: 'Tele ST MR',
+                                                 122: 'Tele ST LRCone',
+                                                 123: 'Tele ST LRCube'
+                                                 }
+        self.game_blue_results_locations: dict = {
+                                                  0: 'Auton ST TL',
+                                                  1: 'Auton ST ML',
+                                                  2: 'Auton ST LLCone',
+                                                  3: 'Auton ST LLCube',
+                                                  4: 'Tele ST TL',
+                                                  5: 'Tele ST ML',
+                                                  6: 'Tele ST LLCone',
+                                                  7: 'Tele ST LLCube',
+                                                  10: 'Auton ST TM',
+                                                  11: 'Auton ST MM',
+                                                  12: 'Auton ST MLCone',
+                                                  13: 'Auton ST MLCube',
+                                                  14: 'Tele ST TM',
+                                                  15: 'Tele ST MM',
+                                                  16: 'Tele ST MLCone',
+                                                  17: 'Tele ST MLCube',
+                                                  18: 'Auton ST TR',
+                                                  19: 'Auton ST MR',
+                                                  20: 'Auton ST LRCone',
+                                                  21: 'Auton ST LRCube',
+                                                  22: 'Tele ST TR',
+                                                  23: 'Tele ST MR',
+                                                  24: 'Tele ST LRCone',
+                                                  25: 'Tele ST LRCube',
+                                                  31: 'Auton M TL',
+                                                  32: 'Auton M ML',
+                                                  33: 'Auton M LLCone',
+                                                  34: 'Auton M LLCube',
+                                                  35: 'Tele M TL',
+                                                  36: 'Tele M ML',
+                                                  37: 'Tele M LLCone',
+                                                  38: 'Tele M LLCube',
+                                                  45: 'Auton M TM',
+                                                  46: 'Auton M MM',
+                                                  47: 'Auton M MLCone',
+                                                  48: 'Auton M MLCube',
+                                                  50: 'Tele M TM',
+                                                  51: 'Tele M MM',
+                                                  52: 'Tele M MLCone',
+                                                  53: 'Tele M MLCube',
+                                                  66: 'Auton M TR',
+                                                  67: 'Auton M MR',
+                                                  68: 'Auton M LRCone',
+                                                  69: 'Auton M LRCube',
+                                                  70: 'Tele M TR',
+                                                  71: 'Tele M MR',
+                                                  72: 'Tele M LRCone',
+                                                  73: 'Tele M LRCube',
+                                                  86: 'Auton HP TL',
+                                                  87: 'Auton HP ML',
+                                                  88: 'Auton HP LLCone',
+                                                  89: 'Auton HP LLCube',
+                                                  90: 'Tele HP TL',
+                                                  91: 'Tele HP ML',
+                                                  92: 'Tele HP LLCone',
+                                                  93: 'Tele HP LLCube',
+                                                  100: 'Auton HP TM',
+                                                  101: 'Auton HP MM',
+                                                  102: 'Auton HP MLCone',
+                                                  103: 'Auton HP MLCube',
+                                                  105: 'Tele HP TM',
+                                                  106: 'Tele HP MM',
+                                                  107: 'Tele HP MLCone',
+                                                  108: 'Tele HP MLCube',
+                                                  116: 'Auton HP TR',
+                                                  117: 'Auton HP MR',
+                                                  118: 'Auton HP LRCone',
+                                                  119: 'Auton HP LRCube',
+                                                  120: 'Tele HP TR',
+                                                  121: 'Tele HP MR',
+                                                  122: 'Tele HP LRCone',
+                                                  123: 'Tele HP LRCube'
+                                                  }
+        self.play_style_location: dict = {
+                                          26: 'Floor Yes',
+                                          27: 'Single Sub Yes',
+                                          28: 'Double Sub Slider Yes',
+                                          29: 'Double Sub Chute Yes',
+                                          30: 'Parked Yes',
+                                          49: 'Auton Charge Station On',
+                                          54: 'Floor No',
+                                          55: 'Single Sub No',
+                                          56: 'Double Sub Slider No',
+                                          57: 'Parked No',
+                                          58: 'End Game Charge Station On',
+                                          59: 'Parked No',
+                                          104: 'Auton Charge Station Balanced',
+                                          109: 'End Game Charge Station Balanced',
+                                          148: 'Left Community Yes',
+                                          149: 'Left Community No',
+                                          150: 'Auton Charge Station Not Attempted',
+                                          151: 'Travel Between HP and CS',
+                                          152: 'Travel Over Charge',
+                                          153: 'Travel Between ST and CS',
+                                          154: 'End Game Charge Station Not Attempted'
+                                          }
+        # Bubble key: [column, value it is set to]. Taken from the if statements in Scantron._determine_play_style().
+        self.play_style_values: dict = {
+                                        26: ['Floor', 1],
+                                        27: ['Single Sub', 1],
+                                        28: ['Single Sub', 1],
+                                        29: ['Chute', 1],
+                                        30: ['Parked', 0],
+                                        49: ['Auton Charge Station', 0],
+                                        54: ['Floor', 0],
+                                        55: ['Single Sub', 0],
+                                        56: ['Single Sub', 0],
+                                        57: ['Chute', 0],
+                                        58: ['Tele Charge Station', 0],
+                                        59: ['Parked', 1],
+                                        104: ['Auton Charge Station', 1],
+                                        109: ['Tele Charge Station', 1],
+                                        148: ['Community', 0],
+                                        149: ['Community', 1],
+                                        150: ['Auton Charge Station', 2],
+                                        151: ['HP & CS', 1],
+                                        152: ['Over Charge', 1],
+                                        153: ['ST & CS', 1],
+                                        154: ['Tele Charge Station', 2]
+                                        }
+
+        # Arrays of bubble keys made from the dictionaries above.
+        self.columns: tuple
+        self.column_position: dict
+        self.defaults: tuple
+        self.team_bubbles: np.ndarray
+        self.match_bubbles: np.ndarray
+        self.alliance_bubbles: np.ndarray
+        self.result_columns: tuple
+        self.result_blue_bubbles: np.ndarray
+        self.result_red_bubbles: np.ndarray
+        self.play_style_columns: tuple
+        self.play_style_bubbles: tuple
+
+        # Initializing methods.
+        self._compile()
+        self._freeze()
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _compile(self) -> None:
+        """
+        Turning the dictionaries into arrays of bubble keys. \n
+        team_bubbles and match_bubbles are [place, digit], so team_bubbles[0][5] is the bubble for a 5 in the thousands place. \n
+        alliance_bubbles is [blue, red]. \n
+        The results arrays line up with result_columns, one for each alliance. \n
+        play_style_bubbles has a tuple of (bubble key, value) for each of the play_style_columns.
+        """
+        self.columns = tuple(sorted(self.raw_data, key = lambda x: self.raw_data[x][0]))
+        self.column_position = {column: i for i, column in enumerate(self.columns)}
+        self.defaults = tuple(self.raw_data[column][1] for column in self.columns)
+
+        self.team_bubbles = np.full(shape = (4, 10), fill_value = -1, dtype = np.int32)
+        for key, value in self.team_number_location.items():
+            self.team_bubbles[value[1], value[0]] = key
+
+        self.match_bubbles = np.full(shape = (2, 10), fill_value = -1, dtype = np.int32)
+        for key, value in self.match_number_location.items():
+            self.match_bubbles[value[1], value[0]] = key
+
+        self.alliance_bubbles = np.zeros(shape = 2, dtype = np.int32)
+        for key, value in self.alliance_location.items():
+            self.alliance_bubbles[value[0]] = key
+
+        blue_columns = {column: key for key, column in self.game_blue_results_locations.items()}
+        red_columns = {column: key for key, column in self.game_red_results_locations.items()}
+        self.result_columns = tuple(column for column in self.columns if column in blue_columns)
+        self.result_blue_bubbles = np.array([blue_columns[column] for column in self.result_columns], dtype = np.int32)
+        self.result_red_bubbles = np.array([red_columns[column] for column in self.result_columns], dtype = np.int32)
+
+        play_style: dict = {}
+        for key, value in self.play_style_values.items():
+            play_style.setdefault(value[0], []).append((key, value[1]))
+        self.play_style_columns = tuple(column for column in self.columns if column in play_style)
+        self.play_style_bubbles = tuple(tuple(play_style[column]) for column in self.play_style_columns)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _freeze(self) -> None:
+        """ Making the dictionaries and arrays read only since the one object is shared by everything. """
+        self.raw_data = MappingProxyType({k: tuple(v) for k, v in self.raw_data.items()})
+        self.column_position = MappingProxyType(self.column_position)
+        self.team_number_location = MappingProxyType({k: tuple(v) for k, v in self.team_number_location.items()})
+        self.match_number_location = MappingProxyType({k: tuple(v) for k, v in self.match_number_location.items()})
+        self.alliance_location = MappingProxyType({k: tuple(v) for k, v in self.alliance_location.items()})
+        self.game_red_results_locations = MappingProxyType(self.game_red_results_locations)
+        self.game_blue_results_locations = MappingProxyType(self.game_blue_results_locations)
+        self.play_style_location = MappingProxyType(self.play_style_location)
+        self.play_style_values = MappingProxyType({k: tuple(v) for k, v in self.play_style_values.items()})
+        for array in (self.team_bubbles, self.match_bubbles, self.alliance_bubbles, self.result_blue_bubbles, self.result_red_bubbles):
+            array.flags.writeable = False
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __reduce__(self) -> tuple:
+        """ The read only dictionaries can't be pickled, so a process that is sent the schema makes its own from scratch. Everything in it is constant so it comes out the same. """
+        return (self.__class__, ())
+
+# ======================================================================================================================
+# Shared Schema
+# ----------------------------------------------------------------------------------------------------------------------
+_shared_schema: Sheet_Schema = None
+
+def get_shared_schema() -> Sheet_Schema:
+    """ The one Sheet_Schema used by every Scantron and Batch_Decoder that isn't given its own. It is made the first time it is asked for. """
+    global _shared_schema
+    if _shared_schema is None:
+        _shared_schema = Sheet_Schema()
+    return _shared_schema
+
+# End of file.
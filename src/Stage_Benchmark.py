@@ -0,0 +1,253 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Stage_Benchmark.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import re
+import sys
+import json
+import time
+import platform
+import tempfile
+from datetime import datetime
+import cv2
+import numpy as np
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Detector import Detector
+from Scantron import Scantron
+from Bubble_Index import Bubble_Index
+from Batch_Decoder import Batch_Decoder
+from Results_Writer import Results_Writer
+from Scan_Generator import Scan_Generator
+
+# ======================================================================================================================
+# Stage_Benchmark Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Stage_Benchmark():
+    """
+    Timing each step of reading a game sheet on its own, using sheets from Scan_Generator so no real scans are needed. \n
+    The steps are decoding the jpeg, the HSV threshold, the morphology, finding the contours, collating with Scantron and Batch_Decoder, and writing the csv.
+    Each one is ran repeat times on every sheet and the fastest is kept, so other programs running don't throw it off as much. \n
+    Every detector backend is also ran on the same sheets and checked against the ground truth, so a change that makes it faster can't quietly make it wrong.
+    """
+    def __init__(self,
+                 sheets: int = 10,
+                 repeat: int = 3,
+                 seed: int = 0,
+                 pixel_differential: int = 50,
+                 backends: tuple = ('contour', 'multiscale', 'roi', 'components'),
+                 min_accuracy: float = 1.0) -> None:
+        """
+        Args:
+            sheets (int, optional): How many game sheets to make and time.
+                Defaults to 10.
+            repeat (int, optional): Times each step is ran on each sheet.
+                Defaults to 3.
+            seed (int, optional): Seed for Scan_Generator so the same sheets are used each run.
+                Defaults to 0.
+            pixel_differential (int, optional): The plus or minus that it will look for a corresponding mark in the bubble_location dictionary.
+                Defaults to 50.
+            backends (tuple, optional): Detector backends to check against the ground truth.
+                Defaults to ('contour', 'multiscale', 'roi', 'components').
+            min_accuracy (float, optional): Part of the sheets a backend has to decode to exactly the right row to pass.
+                Defaults to 1.0.
+        """
+
+        # Class init values.
+        self.sheets: int = sheets
+        self.repeat: int = max(1, repeat)
+        self.seed: int = seed
+        self.pixel_differential: int = pixel_differential
+        self.backends: tuple = tuple(backends)
+        self.min_accuracy: float = min_accuracy
+
+        # Created within and used by the class.
+        self._generator: Scan_Generator = Scan_Generator(seed = seed)
+        self._bubble_location: dict = self._generator.bubble_location
+        self._bubble_index: Bubble_Index = Bubble_Index(bubble_location = self._bubble_location,
+                                                        pixel_differential = pixel_differential)
+        self._decoder: Batch_Decoder = Batch_Decoder(bubble_location = self._bubble_location,
+                                                     pixel_differential = pixel_differential)
+        self._detector: Detector = Detector()
+        self._stage_times: dict = {}  # Stage: seconds for each sheet.
+        self._backend_times: dict = {}
+        self._backend_marks: dict = {}
+        self._truths: list[dict] = []
+        self._report: dict = {}
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _time(self,
+              stage: str,
+              function,
+              **kwargs):
+        """
+        Running one step repeat times and keeping the fastest under stage.
+
+        Returns:
+            Whatever function gives back.
+        """
+        best = float('inf')
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = function(**kwargs)
+            best = min(best, time.perf_counter() - start)
+        self._stage_times.setdefault(stage, []).append(best)
+        return result
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _run_stages(self,
+                    data: bytes,
+                    writer: Results_Writer) -> None:
+        """ Timing each step on one sheet, with every step using what the one before it made like Detector.find_marks() does. """
+        buffer = np.frombuffer(data, dtype = np.uint8)
+        img = self._time('decode', cv2.imdecode, buf = buffer, flags = cv2.IMREAD_COLOR)
+        mask = self._time('hsv_threshold', self._detector._threshold, img = img, color_order = 'BGR')
+        mask = self._time('morphology', self._detector._clean_mask, mask = mask, scale = 1.0)
+        blobs = self._time('contours', self._detector._get_blobs, mask = mask)
+        marks = tuple(sorted((int(cx), int(cy)) for cx, cy, _, _ in blobs))
+        row = self._time('scantron', self._collate, marks = marks)
+        self._time('batch_decoder', self._decoder.decode_rows, game_sheets = [marks])
+        # Only timed once since each write adds the row to the file again.
+        start = time.perf_counter()
+        writer.write(rows = [tuple(row.values())])
+        self._stage_times.setdefault('csv_write', []).append(time.perf_counter() - start)
+
+        for backend in self.backends:
+            detector = Detector(backend = backend)
+            detector.set_bubble_centres(bubble_centres = [value[0] for value in self._bubble_location.values()])
+            start = time.perf_counter()
+            self._backend_marks.setdefault(backend, []).append(detector.find_marks(img = img))
+            self._backend_times.setdefault(backend, []).append(time.perf_counter() - start)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _collate(self,
+                 marks: tuple) -> dict:
+        """ Making the Scantron for one sheet like the original collation did, sharing the one Bubble_Index. """
+        return Scantron(scantron_data = marks,
+                        bubble_location = self._bubble_location,
+                        pixel_differential = self.pixel_differential,
+                        bubble_index = self._bubble_index)._get_raw_data()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _summarize(self,
+                   times: list[float]) -> dict:
+        """ Milliseconds for each sheet and how many sheets a second that would be. """
+        times = np.array(times) * 1000
+        return {'min_ms': round(float(times.min()), 3),
+                'median_ms': round(float(np.median(times)), 3),
+                'mean_ms': round(float(times.mean()), 3),
+                'sheets_per_second': round(1000 / float(times.mean()), 2) if times.mean() > 0 else None}
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _check_backend(self,
+                       backend: str) -> dict:
+        """ Comparing the bubbles a backend found marked, and the rows they decode to, with the ground truth. """
+        truth_marks = [self._generator.get_truth_marks(truth = truth) for truth in self._truths]
+        found = self._decoder.get_marked_matrix(game_sheets = self._backend_marks[backend])
+        expected = self._decoder.get_marked_matrix(game_sheets = truth_marks)
+        rows = self._decoder.decode_rows(game_sheets = self._backend_marks[backend])
+        expected_rows = self._decoder.decode_rows(game_sheets = truth_marks)
+        true_positive = int(np.count_nonzero(found & expected))
+        accuracy = sum(row == expected_row for row, expected_row in zip(rows, expected_rows)) / max(1, len(rows))
+        return {**self._summarize(times = self._backend_times[backend]),
+                'bubble_precision': round(true_positive / max(1, int(np.count_nonzero(found))), 4),
+                'bubble_recall': round(true_positive / max(1, int(np.count_nonzero(expected))), 4),
+                'false_marks': int(np.count_nonzero(found & ~expected)),
+                'missed_marks': int(np.count_nonzero(expected & ~found)),
+                'row_accuracy': round(accuracy, 4),
+                'passed': accuracy >= self.min_accuracy}
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def run(self) -> dict:
+        """
+        Making the sheets and timing everything. Each sheet is made, timed, and let go before the next so only one page is in memory.
+
+        Returns:
+            dict: The report, with the time for each step, and the time and accuracy of each backend.
+        """
+        self._stage_times, self._backend_times, self._backend_marks, self._truths = {}, {}, {}, []
+        with tempfile.TemporaryDirectory() as directory:
+            writer = Results_Writer(path = os.path.join(directory, 'benchmark.csv'),
+                                    columns = self._decoder.schema.columns)
+            try:
+                for _ in range(self.sheets):
+                    data, truth = self._generator.make_sheet()
+                    self._truths.append(truth)
+                    self._run_stages(data = data,
+                                     writer = writer)
+            finally:
+                writer.close()
+
+        self._report = {'created': datetime.now().isoformat(timespec = 'seconds'),
+                        'settings': {'sheets': self.sheets,
+                                     'repeat': self.repeat,
+                                     'seed': self.seed,
+                                     'pixel_differential': self.pixel_differential,
+                                     'page_size': list(self._generator.page_size),
+                                     'jpeg_quality': self._generator.jpeg_quality},
+                        'environment': {'python': platform.python_version(),
+                                        'opencv': cv2.__version__,
+                                        'numpy': np.__version__,
+                                        'platform': platform.platform(),
+                                        'cpu_count': os.cpu_count()},
+                        'stages': {stage: self._summarize(times = times) for stage, times in self._stage_times.items()},
+                        'backends': {backend: self._check_backend(backend = backend) for backend in self.backends}}
+        return self._report
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def get_failed_backends(self) -> list[str]:
+        """ The backends that decoded fewer of the sheets right than min_accuracy in the last run(). """
+        return [backend for backend, result in self._report.get('backends', {}).items() if not result['passed']]
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def print_report(self) -> None:
+        """ Printing the last run() as tables. """
+        print('{:<16}{:>12}{:>12}{:>12}{:>14}'.format('Stage', 'Min ms', 'Median ms', 'Mean ms', 'Sheets/s'))
+        for stage, result in self._report['stages'].items():
+            print('{:<16}{:>12}{:>12}{:>12}{:>14}'.format(stage, result['min_ms'], result['median_ms'], result['mean_ms'], result['sheets_per_second']))
+        print()
+        print('{:<16}{:>12}{:>12}{:>12}{:>14}{:>10}'.format('Backend', 'Median ms', 'Precision', 'Recall', 'Row accuracy', 'Passed'))
+        for backend, result in self._report['backends'].items():
+            print('{:<16}{:>12}{:>12}{:>12}{:>14}{:>10}'.format(backend, result['median_ms'], result['bubble_precision'], result['bubble_recall'], result['row_accuracy'], str(result['passed'])))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def save_report(self,
+                    directory: str = 'results/') -> str:
+        """
+        Saving the last run() as json with the current time as it's name, so the runs can be compared.
+
+        Returns:
+            str: Location of the json.
+        """
+        os.makedirs(directory, exist_ok = True)
+        file_name: str = 'stage_benchmark_' + re.sub('-|:|\.|\s', '_', str(datetime.now())) + '.json'
+        path = os.path.join(directory, file_name)
+        with open(path, 'w') as f:
+            json.dump(self._report, f, indent = 2)
+        return path
+
+# ======================================================================================================================
+# Main
+# ----------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    benchmark = Stage_Benchmark(sheets = int(sys.argv[1]) if len(sys.argv) > 1 else 10)
+    benchmark.run()
+    benchmark.print_report()
+    print('The report was saved to {}.'.format(benchmark.save_report()))
+    if benchmark.get_failed_backends():
+        print('Backend(s) that did not decode the sheets right: {}'.format(', '.join(benchmark.get_failed_backends())))
+        sys.exit(1)
+
+# End of file.
@@ -0,0 +1,217 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Task_Graph.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Pool_Scheduler import Pool_Scheduler
+
+# ======================================================================================================================
+# Task_Graph Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Task_Graph():
+    """
+    Running tasks that depend on each other, so nothing waits on a whole phase when it only needs part of it. \n
+    Tasks go to the Pool_Scheduler as soon as everything they come after is done, and steps are ran here in the main process the same way,
+    like averaging the keys once the last key is read while the game sheets are still being read beside them. \n
+    Results are only kept for the ones something else comes after. Everything else is handed back as it finishes and let go. \n
+    If the pool fails, the tasks that were already running are waited on and kept, and the rest of it is ran one at a time here. 
+    Only the task that failed, or one that was lost with a broken pool, is ran a second time.
+    """
+    def __init__(self,
+                 scheduler: Pool_Scheduler,
+                 max_in_flight: int = None) -> None:
+        """
+        Args:
+            scheduler (Pool_Scheduler): Runs the tasks.
+            max_in_flight (int, optional): Most tasks that can be running at once. No limit other than the workers and memory if not given.
+                Defaults to None.
+        """
+
+        # Class init values.
+        self.scheduler: Pool_Scheduler = scheduler
+        self.max_in_flight: int = max_in_flight
+
+        # Created within and used by the class.
+        self._nodes: dict = {}  # name: (function, keyword arguments, memory, after, ran here)
+        self._waiting: list = []
+        self._needed: set = set()
+        self._done: set = set()
+        self._results: dict = {}
+
+# ======================================================================================================================
+# Low Level Private Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def _add(self,
+             name,
+             node: tuple) -> None:
+        """ Adding a task or step. Everything in after has to be added first. """
+        if name in self._nodes:
+            raise ValueError('{} was already added to the task graph.'.format(name))
+        for before in node[3]:
+            if before not in self._nodes:
+                raise ValueError('{} comes after {}, which is not in the task graph.'.format(name, before))
+        self._nodes[name] = node
+        self._needed.update(node[3])
+        self._waiting.append(name)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _get_ready(self) -> list:
+        """ Taking the waiting tasks and steps that have everything they come after done, in the order they were added. """
+        ready = [name for name in self._waiting if all(before in self._done for before in self._nodes[name][3])]
+        if ready:
+            started = set(ready)
+            self._waiting = [name for name in self._waiting if name not in started]
+        return ready
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _finish(self,
+                name,
+                result) -> None:
+        """ Marking a task or step as done, keeping its result only if something comes after it. """
+        self._done.add(name)
+        if name in self._needed:
+            self._results[name] = result
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _release(self,
+                 pool_tasks: list,
+                 pool_names: list) -> list:
+        """
+        Sending everything that is ready. Tasks are added to the end of pool_tasks for the Pool_Scheduler and steps are ran right away,
+        which can make more of them ready.
+
+        Returns:
+            list: Name and result of each step that was ran.
+        """
+        finished: list = []
+        ready = self._get_ready()
+        while ready:
+            for name in ready:
+                function, kwargs, memory, _, here = self._nodes[name]
+                if here:
+                    result = function()
+                    self._finish(name = name,
+                                 result = result)
+                    finished.append((name, result))
+                else:
+                    pool_tasks.append((kwargs, memory, function))
+                    pool_names.append(name)
+            ready = self._get_ready()
+        return finished
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def add_task(self,
+                 name,
+                 function,
+                 kwargs: dict,
+                 memory: int = 0,
+                 after: tuple = ()) -> None:
+        """
+        Adding a task for the process pool.
+
+        Args:
+            name (hashable): Name of the task, given back with its result.
+            function (function): Module level function to run.
+            kwargs (dict): Keyword arguments for function.
+            memory (int, optional): Bytes the task needs, from Pool_Scheduler.estimate_image_memory() or estimate_page_memory().
+                Defaults to 0.
+            after (tuple, optional): Names of the tasks and steps that have to be done before it is sent.
+                Defaults to ().
+        """
+        self._add(name = name,
+                  node = (function, kwargs, memory, tuple(after), False))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def add_step(self,
+                 name,
+                 function,
+                 after: tuple = ()) -> None:
+        """
+        Adding a step that is ran here in the main process, for work that needs the results of others or changes what the workers are set up with.
+
+        Args:
+            name (hashable): Name of the step, given back with its result.
+            function (function): Called with no arguments. It can use get_result() for what it comes after.
+            after (tuple, optional): Names of the tasks and steps that have to be done before it is ran.
+                Defaults to ().
+        """
+        self._add(name = name,
+                  node = (function, None, 0, tuple(after), True))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def get_result(self,
+                   name):
+        """ The result of a task or step that something else comes after. """
+        return self._results[name]
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def run(self,
+            description: str = 'tasks'):
+        """
+        Running everything, handing back each task and step as soon as it is done.
+        A step that raises stops the run, since whatever comes after it can't be done.
+
+        Args:
+            description (str, optional): What is being ran, for the message if it has to fall back to one at a time.
+                Defaults to 'tasks'.
+
+        Yields:
+            tuple: Name of the task or step and its result. None for a task that ran out of memory even by itself.
+        """
+        pool_tasks: list = []
+        pool_names: list = []
+        yield from self._release(pool_tasks = pool_tasks,
+                                 pool_names = pool_names)
+
+        finished: set = set()
+        results = self.scheduler.run_as_completed(function = None,
+                                                  tasks = pool_tasks,
+                                                  max_in_flight = self.max_in_flight)
+        while True:
+            try:
+                index, result = next(results)
+            except StopIteration:
+                return
+            # Catching if the computer doesn't have enough ram to allocate the multithreading.
+            except Exception as ex:
+                print('An error occured trying to multithread the {}. Attempting to run the rest of them one at a time.'.format(description))
+                print(ex)
+                break
+            finished.add(index)
+            self._finish(name = pool_names[index],
+                         result = result)
+            yield pool_names[index], result
+            yield from self._release(pool_tasks = pool_tasks,
+                                     pool_names = pool_names)
+
+        # The tasks that were running when it failed are done now, so they aren't ran again.
+        for index, result in self.scheduler.take_late_results():
+            finished.add(index)
+            self._finish(name = pool_names[index],
+                         result = result)
+            yield pool_names[index], result
+            yield from self._release(pool_tasks = pool_tasks,
+                                     pool_names = pool_names)
+
+        self.scheduler.close()
+        index = 0
+        while index < len(pool_tasks):  # More are added as the ones they come after finish.
+            if index not in finished:
+                # Set up the same as a worker so the results come back the same. A step like the keys can change it part way through.
+                self.scheduler.apply_local_state()
+                kwargs, _, function = pool_tasks[index]
+                result = function(**kwargs)
+                self._finish(name = pool_names[index],
+                             result = result)
+                yield pool_names[index], result
+                yield from self._release(pool_tasks = pool_tasks,
+                                         pool_names = pool_names)
+            index += 1
+
+# End of file.
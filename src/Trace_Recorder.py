@@ -0,0 +1,275 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/src/Trace_Recorder.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import json
+import time
+import shutil
+import threading
+
+# ======================================================================================================================
+# Trace_Recorder Class
+# ----------------------------------------------------------------------------------------------------------------------
+class Trace_Recorder():
+    """
+    Keeping how long each step took for each file, so a slow run shows whether it was poppler, reading the image, the morphology, or writing the csv. \n
+    Each process has its own. The workers write theirs to a file after every task, and the main process puts them all together into one
+    Chrome trace that can be opened in chrome://tracing or ui.perfetto.dev. \n
+    Nothing is kept unless enable() was called. Until then span() hands back the same object that does nothing, so the steps can be left in everywhere. \n
+    start_stage_times() keeps only how many times each step ran and how long they took altogether, without any of the spans, for Progress_Reporter.
+    """
+    def __init__(self,
+                 directory: str,
+                 process_name: str) -> None:
+        """
+        Args:
+            directory (str): Folder the workers write their spans to until save() puts them together.
+            process_name (str): What the process is called in the trace.
+        """
+
+        # Class init values.
+        self.directory: str = directory
+        self.process_name: str = process_name
+
+        # Created within and used by the class.
+        self.pid: int = os.getpid()
+        self.events: list[dict] = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0, 'args': {'name': process_name}}]
+
+# ======================================================================================================================
+# Public Functions
+# ----------------------------------------------------------------------------------------------------------------------
+    def add(self,
+            name: str,
+            category: str,
+            start: int,
+            end: int,
+            args: dict) -> None:
+        """
+        Keeping one finished span.
+
+        Args:
+            name (str): The step, like 'find_marks'.
+            category (str): The group it is in, like 'detector' or 'worker'.
+            start (int): time.time_ns() when it started. Wall time is used so the spans from every process line up.
+            end (int): time.time_ns() when it ended.
+            args (dict): Anything else to show with it, like the file.
+        """
+        self.events.append({'name': name,
+                            'cat': category,
+                            'ph': 'X',
+                            'ts': start / 1000,
+                            'dur': (end - start) / 1000,
+                            'pid': self.pid,
+                            'tid': threading.get_native_id(),
+                            'args': args})
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def flush(self) -> None:
+        """
+        Adding the spans kept so far to this process's file in directory and letting them go, so nothing is lost if the worker is stopped. \n
+        Anything in a span that isn't json is written as its string, since a worker that can't save its spans would stop the pool.
+        """
+        if not self.events:
+            return
+        os.makedirs(self.directory, exist_ok = True)
+        with open(os.path.join(self.directory, '{}.jsonl'.format(self.pid)), 'a') as f:
+            for event in self.events:
+                f.write(json.dumps(event, default = str) + '\n')
+        self.events = []
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def save(self,
+             path: str) -> int:
+        """
+        Putting the spans from this process and every worker into one Chrome trace, then deleting the workers' files.
+
+        Args:
+            path (str): Location of the trace.
+
+        Returns:
+            int: Number of spans in the trace.
+        """
+        self.flush()
+        events: list[dict] = []
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                with open(os.path.join(self.directory, name)) as f:
+                    events.extend(json.loads(line) for line in f if line.strip())
+        os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        shutil.rmtree(self.directory, ignore_errors = True)
+        return sum(1 for event in events if event['ph'] == 'X')
+
+# ======================================================================================================================
+# Spans
+# ----------------------------------------------------------------------------------------------------------------------
+class _Span():
+    """ Times whatever is ran inside of it with the with statement. """
+    __slots__ = ('recorder', 'name', 'category', 'args', 'start')
+
+    def __init__(self,
+                 recorder: Trace_Recorder,
+                 name: str,
+                 category: str,
+                 args: dict) -> None:
+        self.recorder = recorder
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, *_) -> bool:
+        end = time.time_ns()
+        if self.recorder is not None:
+            self.recorder.add(name = self.name,
+                              category = self.category,
+                              start = self.start,
+                              end = end,
+                              args = self.args)
+        if _stage_times is not None and self.category != 'main':
+            count, seconds = _stage_times.get(self.name, (0, 0.0))
+            _stage_times[self.name] = (count + 1, seconds + (end - self.start) / 1e9)
+        return False
+
+#-----------------------------------------------------------------------------------------------------------------------
+class _No_Span():
+    """ What span() hands back when nothing is being traced. """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_) -> bool:
+        return False
+
+# ======================================================================================================================
+# Shared Recorder
+# ----------------------------------------------------------------------------------------------------------------------
+_recorder: Trace_Recorder = None
+_stage_times: dict = None  # name: (times ran, seconds)
+_no_span: _No_Span = _No_Span()
+
+def span(name: str,
+         category: str = 'stage',
+         **args):
+    """
+    Timing a step with the with statement, like 'with span('find_marks', file = path):'. \n
+    When tracing isn't enabled and the stage times aren't kept, this only checks two globals and hands back the same object that does nothing.
+
+    Args:
+        name (str): The step.
+        category (str, optional): The group it is in.
+            Defaults to 'stage'.
+        **args: Anything else to show with it, like the file.
+    """
+    if _recorder is None and _stage_times is None:
+        return _no_span
+    return _Span(recorder = _recorder,
+                 name = name,
+                 category = category,
+                 args = args)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def enable(directory: str,
+           process_name: str = 'main') -> None:
+    """
+    Starting to keep spans in this process. \n
+    A worker that was forked from the main process gets its own recorder instead of the copy of the main one, so no span is saved twice.
+
+    Args:
+        directory (str): Folder the workers write their spans to, from get_directory() in the main process.
+        process_name (str, optional): What the process is called in the trace.
+            Defaults to 'main'.
+    """
+    global _recorder
+    if _recorder is not None and _recorder.pid == os.getpid() and _recorder.directory == directory:
+        return
+    _recorder = Trace_Recorder(directory = directory,
+                               process_name = process_name)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def disable() -> None:
+    """ Stopping and letting go of the spans in this process. """
+    global _recorder
+    _recorder = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+def get_directory() -> str:
+    """ The folder the workers should write their spans to. None if tracing isn't enabled. """
+    return _recorder.directory if _recorder is not None else None
+
+#-----------------------------------------------------------------------------------------------------------------------
+def flush() -> None:
+    """ Writing the spans in this process to its file. Done by the workers after each task. """
+    if _recorder is not None:
+        _recorder.flush()
+
+#-----------------------------------------------------------------------------------------------------------------------
+def save(path: str) -> int:
+    """
+    Saving every process's spans as one Chrome trace and stopping.
+
+    Returns:
+        int: Number of spans in the trace, or 0 if tracing wasn't enabled.
+    """
+    if _recorder is None:
+        return 0
+    count = _recorder.save(path = path)
+    disable()
+    return count
+
+#-----------------------------------------------------------------------------------------------------------------------
+def start_stage_times() -> None:
+    """
+    Starting to keep how many times each step ran and how long they took in this process, letting go of any that were kept before. \n
+    Spans in the 'main' category are left out since they last the whole run.
+    """
+    global _stage_times
+    _stage_times = {}
+
+#-----------------------------------------------------------------------------------------------------------------------
+def stop_stage_times() -> None:
+    """ Stopping and letting go of the stage times in this process. """
+    global _stage_times
+    _stage_times = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+def is_timing_stages() -> bool:
+    """ If the stage times are being kept in this process. """
+    return _stage_times is not None
+
+#-----------------------------------------------------------------------------------------------------------------------
+def take_stage_times() -> dict:
+    """
+    The stage times kept since the last time they were taken, which are then cleared.
+
+    Returns:
+        dict: Step: (times ran, seconds). Empty if they aren't being kept.
+    """
+    global _stage_times
+    if _stage_times is None:
+        return {}
+    stage_times, _stage_times = _stage_times, {}
+    return stage_times
+
+#-----------------------------------------------------------------------------------------------------------------------
+def add_stage_times(stage_times: dict) -> None:
+    """ Adding stage times sent back from a worker to the ones in this process. """
+    if _stage_times is None:
+        return
+    for name, (count, seconds) in stage_times.items():
+        kept_count, kept_seconds = _stage_times.get(name, (0, 0.0))
+        _stage_times[name] = (kept_count + count, kept_seconds + seconds)
+
+# End of file.
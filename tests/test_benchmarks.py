@@ -0,0 +1,64 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/tests/test_benchmarks.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import json
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Stage_Benchmark import Stage_Benchmark
+from Scaling_Benchmark import Scaling_Benchmark
+
+# ======================================================================================================================
+# Tests
+# ----------------------------------------------------------------------------------------------------------------------
+def test_stage_benchmark():
+    """ Every backend decodes a generated sheet right, and each step has a time. """
+    benchmark = Stage_Benchmark(sheets = 1,
+                                repeat = 1)
+    report = benchmark.run()
+    assert benchmark.get_failed_backends() == []
+    assert set(report['backends']) == {'contour', 'multiscale', 'roi', 'components'}
+    assert report['stages']
+    assert all(times['median_ms'] >= 0 for times in report['stages'].values())
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_scaling_benchmark(tmp_path):
+    """ A small batch runs all the way through Bubble_Sheet().main() in its own process, and every sheet ends up in the csv. """
+    work_directory = str(tmp_path / 'scaling_benchmark')
+    benchmark = Scaling_Benchmark(sizes = (3,),
+                                  workers = (1,),
+                                  kinds = ('images',),
+                                  unique_sheets = 2,
+                                  keys = 1,
+                                  work_directory = work_directory)
+    report = benchmark.run()
+    run = report['runs'][0]
+    assert run['complete'], run['output_tail']
+    assert run['rows'] == 3
+    assert run['speedup'] == 1.0
+    assert run['time_to_first_result'] is not None
+    assert not os.path.exists(work_directory)
+
+    assert '| images | 3 |' in benchmark.get_table()
+    json_path, table_path = benchmark.save_report(directory = str(tmp_path / 'results'))
+    with open(json_path) as f:
+        assert json.load(f)['runs'] == report['runs']
+    assert os.path.exists(table_path)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_worker_counts():
+    """ Doubling from one up to the number of CPU threads, which is always last. """
+    counts = Scaling_Benchmark(sizes = (1,))._get_worker_counts()
+    assert counts[0] == 1
+    assert counts[-1] == (os.cpu_count() or 1)
+    assert list(counts) == sorted(set(counts))
+
+# End of file.
@@ -0,0 +1,118 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/tests/test_decoding.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import random
+
+import pytest
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from OMR import get_default_bubble_location
+from Batch_Decoder import Batch_Decoder
+from Bubble_Index import Bubble_Index
+from Scantron import Scantron
+from Sheet_Schema import get_shared_schema
+
+PIXEL_DIFFERENTIAL = 50
+
+# ======================================================================================================================
+# Helpers
+# ----------------------------------------------------------------------------------------------------------------------
+def make_sheets(count: int,
+                seed: int = 0) -> list[tuple]:
+    """
+    Random marks for game sheets, being some of the bubbles moved up to a little past pixel_differential, and some stray marks anywhere on the page.
+    A few land right on the edge of the range so both sides of it are checked.
+    """
+    rng = random.Random(seed)
+    centres = [value[0] for value in get_default_bubble_location().values()]
+    sheets: list[tuple] = []
+    for _ in range(count):
+        marks = [(x + rng.randint(-60, 60), y + rng.randint(-60, 60)) for x, y in rng.sample(centres, rng.randint(0, 40))]
+        marks += [(x + rng.choice((-PIXEL_DIFFERENTIAL, PIXEL_DIFFERENTIAL)), y) for x, y in rng.sample(centres, rng.randint(0, 3))]
+        marks += [(rng.randint(0, 6000), rng.randint(0, 8000)) for _ in range(rng.randint(0, 5))]
+        sheets.append(tuple(marks))
+    return sheets
+
+#-----------------------------------------------------------------------------------------------------------------------
+def baseline_row(marks: tuple,
+                 bubble_location: dict) -> tuple:
+    """ The row from a Scantron, the way every sheet was decoded before Batch_Decoder. """
+    scantron = Scantron(scantron_data = marks,
+                        bubble_location = bubble_location,
+                        pixel_differential = PIXEL_DIFFERENTIAL)
+    return tuple(scantron._get_raw_data().values())
+
+# ======================================================================================================================
+# Tests
+# ----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture(scope = 'module')
+def bubble_location() -> dict:
+    return get_default_bubble_location()
+
+#-----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture(scope = 'module')
+def decoder(bubble_location) -> Batch_Decoder:
+    return Batch_Decoder(bubble_location = bubble_location,
+                         pixel_differential = PIXEL_DIFFERENTIAL)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_batch_decoder_matches_scantron(bubble_location, decoder):
+    """ decode_rows() and decode_sheet() give the same row as Scantron for every sheet. """
+    sheets = make_sheets(count = 3001)
+    rows = decoder.decode_rows(game_sheets = sheets)
+    for marks, row in zip(sheets, rows):
+        expected = baseline_row(marks = marks,
+                                bubble_location = bubble_location)
+        assert row == expected
+        assert decoder.decode_sheet(marks = marks) == expected
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_decode_matches_decode_rows(decoder):
+    """ The DataFrame has the same values as the rows, with the columns in order. """
+    sheets = make_sheets(count = 50,
+                         seed = 1)
+    df = decoder.decode(game_sheets = sheets)
+    assert tuple(df.columns) == get_shared_schema().columns
+    assert [tuple(row) for row in df.itertuples(index = False)] == decoder.decode_rows(game_sheets = sheets)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_empty_sheets(bubble_location, decoder):
+    """ A sheet with no marks is all defaults, and no sheets at all is no rows. """
+    expected = baseline_row(marks = (),
+                            bubble_location = bubble_location)
+    assert expected[:2] == ('0000', '00')
+    assert decoder.decode_rows(game_sheets = [(), ()]) == [expected, expected]
+    assert decoder.decode_sheet(marks = ()) == expected
+    assert decoder.decode_rows(game_sheets = []) == []
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_small_chunks_match(bubble_location, decoder):
+    """ Splitting the marks into chunks doesn't change the rows. """
+    sheets = make_sheets(count = 100,
+                         seed = 2)
+    chunked = Batch_Decoder(bubble_location = bubble_location,
+                            pixel_differential = PIXEL_DIFFERENTIAL,
+                            chunk_size = 7)
+    assert chunked.decode_rows(game_sheets = sheets) == decoder.decode_rows(game_sheets = sheets)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_bubble_index_matches_every_bubble(bubble_location):
+    """ The grid finds the same bubbles, in the same order, as checking the mark against all of them. """
+    index = Bubble_Index(bubble_location = bubble_location,
+                         pixel_differential = PIXEL_DIFFERENTIAL)
+    for marks in make_sheets(count = 200,
+                             seed = 3):
+        for x, y in marks:
+            expected = [key for key, value in bubble_location.items()
+                        if abs(value[0][0] - x) <= PIXEL_DIFFERENTIAL and abs(value[0][1] - y) <= PIXEL_DIFFERENTIAL]
+            assert index.lookup((x, y)) == expected
+
+# End of file.
@@ -0,0 +1,54 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/tests/test_detector.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import cv2
+import numpy as np
+import pytest
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from OMR import get_default_bubble_location
+from Batch_Decoder import Batch_Decoder
+from Detector import Detector
+from Scan_Generator import Scan_Generator
+
+# ======================================================================================================================
+# Tests
+# ----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture(scope = 'module')
+def sheets() -> list[tuple]:
+    """ Two generated scans and the marks a perfect detector would find on each. """
+    generator = Scan_Generator(seed = 0)
+    sheets = []
+    for _ in range(2):
+        data, truth = generator.make_sheet()
+        sheets.append((cv2.imdecode(np.frombuffer(data, dtype = np.uint8), cv2.IMREAD_COLOR), generator.get_truth_marks(truth = truth)))
+    return sheets
+
+#-----------------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('backend', ['contour', 'multiscale', 'components', 'roi'])
+def test_backends_read_generated_sheets(sheets, backend):
+    """ Every backend finds the marks that give the same row as the ground truth. """
+    bubble_location = get_default_bubble_location()
+    decoder = Batch_Decoder(bubble_location = bubble_location,
+                            pixel_differential = 50)
+    detector = Detector(backend = backend)
+    if backend == 'roi':
+        detector.set_bubble_centres(bubble_centres = [value[0] for value in bubble_location.values()])
+    for img, truth_marks in sheets:
+        marks = detector.find_marks(img = img)
+        assert decoder.decode_sheet(marks = marks) == decoder.decode_sheet(marks = truth_marks)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        Detector(backend = 'other')
+
+# End of file.
@@ -0,0 +1,78 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/tests/test_key_calibration.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Key_Calibration import Key_Calibration, get_key_average, get_key_spread
+
+# ======================================================================================================================
+# Tests
+# ----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture
+def keys(tmp_path) -> list[str]:
+    paths = []
+    for i, data in enumerate((b'first key', b'second key')):
+        path = tmp_path / 'Key_{}.jpg'.format(i)
+        path.write_bytes(data)
+        paths.append(str(path))
+    return paths
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_fingerprint(keys, tmp_path):
+    """ The fingerprint doesn't change with the order or names of the keys, only their contents and the settings. """
+    calibration = Key_Calibration(path = str(tmp_path / 'key_calibration.json'))
+    fingerprint = calibration.make_fingerprint(paths = keys,
+                                               parameters = {'backend': 'contour'})
+    assert calibration.make_fingerprint(paths = keys[::-1],
+                                        parameters = {'backend': 'contour'}) == fingerprint
+    renamed = tmp_path / 'Renamed.jpg'
+    renamed.write_bytes(b'first key')
+    assert calibration.make_fingerprint(paths = [str(renamed), keys[1]],
+                                        parameters = {'backend': 'contour'}) == fingerprint
+    assert calibration.make_fingerprint(paths = keys,
+                                        parameters = {'backend': 'components'}) != fingerprint
+    assert calibration.make_fingerprint(paths = keys[:1],
+                                        parameters = {'backend': 'contour'}) != fingerprint
+    with open(keys[0], 'ab') as f:
+        f.write(b'changed')
+    assert calibration.make_fingerprint(paths = keys,
+                                        parameters = {'backend': 'contour'}) != fingerprint
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_saved_locations_need_the_same_fingerprint(tmp_path):
+    """ The saved bubble locations are only given back for the keys that made them, or to anyone when no fingerprint is asked for. """
+    path = str(tmp_path / 'results' / 'key_calibration.json')
+    bubble_location = {0: [(100, 200), 'Team 0'], 1: [(300, 400), 'Team 1']}
+    Key_Calibration(path = path).save(fingerprint = 'abc',
+                                      bubble_location = bubble_location,
+                                      key_spread = {0: {'std': [0.0, 0.0], 'max': [0, 0]}},
+                                      key_count = 2)
+    calibration = Key_Calibration(path = path)
+    assert calibration.get_bubble_location(fingerprint = 'abc') == bubble_location
+    assert calibration.get_bubble_location() == bubble_location
+    assert calibration.get_bubble_location(fingerprint = 'other') is None
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_missing_or_broken_file(tmp_path):
+    assert Key_Calibration(path = str(tmp_path / 'missing.json')).get_bubble_location() is None
+    broken = tmp_path / 'broken.json'
+    broken.write_text('{"bubble_location": ')
+    assert Key_Calibration(path = str(broken)).get_bubble_location() is None
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_key_average_and_spread():
+    sorted_key_values = [((0, 0), (10, 20)), ((2, 4), (12, 20))]
+    assert get_key_average(sorted_key_values = sorted_key_values) == ((1, 2), (11, 20))
+    assert get_key_spread(sorted_key_values = sorted_key_values) == {0: {'std': [1.0, 2.0], 'range': [2, 4]},
+                                                                     1: {'std': [1.0, 0.0], 'range': [2, 0]}}
+
+# End of file.
@@ -0,0 +1,234 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/tests/test_mark_cache.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+
+import pytest
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Mark_Cache import Mark_Cache, hash_file
+from Detector import Detector
+from Rasterizer import Rasterizer
+from Batch_Decoder import Batch_Decoder
+from Scan_Generator import Scan_Generator
+import OMR
+
+# ======================================================================================================================
+# Tests
+# ----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture
+def cache(tmp_path) -> Mark_Cache:
+    return Mark_Cache(directory = str(tmp_path / 'mark_cache') + '/')
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_put_and_get(cache):
+    """ Marks come back as tuples of ints, and a key that was never saved is None. """
+    cache.put(key = 'a',
+              marks = [(1, 2), (3.0, 4.0)])
+    assert cache.get(key = 'a') == ((1, 2), (3, 4))
+    assert cache.get(key = 'b') is None
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_make_key(cache, tmp_path):
+    """ The key follows the file's contents and the settings, not its name, and a hash given to it is the same as hashing the file. """
+    first = tmp_path / 'first.jpg'
+    second = tmp_path / 'second.jpg'
+    first.write_bytes(b'same')
+    second.write_bytes(b'same')
+    key = cache.make_key(path = str(first),
+                         parameters = {'backend': 'contour'})
+    assert cache.make_key(path = str(second),
+                          parameters = {'backend': 'contour'}) == key
+    assert cache.make_key(path = str(first),
+                          parameters = {'backend': 'contour'},
+                          file_hash = hash_file(path = str(first))) == key
+    assert cache.make_key(path = str(first),
+                          parameters = {'backend': 'roi'}) != key
+    second.write_bytes(b'changed')
+    assert cache.make_key(path = str(second),
+                          parameters = {'backend': 'contour'}) != key
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_evicts_least_recently_used(tmp_path):
+    """ Once it is over max_size_mb, the entry used longest ago is deleted first. """
+    directory = str(tmp_path / 'mark_cache') + '/'
+    cache = Mark_Cache(directory = directory,
+                       max_size_mb = 1)
+    marks = [(i, i) for i in range(25000)]  # About 400 KB each.
+    for i, key in enumerate(('old', 'used', 'new')):
+        cache.put(key = key,
+                  marks = marks)
+        os.utime(os.path.join(directory, key + '.json'), (1000 + i, 1000 + i))
+    assert cache.get(key = 'used') is not None  # Touched, so it is now the newest.
+    cache.put(key = 'newest',
+              marks = marks)
+    assert cache.get(key = 'old') is None
+    assert cache.get(key = 'used') is not None
+    assert cache.get(key = 'newest') is not None
+    assert sum(entry.stat().st_size for entry in os.scandir(directory)) <= 1024 * 1024
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_full_cache_doesnt_look_through_the_folder(tmp_path, monkeypatch):
+    """ Saving to a cache that is full doesn't list the folder again, and it is brought down to low_water so the next few saves don't delete anything. """
+    directory = str(tmp_path / 'mark_cache') + '/'
+    cache = Mark_Cache(directory = directory,
+                       max_size_mb = 1)
+    scans: list = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda *args: scans.append(args) or scandir(*args))
+    marks = [(i, i) for i in range(2000)]  # About 30 KB each.
+    for i in range(100):
+        cache.put(key = str(i),
+                  marks = marks)
+    assert not scans
+    monkeypatch.undo()
+    size = sum(entry.stat().st_size for entry in os.scandir(directory))
+    assert size == cache._size
+    assert size <= 1024 * 1024
+    assert cache.get(key = '99') is not None
+    assert cache.get(key = '0') is None
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_size_is_counted_from_the_folder(tmp_path):
+    """ A new Mark_Cache on a folder that already has entries counts them towards max_size_mb. """
+    directory = str(tmp_path / 'mark_cache') + '/'
+    Mark_Cache(directory = directory).put(key = 'a',
+                                          marks = [(i, i) for i in range(1000)])
+    assert Mark_Cache(directory = directory)._size == os.path.getsize(os.path.join(directory, 'a.json'))
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_refresh_finds_what_the_workers_saved(tmp_path):
+    """ A cache with evict off only reads and saves. refresh() on the main one counts what it saved and deletes the oldest used entries. """
+    directory = str(tmp_path / 'mark_cache') + '/'
+    cache = Mark_Cache(directory = directory,
+                       max_size_mb = 1)
+    worker_cache = Mark_Cache(directory = directory,
+                              evict = False)
+    marks = [(i, i) for i in range(25000)]  # About 400 KB each.
+    for i in range(4):
+        worker_cache.put(key = str(i),
+                         marks = marks)
+        os.utime(os.path.join(directory, str(i) + '.json'), (1000 + i, 1000 + i))
+    assert len(os.listdir(directory)) == 4
+    assert cache._size == 0
+    cache.refresh()
+    assert sorted(os.listdir(directory)) == ['2.json', '3.json']
+    assert cache._size == sum(entry.stat().st_size for entry in os.scandir(directory))
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_worker_keeps_its_mark_cache(tmp_path, monkeypatch):
+    """ Setting up a worker again, like after the keys, keeps its mark cache instead of making a new one, and the worker's doesn't look through the folder. """
+    scans: list = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda *args: scans.append(args) or scandir(*args))
+    caches: list = []
+    for decoder in (None, Batch_Decoder(bubble_location = OMR.get_default_bubble_location(),
+                                        pixel_differential = 50)):
+        OMR._load_worker_state(detector = Detector(),
+                               rasterizer = Rasterizer(dpi = 700),
+                               pdf_image_directory = None,
+                               image_format = 'jpg',
+                               overlay_directory = None,
+                               decoder = decoder,
+                               mark_cache_directory = str(tmp_path / 'mark_cache') + '/')
+        caches.append(OMR._worker_state['mark_cache'])
+    assert caches[0] is caches[1]
+    assert not scans
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_roi_key_follows_the_bubble_centres():
+    """ The 'roi' backend's settings change once it has the bubble centres, so marks found before and after them are saved apart. """
+    detector = Detector(backend = 'roi')
+    before = OMR._get_mark_cache_parameters(detector = detector,
+                                            dpi = 700)
+    detector.set_bubble_centres(bubble_centres = [value[0] for value in OMR.get_default_bubble_location().values()])
+    assert OMR._get_mark_cache_parameters(detector = detector,
+                                          dpi = 700) != before
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_worker_caches_with_its_own_settings(tmp_path):
+    """
+    A worker decoding a sheet saves its marks under the settings it found them with.
+    The OMR used to name the entry before the keys gave the 'roi' backend its bubble centres, so the marks were saved under the wrong settings.
+    """
+    bubble_location = OMR.get_default_bubble_location()
+    image_path = str(tmp_path / 'sheet.jpg')
+    data, _ = Scan_Generator(seed = 0).make_sheet()
+    with open(image_path, 'wb') as f:
+        f.write(data)
+
+    detector = Detector(backend = 'roi')
+    before = OMR._get_mark_cache_parameters(detector = detector,
+                                            dpi = 700)
+    detector.set_bubble_centres(bubble_centres = [value[0] for value in bubble_location.values()])
+    cache_directory = str(tmp_path / 'mark_cache') + '/'
+    OMR._load_worker_state(detector = detector,
+                           rasterizer = Rasterizer(dpi = 700),
+                           pdf_image_directory = None,
+                           image_format = 'jpg',
+                           overlay_directory = None,
+                           decoder = Batch_Decoder(bubble_location = bubble_location,
+                                                   pixel_differential = 50),
+                           mark_cache_directory = cache_directory)
+    decoded, _ = OMR._detect_image(image_path = image_path,
+                                   overlay_path = None,
+                                   file_hash = hash_file(path = image_path),
+                                   decode = True)
+    assert decoded
+
+    cache = Mark_Cache(directory = cache_directory)
+    after = OMR._get_mark_cache_parameters(detector = detector,
+                                           dpi = 700)
+    marks = cache.get(key = cache.make_key(path = image_path,
+                                           parameters = after))
+    img, scale = detector.read_image(path = image_path)
+    assert marks
+    assert marks == tuple(tuple(int(v) for v in mark) for mark in detector.find_marks(img = img,
+                                                                                       scale = scale))
+    assert cache.get(key = cache.make_key(path = image_path,
+                                          parameters = before)) is None
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_pdf_pages_are_saved_apart(tmp_path):
+    """ Each page of a pdf is saved under the pdf's hash and its page number, so the OMR can find the pages that were already read before rendering any of them. """
+    pdf_path = str(tmp_path / 'sheets.pdf')
+    generator = Scan_Generator(seed = 0)
+    generator.write_pdf(path = pdf_path,
+                        sheets = [generator.make_sheet()[0] for _ in range(2)])
+    detector = Detector(backend = 'contour')
+    rasterizer = Rasterizer(dpi = 700)
+    cache_directory = str(tmp_path / 'mark_cache') + '/'
+    OMR._load_worker_state(detector = detector,
+                           rasterizer = rasterizer,
+                           pdf_image_directory = None,
+                           image_format = 'jpg',
+                           overlay_directory = None,
+                           decoder = None,
+                           mark_cache_directory = cache_directory)
+    OMR._cache_worker_marks(path = pdf_path,
+                            file_hash = hash_file(path = pdf_path),
+                            marks = ((1, 2), (3, 4)),
+                            page_number = 2)
+
+    cache = Mark_Cache(directory = cache_directory)
+    def get_page(page_number: int) -> tuple:
+        return cache.get(key = cache.make_key(path = pdf_path,
+                                              parameters = OMR._get_mark_cache_parameters(detector = detector,
+                                                                                          dpi = rasterizer.dpi,
+                                                                                          page_number = page_number,
+                                                                                          extract_embedded = rasterizer.extract_embedded)))
+    assert get_page(page_number = 2) == ((1, 2), (3, 4))
+    assert get_page(page_number = 1) is None
+    assert cache.get(key = cache.make_key(path = pdf_path,
+                                          parameters = OMR._get_mark_cache_parameters(detector = detector,
+                                                                                      dpi = rasterizer.dpi))) is None
+
+# End of file.
@@ -0,0 +1,65 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/tests/test_omr.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from OMR import OMR
+from Scan_Generator import Scan_Generator
+
+DIRECTORIES = ['key_pdf/', 'key_images/', 'scantron_pdf/', 'scantron_images/', 'results/']
+
+# ======================================================================================================================
+# Tests
+# ----------------------------------------------------------------------------------------------------------------------
+def test_rows_come_back_in_file_order(tmp_path, monkeypatch):
+    """
+    The rows are handed back in the order of the files no matter which sheets finish first. \n
+    Half of the sheets are in the mark cache and ready right away, which used to put them ahead of the rest.
+    """
+    monkeypatch.chdir(tmp_path)
+    for directory in DIRECTORIES:
+        os.makedirs(directory)
+    generator = Scan_Generator(seed = 0)
+    generator.write_images(directory = 'key_images',
+                           count = 1,
+                           prefix = 'K',
+                           key = True)
+    names = sorted(truth['file'] for truth in generator.write_images(directory = 'scantron_images',
+                                                                     count = 6,
+                                                                     prefix = 'S'))
+
+    # The row for each sheet read by itself, without the mark cache.
+    omr = OMR(cpu_threads = 2,
+              directories = DIRECTORIES,
+              use_mark_cache = False,
+              game_sheet_mode = 'watch',
+              pixel_differential = 50)
+    try:
+        expected = [row for name in names for row in omr.stream_game_sheet_files(image_names = [name],
+                                                                                 pdf_names = [])]
+    finally:
+        omr.close()
+    assert len(set(expected)) == len(names)
+
+    omr = OMR(cpu_threads = 2,
+              directories = DIRECTORIES,
+              game_sheet_mode = 'watch',
+              pixel_differential = 50)
+    try:
+        list(omr.stream_game_sheet_files(image_names = names[1::2],
+                                         pdf_names = []))
+        assert list(omr.stream_game_sheet_files(image_names = names,
+                                                pdf_names = [])) == expected
+    finally:
+        omr.close()
+
+# End of file.
@@ -0,0 +1,219 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/tests/test_pool_scheduler.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import json
+
+import pytest
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import Pool_Scheduler
+from Pool_Scheduler import Pool_Scheduler as Scheduler, is_memory_error
+import OMR
+import Trace_Recorder
+from Detector import Detector
+from Rasterizer import Rasterizer
+from Batch_Decoder import Batch_Decoder
+from Mark_Cache import hash_file
+from Scan_Generator import Scan_Generator
+
+MB = 1024 * 1024
+
+# ======================================================================================================================
+# Worker Functions
+# ----------------------------------------------------------------------------------------------------------------------
+_state: dict = {}
+
+def set_state(value) -> None:
+    """ Initializer for the workers. """
+    _state['value'] = value
+
+#-----------------------------------------------------------------------------------------------------------------------
+def get_state(number: int) -> tuple:
+    """ The task's number and what the worker was set up with. """
+    return number, _state.get('value')
+
+#-----------------------------------------------------------------------------------------------------------------------
+def fail_once(number: int,
+              marker: str) -> int:
+    """ Running out of memory the first time it is ran, then working. """
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        raise MemoryError('Out of memory on purpose.')
+    return number
+
+#-----------------------------------------------------------------------------------------------------------------------
+def always_fail(number: int) -> int:
+    """ Running out of memory every time. """
+    raise MemoryError('Out of memory on purpose.')
+
+# ======================================================================================================================
+# Tests
+# ----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler(max_workers = 4,
+                          reserve_mb = 0,
+                          worker_overhead_mb = 0)
+    yield scheduler
+    scheduler.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_run_keeps_task_order(scheduler):
+    """ run() gives the results in the order of the tasks no matter when they finish. """
+    tasks = [({'number': i}, 0) for i in range(10)]
+    assert [number for number, _ in scheduler.run(function = get_state,
+                                                  tasks = tasks)] == list(range(10))
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_admission_fits_the_memory(scheduler, monkeypatch):
+    """ Only as many tasks as fit in the free memory are ran at once, and always at least one. """
+    monkeypatch.setattr(Pool_Scheduler, 'get_available_memory', lambda: 250 * MB)
+    results = scheduler.run_as_completed(function = get_state,
+                                         tasks = [({'number': i}, 100 * MB) for i in range(4)])
+    next(results)
+    assert scheduler._concurrency == 2
+    list(results)
+
+    monkeypatch.setattr(Pool_Scheduler, 'get_available_memory', lambda: 10 * MB)
+    results = scheduler.run_as_completed(function = get_state,
+                                         tasks = [({'number': i}, 100 * MB) for i in range(2)])
+    next(results)
+    assert scheduler._concurrency == 1
+    list(results)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_max_in_flight(scheduler, monkeypatch):
+    """ max_in_flight caps it below the workers. """
+    monkeypatch.setattr(Pool_Scheduler, 'get_available_memory', lambda: None)
+    results = scheduler.run_as_completed(function = get_state,
+                                         tasks = [({'number': i}, 0) for i in range(4)],
+                                         max_in_flight = 3)
+    next(results)
+    assert scheduler._concurrency == 3
+    list(results)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_out_of_memory_halves(scheduler, monkeypatch, tmp_path):
+    """ A task that runs out of memory is ran again with half as many beside it, instead of everything going to one at a time. """
+    monkeypatch.setattr(Pool_Scheduler, 'get_available_memory', lambda: None)
+    marker = str(tmp_path / 'failed')
+    tasks = [({'number': 0, 'marker': marker}, 0)] + [({'number': i, 'marker': marker + str(i)}, 0) for i in range(1, 4)]
+    for i in range(1, 4):
+        open(marker + str(i), 'w').close()
+    assert scheduler.run(function = fail_once,
+                         tasks = tasks) == [0, 1, 2, 3]
+    assert scheduler._concurrency == 2
+    assert scheduler._worker_limit == 2
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_out_of_memory_alone_is_none(monkeypatch):
+    """ Once it is down to one, a task that still runs out of memory gives None. """
+    monkeypatch.setattr(Pool_Scheduler, 'get_available_memory', lambda: None)
+    scheduler = Scheduler(max_workers = 1)
+    try:
+        assert scheduler.run(function = always_fail,
+                             tasks = [({'number': 0}, 0)]) == [None]
+    finally:
+        scheduler.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_workers_pick_up_new_state(scheduler):
+    """ Changing the initargs while the pool is running reaches every worker on its next task. """
+    scheduler.set_initializer(initializer = set_state,
+                              initargs = ('first',))
+    tasks = [({'number': i}, 0) for i in range(8)]
+    assert {value for _, value in scheduler.run(function = get_state, tasks = tasks)} == {'first'}
+    scheduler.set_initializer(initializer = set_state,
+                              initargs = ('second',))
+    assert {value for _, value in scheduler.run(function = get_state, tasks = tasks)} == {'second'}
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_same_initargs_are_not_a_change(scheduler):
+    """ Setting initargs that pickle the same doesn't make the workers get them again. """
+    scheduler.set_initializer(initializer = set_state,
+                              initargs = ({'a': 1},))
+    version = scheduler._state_version
+    scheduler.set_initializer(initializer = set_state,
+                              initargs = ({'a': 1},))
+    assert scheduler._state_version == version
+    scheduler.set_initializer(initializer = set_state,
+                              initargs = ({'a': 2},))
+    assert scheduler._state_version == version + 1
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_apply_local_state():
+    """ The main process is set up with local_initializer, and only again once the initargs change. """
+    calls: list = []
+    scheduler = Scheduler(max_workers = 1)
+    scheduler.set_initializer(initializer = set_state,
+                              initargs = (1,),
+                              local_initializer = calls.append)
+    scheduler.apply_local_state()
+    scheduler.apply_local_state()
+    assert calls == [1]
+    scheduler.set_initializer(initializer = set_state,
+                              initargs = (2,),
+                              local_initializer = calls.append)
+    scheduler.apply_local_state()
+    assert calls == [1, 2]
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_traced_task_with_the_mark_cache(tmp_path):
+    """
+    A game sheet decoded by a worker with tracing and the mark cache on is ran on the pool and shows up in the trace. \n
+    The hash of the image in its arguments isn't json, and used to stop the worker from saving its spans, so every sheet was ran one at a time instead.
+    """
+    bubble_location = OMR.get_default_bubble_location()
+    image_path = str(tmp_path / 'sheet.jpg')
+    data, _ = Scan_Generator(seed = 0).make_sheet()
+    with open(image_path, 'wb') as f:
+        f.write(data)
+    detector = Detector(backend = 'contour')
+    detector.set_bubble_centres(bubble_centres = [value[0] for value in bubble_location.values()])
+
+    Trace_Recorder.enable(directory = str(tmp_path / 'trace_parts') + '/')
+    scheduler = Scheduler(max_workers = 1)
+    try:
+        scheduler.set_initializer(initializer = OMR._init_worker,
+                                  initargs = (detector,
+                                              Rasterizer(dpi = 700),
+                                              None,
+                                              'jpg',
+                                              None,
+                                              Batch_Decoder(bubble_location = bubble_location,
+                                                            pixel_differential = 50),
+                                              str(tmp_path / 'mark_cache') + '/',
+                                              Trace_Recorder.get_directory()))
+        (decoded, row), = scheduler.run(function = OMR._detect_image,
+                                        tasks = [({'image_path': image_path,
+                                                   'overlay_path': None,
+                                                   'file_hash': hash_file(path = image_path),
+                                                   'decode': True}, 0)])
+    finally:
+        scheduler.close()
+        Trace_Recorder.save(path = str(tmp_path / 'trace.json'))
+    assert decoded and row
+    assert os.listdir(str(tmp_path / 'mark_cache'))
+    with open(str(tmp_path / 'trace.json')) as f:
+        events = json.load(f)['traceEvents']
+    task, = [event for event in events if event['name'] == '_detect_image']
+    assert task['cat'] == 'worker'
+    assert task['args']['task'] == {'image_path': image_path, 'overlay_path': None, 'decode': True}
+    assert task['pid'] != os.getpid()
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_is_memory_error():
+    assert is_memory_error(MemoryError())
+    assert is_memory_error(Exception('OpenCV(4.7.0) error: (-4:Insufficient memory) Failed to allocate 1 bytes'))
+    assert not is_memory_error(ValueError('Something else'))
+
+# End of file.
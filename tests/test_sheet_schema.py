@@ -0,0 +1,60 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/tests/test_sheet_schema.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import pickle
+
+import numpy as np
+import pytest
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Sheet_Schema import Sheet_Schema, get_shared_schema
+
+# ======================================================================================================================
+# Tests
+# ----------------------------------------------------------------------------------------------------------------------
+def test_shared_schema_is_one_object():
+    assert get_shared_schema() is get_shared_schema()
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_pickles_to_the_same_layout():
+    """ The read only dictionaries can't be pickled, so the schema is sent as just its class and comes out the same on the other side. """
+    schema = get_shared_schema()
+    data = pickle.dumps(schema)
+    assert len(data) < 200
+    copy = pickle.loads(data)
+    assert isinstance(copy, Sheet_Schema)
+    assert copy.columns == schema.columns
+    assert copy.defaults == schema.defaults
+    assert dict(copy.play_style_values) == dict(schema.play_style_values)
+    assert copy.play_style_bubbles == schema.play_style_bubbles
+    for name in ('team_bubbles', 'match_bubbles', 'alliance_bubbles', 'result_blue_bubbles', 'result_red_bubbles'):
+        assert np.array_equal(getattr(copy, name), getattr(schema, name))
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_is_read_only():
+    schema = get_shared_schema()
+    with pytest.raises(TypeError):
+        schema.team_number_location[0] = (1, 1)
+    with pytest.raises(ValueError):
+        schema.team_bubbles[0, 0] = 1
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_columns_line_up():
+    """ Every result and play style column is one of the columns, and each place of the team and match has a bubble for every digit. """
+    schema = get_shared_schema()
+    assert schema.columns[:3] == ('Team', 'Match', 'Alliance')
+    assert len(schema.defaults) == len(schema.columns)
+    assert set(schema.result_columns) <= set(schema.columns)
+    assert set(schema.play_style_columns) <= set(schema.columns)
+    assert len(schema.result_blue_bubbles) == len(schema.result_red_bubbles) == len(schema.result_columns)
+    assert (schema.team_bubbles >= 0).all() and (schema.match_bubbles >= 0).all()
+
+# End of file.
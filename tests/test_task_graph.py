@@ -0,0 +1,163 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/tests/test_task_graph.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import time
+
+import pytest
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Pool_Scheduler import Pool_Scheduler
+from Task_Graph import Task_Graph
+
+# ======================================================================================================================
+# Worker Functions
+# ----------------------------------------------------------------------------------------------------------------------
+_state: dict = {}
+
+def set_state(value) -> None:
+    """ Initializer for the workers. """
+    _state['value'] = value
+
+#-----------------------------------------------------------------------------------------------------------------------
+def set_local_state(value) -> None:
+    """ Initializer for the main process, kept apart so the tests can tell which one ran. """
+    _state['value'] = value
+    _state['local'] = _state.get('local', 0) + 1
+
+#-----------------------------------------------------------------------------------------------------------------------
+def count_runs(number: int,
+               path: str) -> int:
+    """ Adding a line to path each time it is ran, after long enough for the other task to fail while it is running. """
+    time.sleep(1)
+    with open(path, 'a') as f:
+        f.write('ran\n')
+    return number
+
+#-----------------------------------------------------------------------------------------------------------------------
+def fail_once(number: int,
+              marker: str) -> int:
+    """ Raising something that isn't from running out of memory the first time it is ran, then working. """
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        raise ValueError('Failed on purpose.')
+    return number
+
+#-----------------------------------------------------------------------------------------------------------------------
+def get_state(number: int) -> tuple:
+    """ The task's number and what the process it ran in was set up with. """
+    return number, _state.get('value')
+
+# ======================================================================================================================
+# Helpers
+# ----------------------------------------------------------------------------------------------------------------------
+class Failing_Scheduler(Pool_Scheduler):
+    """ A Pool_Scheduler whose pool breaks after handing back the first result. """
+    def run_as_completed(self, *args, **kwargs):
+        results = super().run_as_completed(*args, **kwargs)
+        yield next(results)
+        raise RuntimeError('The pool broke on purpose.')
+
+#-----------------------------------------------------------------------------------------------------------------------
+def add_keys_and_sheets(graph: Task_Graph,
+                        scheduler: Pool_Scheduler) -> None:
+    """ Two keys, a step after them that changes what the workers are set up with, and two sheets after the step, like the OMR's 'roi' backend. """
+    graph.add_task(name = ('key', 0), function = get_state, kwargs = {'number': 0})
+    graph.add_task(name = ('key', 1), function = get_state, kwargs = {'number': 1})
+    graph.add_step(name = ('keys',),
+                   function = lambda: scheduler.set_initializer(initializer = set_state,
+                                                                initargs = ('after keys',),
+                                                                local_initializer = set_local_state),
+                   after = (('key', 0), ('key', 1)))
+    graph.add_task(name = ('sheet', 0), function = get_state, kwargs = {'number': 2}, after = (('keys',),))
+    graph.add_task(name = ('sheet', 1), function = get_state, kwargs = {'number': 3}, after = (('keys',),))
+
+# ======================================================================================================================
+# Tests
+# ----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture(autouse = True)
+def clear_state():
+    _state.clear()
+    yield
+    _state.clear()
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_runs_in_order():
+    """ A step runs once everything before it is done, and what comes after it sees what it changed. """
+    scheduler = Pool_Scheduler(max_workers = 2)
+    scheduler.set_initializer(initializer = set_state,
+                              initargs = ('before keys',),
+                              local_initializer = set_local_state)
+    graph = Task_Graph(scheduler = scheduler)
+    add_keys_and_sheets(graph = graph,
+                        scheduler = scheduler)
+    try:
+        results = list(graph.run())
+    finally:
+        scheduler.close()
+    names = [name for name, _ in results]
+    assert sorted(names, key = str) == sorted([('key', 0), ('key', 1), ('keys',), ('sheet', 0), ('sheet', 1)], key = str)
+    assert names.index(('keys',)) > max(names.index(('key', 0)), names.index(('key', 1)))
+    assert dict(results)[('sheet', 0)] == (2, 'after keys')
+    assert dict(results)[('sheet', 1)] == (3, 'after keys')
+    assert graph.get_result(name = ('key', 0)) == (0, 'before keys')
+    assert 'local' not in _state
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_add_checks_names():
+    graph = Task_Graph(scheduler = Pool_Scheduler(max_workers = 1))
+    graph.add_task(name = 'a', function = get_state, kwargs = {'number': 0})
+    with pytest.raises(ValueError):
+        graph.add_task(name = 'a', function = get_state, kwargs = {'number': 0})
+    with pytest.raises(ValueError):
+        graph.add_task(name = 'b', function = get_state, kwargs = {'number': 0}, after = ('missing',))
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_falls_back_to_one_at_a_time():
+    """
+    When the pool breaks, the rest are ran here once each, set up with local_initializer instead of the workers' initializer.
+    The step part way through changes the set up, and the tasks after it are ran with the new one.
+    """
+    scheduler = Failing_Scheduler(max_workers = 1)
+    scheduler.set_initializer(initializer = set_state,
+                              initargs = ('before keys',),
+                              local_initializer = set_local_state)
+    graph = Task_Graph(scheduler = scheduler)
+    add_keys_and_sheets(graph = graph,
+                        scheduler = scheduler)
+    try:
+        results = list(graph.run(description = 'test tasks'))
+    finally:
+        scheduler.close()
+    names = [name for name, _ in results]
+    assert len(names) == len(set(names)) == 5
+    assert dict(results)[('key', 1)] == (1, 'before keys')
+    assert dict(results)[('sheet', 0)] == (2, 'after keys')
+    assert dict(results)[('sheet', 1)] == (3, 'after keys')
+    assert _state['local'] == 2  # Once before the keys and once after, not before every task.
+
+#-----------------------------------------------------------------------------------------------------------------------
+def test_running_tasks_arent_ran_again(tmp_path):
+    """ A task that was running when another one failed is waited on and kept, so only the one that failed is ran again one at a time. """
+    path = str(tmp_path / 'runs')
+    scheduler = Pool_Scheduler(max_workers = 2)
+    graph = Task_Graph(scheduler = scheduler)
+    graph.add_task(name = 'slow', function = count_runs, kwargs = {'number': 0, 'path': path})
+    graph.add_task(name = 'failing', function = fail_once, kwargs = {'number': 1, 'marker': str(tmp_path / 'failed')})
+    try:
+        results = dict(graph.run(description = 'test tasks'))
+    finally:
+        scheduler.close()
+    assert results == {'slow': 0, 'failing': 1}
+    with open(path) as f:
+        assert f.read() == 'ran\n'
+
+# End of file.
@@ -0,0 +1,115 @@
+#======================================================================================================================+
+# FIle:  Bubble_Sheet/tests/test_writers.py
+# Project: OMR Scantron for FRC Team 5712
+# Author:  William Bodeis <wdbodeis@gmail.com>
+#-----------------------------------------------------------------------------------------------------------------------
+
+# ======================================================================================================================
+# Standard Imports
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import csv
+
+import pytest
+
+# ======================================================================================================================
+# Custom Class Imports
+# ----------------------------------------------------------------------------------------------------------------------
+from Results_Writer import Results_Writer
+from Sheet_Schema import get_shared_schema
+import Parquet_Writer
+
+needs_pyarrow = pytest.mark.skipif(not Parquet_Writer.is_available(), reason = 'pyarrow is not installed')
+
+# ======================================================================================================================
+# Helpers
+# ----------------------------------------------------------------------------------------------------------------------
+def make_row(team: str,
+             match: str,
+             value: int = 0) -> tuple:
+    """ A row like Batch_Decoder.decode_rows() gives, with everything after the team, match, and alliance set to value. """
+    columns = get_shared_schema().columns
+    return (team, match, 1) + (value,) * (len(columns) - 3)
+
+# ======================================================================================================================
+# Results_Writer Tests
+# ----------------------------------------------------------------------------------------------------------------------
+def test_results_writer(tmp_path):
+    """ Nothing is made until the first rows, the header is written once, and closing then writing again adds to the end. """
+    path = str(tmp_path / 'results' / 'run.csv')
+    columns = get_shared_schema().columns
+    writer = Results_Writer(path = path,
+                            columns = columns)
+    assert not os.path.exists(path)
+    writer.write(rows = [make_row('0254', '01')])
+    writer.write(rows = [make_row('5712', '02'), make_row('0000', '00')])
+    writer.close()
+    writer.write(rows = [make_row('1678', '03')])
+    writer.close()
+    assert writer.rows == 4
+    with open(path, newline = '') as f:
+        lines = list(csv.reader(f))
+    assert tuple(lines[0]) == columns
+    assert [line[:2] for line in lines[1:]] == [['0254', '01'], ['5712', '02'], ['0000', '00'], ['1678', '03']]
+
+# ======================================================================================================================
+# Parquet_Writer Tests
+# ----------------------------------------------------------------------------------------------------------------------
+@needs_pyarrow
+def test_parquet_round_trip(tmp_path):
+    """ The rows come back with Team and Match as numbers, a row group is written each row_group_size rows, and the file only gets its name once it is closed. """
+    path = str(tmp_path / 'run.parquet')
+    columns = get_shared_schema().columns
+    writer = Parquet_Writer.Parquet_Writer(path = path,
+                                           columns = columns,
+                                           row_group_size = 2)
+    rows = [make_row('0254', '01', 1), make_row('5712', '02'), make_row('0000', '00', 1)]
+    writer.write(rows = rows[:2])
+    writer.write(rows = rows[2:])
+    assert not os.path.exists(path)
+    writer.close()
+    table = Parquet_Writer.pq.read_table(path)
+    assert table.schema == Parquet_Writer.get_arrow_schema(columns = columns)
+    assert table.column('Team').to_pylist() == [254, 5712, 0]
+    assert table.column('Match').to_pylist() == [1, 2, 0]
+    assert [tuple(row.values()) for row in table.to_pylist()] == [tuple(int(value) for value in row) for row in rows]
+    assert Parquet_Writer.pq.ParquetFile(path).num_row_groups == 2
+
+#-----------------------------------------------------------------------------------------------------------------------
+@needs_pyarrow
+def test_parquet_no_rows(tmp_path):
+    path = str(tmp_path / 'run.parquet')
+    Parquet_Writer.Parquet_Writer(path = path,
+                                  columns = get_shared_schema().columns).close()
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + '.tmp')
+
+#-----------------------------------------------------------------------------------------------------------------------
+@needs_pyarrow
+def test_read_season(tmp_path):
+    """ The newest run's row is kept for each team and match, every sheet with no team is kept, and the rows stay in the order they were saved. """
+    columns = get_shared_schema().columns
+    runs = [[make_row('0254', '01', 0), make_row('5712', '01', 0), make_row('0000', '00', 0)],
+            [make_row('0254', '01', 1), make_row('0000', '00', 1)]]
+    for i, rows in enumerate(runs):
+        writer = Parquet_Writer.Parquet_Writer(path = str(tmp_path / '2024_01_0{}.parquet'.format(i + 1)),
+                                               columns = columns)
+        writer.write(rows = rows)
+        writer.close()
+
+    table = Parquet_Writer.read_season(directory = str(tmp_path))
+    assert list(zip(table.column('Team').to_pylist(), table.column('Match').to_pylist(), table.column(columns[3]).to_pylist())) == [
+        (5712, 1, 0), (0, 0, 0), (254, 1, 1), (0, 0, 1)]
+    assert Parquet_Writer.read_season(directory = str(tmp_path), unique = False).num_rows == 5
+    selected = Parquet_Writer.read_season(directory = str(tmp_path), columns = [columns[3]])
+    assert selected.column_names == ['Team', 'Match', columns[3]]
+    assert selected.num_rows == 4
+
+#-----------------------------------------------------------------------------------------------------------------------
+@needs_pyarrow
+def test_read_season_empty(tmp_path):
+    table = Parquet_Writer.read_season(directory = str(tmp_path))
+    assert table.num_rows == 0
+    assert tuple(table.column_names) == get_shared_schema().columns
+
+# End of file.